@@ -0,0 +1,361 @@
+"""
+This module contains an approximate nearest-neighbor index over the track
+feature store, a hierarchical navigable small world (HNSW) graph.
+
+Every track is a node linked to its closest tracks on layer 0 and, with
+exponentially decreasing probability, on sparser upper layers. A query
+walks greedily down the upper layers and then runs a best-first search of
+width `ef` on layer 0, so it visits a few hundred tracks instead of all of
+them. Higher `ef` gives better recall and slower queries; `M` (links per
+node) and `ef_construction` trade build time and memory for graph quality.
+
+Vectors are read from the feature store, so graph node n is store row n.
+Similarity is the inner product, i.e. cosine for the store's unit vectors.
+
+A saved graph is memory-mapped rather than read, so every worker shares
+one page-cache copy of its links, like the embedding file; only links
+changed by later inserts are held in memory.
+"""
+import heapq
+import math
+import random
+import struct
+import threading
+import zipfile
+import numpy as np
+
+
+def _map_npz(path):
+    """
+    Memory-maps the arrays of an uncompressed .npz file, as written by
+    `np.savez`. Scalars and empty arrays are read instead.
+
+    Returns:
+    dict: The arrays by name.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f'{path} is compressed')
+            # The member's data follows its local header, whose name and
+            # extra field lengths may differ from the central directory's.
+            f.seek(info.header_offset)
+            header = f.read(30)
+            if header[:4] != b'PK\x03\x04':
+                raise ValueError(f'{path} is not a valid .npz file')
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            start = f.tell()
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len('.npy')]
+            if shape == () or 0 in shape or dtype.hasobject:
+                f.seek(start)
+                arrays[name] = np.lib.format.read_array(f)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+class HNSWIndex:
+    """
+    An HNSW graph over the rows of a feature store. Inserts are
+    serialized by a lock; searches run without it and see every node
+    inserted before they started.
+    """
+
+    def __init__(self, store, M=16, ef_construction=100, ef=64, seed=None, min_rows=0):
+        """
+        Args:
+        store (TrackFeatureStore or MappedFeatureStore): The vectors to index.
+        M (int): Links per node on the upper layers; layer 0 keeps 2 * M.
+        ef_construction (int): Search width used when inserting.
+        ef (int): Default search width used when querying.
+        seed (int): Optional seed for the layer draws, for reproducible builds.
+        min_rows (int): Rows the store must hold before an empty index
+            starts building, e.g. the size below which it is never queried.
+        """
+        self.store = store
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef = ef
+        self.min_rows = min_rows
+        self._level_mult = 1 / math.log(M)
+        self._random = random.Random(seed)
+        self._levels = []
+        # _links[layer][node] lists the node's neighbors on that layer; for a
+        # loaded graph, only the nodes linked or relinked since loading.
+        self._links = [{}]
+        # Per layer of a loaded graph: its nodes, sorted, and their neighbors
+        # in compressed sparse row form (offsets, neighbors).
+        self._saved = []
+        self._entry = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._levels)
+
+    @classmethod
+    def build(cls, store, **kwargs):
+        """
+        Builds an index over every vector in the store.
+
+        Args:
+        store (TrackFeatureStore or MappedFeatureStore): The vectors to index.
+        **kwargs: Index parameters, see `__init__`.
+
+        Returns:
+        HNSWIndex: The index.
+        """
+        index = cls(store, **kwargs)
+        index.sync()
+        return index
+
+    def sync(self, blocking=True):
+        """
+        Inserts the store rows added since the last call, e.g. tracks indexed
+        by the prefetcher, including rows added while it runs.
+
+        Args:
+        blocking (bool): If False and another sync is running, return at
+            once and leave the new rows to it.
+
+        Returns:
+        int: The number of rows inserted.
+        """
+        if not self._levels and len(self.store) < self.min_rows:
+            return 0
+        if not self._lock.acquire(blocking):
+            return 0
+        try:
+            inserted = 0
+            while len(self._levels) < len(self.store):
+                self._insert(len(self._levels))
+                inserted += 1
+            return inserted
+        finally:
+            self._lock.release()
+
+    def start_sync(self):
+        """
+        Runs `sync` on a daemon thread, unless one is running or the store
+        is still below `min_rows`, and returns at once. The graph is built
+        in Python, so the first build over a large store takes minutes.
+        """
+        if not self._levels and len(self.store) < self.min_rows:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.sync, name='ann-sync', daemon=True)
+        self._thread.start()
+
+    def _neighbors(self, layer, node):
+        """
+        Returns the neighbors of a node on a layer, from memory if they
+        changed since the graph was loaded and from the saved arrays otherwise.
+        """
+        links = self._links[layer].get(node)
+        if links is not None or layer >= len(self._saved):
+            return links or []
+        nodes, offsets, neighbors = self._saved[layer]
+        i = int(np.searchsorted(nodes, node))
+        if i == len(nodes) or nodes[i] != node:
+            return []
+        return neighbors[offsets[i]:offsets[i + 1]].tolist()
+
+    def _max_links(self, layer):
+        return 2 * self.M if layer == 0 else self.M
+
+    def _search_layer(self, vectors, query, entry_points, ef, layer):
+        """
+        Best-first search of one layer.
+
+        Returns:
+        list: Up to ef (similarity, node) pairs, in no particular order.
+        """
+        visited = set(entry_points)
+        similarities = vectors(entry_points) @ query
+        candidates = [(-float(s), node) for s, node in zip(similarities, entry_points)]
+        heapq.heapify(candidates)
+        results = [(float(s), node) for s, node in zip(similarities, entry_points)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative, node = heapq.heappop(candidates)
+            if -negative < results[0][0] and len(results) >= ef:
+                break
+            neighbors = [n for n in self._neighbors(layer, node) if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for similarity, neighbor in zip((vectors(neighbors) @ query).tolist(), neighbors):
+                if len(results) < ef or similarity > results[0][0]:
+                    heapq.heappush(candidates, (-similarity, neighbor))
+                    heapq.heappush(results, (similarity, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return results
+
+    def _select_neighbors(self, vectors, candidates, count):
+        """
+        Picks up to `count` neighbors from (similarity, node) pairs, skipping
+        candidates closer to an already picked neighbor than to the new node
+        so links point in diverse directions. Skipped candidates fill any
+        remaining slots.
+        """
+        candidates = sorted(candidates, reverse=True)
+        if len(candidates) <= count:
+            return [node for _, node in candidates]
+        nodes = [node for _, node in candidates]
+        candidate_vectors = vectors(nodes)
+        # closest[i]: similarity of candidate i to its closest picked neighbor.
+        closest = np.full(len(nodes), -np.inf, dtype=np.float32)
+        selected = []
+        skipped = []
+        for i, (similarity, node) in enumerate(candidates):
+            if len(selected) == count:
+                break
+            if closest[i] > similarity:
+                skipped.append(node)
+            else:
+                selected.append(node)
+                np.maximum(closest, candidate_vectors @ candidate_vectors[i], out=closest)
+        return selected + skipped[:count - len(selected)]
+
+    def _insert(self, node):
+        vectors = self.store.vectors
+        query = vectors([node])[0]
+        level = int(-math.log(1 - self._random.random()) * self._level_mult)
+        self._levels.append(level)
+        while len(self._links) <= level:
+            self._links.append({})
+
+        if self._entry is None:
+            for layer in range(level + 1):
+                self._links[layer][node] = []
+            self._entry = node
+            return
+
+        entry_points = [self._entry]
+        top = self._levels[self._entry]
+        for layer in range(top, level, -1):
+            entry_points = [max(self._search_layer(vectors, query, entry_points, 1, layer))[1]]
+
+        for layer in range(min(level, top), -1, -1):
+            found = self._search_layer(vectors, query, entry_points, self.ef_construction, layer)
+            neighbors = self._select_neighbors(vectors, found, self.M)
+            links = self._links[layer]
+            links[node] = neighbors
+            max_links = self._max_links(layer)
+            for neighbor in neighbors:
+                neighbor_links = self._neighbors(layer, neighbor) + [node]
+                if len(neighbor_links) > max_links:
+                    # Re-pick with the heuristic; keeping the closest links instead
+                    # builds faster but clusters them and loses recall.
+                    similarities = (vectors(neighbor_links) @ vectors([neighbor])[0]).tolist()
+                    neighbor_links = self._select_neighbors(vectors, list(zip(similarities, neighbor_links)), max_links)
+                # Replace rather than mutate, so concurrent searches see a whole list.
+                links[neighbor] = neighbor_links
+            entry_points = [n for _, n in found]
+
+        for layer in range(top + 1, level + 1):
+            self._links[layer][node] = []
+        if level > top:
+            self._entry = node
+
+    def search(self, query, k=10, ef=None, exclude=()):
+        """
+        Returns the approximate k nearest tracks to a query vector.
+
+        Args:
+        query (numpy.ndarray): A vector, e.g. a taste vector.
+        k (int): Number of tracks to return.
+        ef (int): Search width; defaults to the index's `ef`. Raised to at
+            least k plus the number of excluded tracks.
+        exclude (iterable): Track IDs to leave out, e.g. the seeds.
+
+        Returns:
+        list: (track_id, score) pairs, best first.
+        """
+        entry = self._entry
+        if entry is None or k <= 0:
+            return []
+        exclude = set(exclude)
+        ef = max(ef or self.ef, k + len(exclude))
+        vectors = self.store.vectors
+        query = np.asarray(query, dtype=np.float32)
+
+        entry_points = [entry]
+        for layer in range(self._levels[entry], 0, -1):
+            entry_points = [max(self._search_layer(vectors, query, entry_points, 1, layer))[1]]
+        found = sorted(self._search_layer(vectors, query, entry_points, ef, 0), reverse=True)
+        results = []
+        for similarity, node in found:
+            track_id = self.store.id_at(node)
+            if track_id not in exclude:
+                results.append((track_id, similarity))
+                if len(results) == k:
+                    break
+        return results
+
+    def save(self, path):
+        """
+        Writes the graph to a .npz file. The vectors stay in the feature
+        store; `load` needs a store whose first rows are the same tracks.
+        """
+        with self._lock:
+            arrays = {
+                'ids': np.array([self.store.id_at(node) for node in range(len(self._levels))], dtype=str),
+                'levels': np.array(self._levels, dtype=np.int32),
+                'params': np.array([self.M, self.ef_construction, self.ef,
+                                    -1 if self._entry is None else self._entry], dtype=np.int64),
+            }
+            for layer, links in enumerate(self._links):
+                nodes = set(links)
+                if layer < len(self._saved):
+                    nodes.update(self._saved[layer][0].tolist())
+                nodes = sorted(nodes)
+                node_links = [self._neighbors(layer, n) for n in nodes]
+                arrays[f'nodes{layer}'] = np.array(nodes, dtype=np.int32)
+                arrays[f'offsets{layer}'] = np.cumsum([0] + [len(n) for n in node_links], dtype=np.int64)
+                arrays[f'neighbors{layer}'] = np.array([m for n in node_links for m in n], dtype=np.int32)
+            np.savez(path, layers=np.array(len(self._links)), **arrays)
+
+    @classmethod
+    def load(cls, path, store, ef=None):
+        """
+        Maps a graph written by `save`. Rows the store has gained since
+        are not inserted yet; call `sync` or `start_sync` for that.
+
+        Args:
+        path (str): The .npz file.
+        store (TrackFeatureStore): The store the graph was built over.
+        ef (int): Optional search width overriding the saved one.
+
+        Returns:
+        HNSWIndex: The index.
+
+        Raises:
+        ValueError: If the store's rows do not match the saved tracks.
+        """
+        data = _map_npz(path)
+        ids = data['ids']
+        if len(store) < len(ids) or any(store.id_at(node) != str(track_id) for node, track_id in enumerate(ids)):
+            raise ValueError(f'{path} was built over a different feature store')
+        M, ef_construction, saved_ef, entry = (int(value) for value in data['params'])
+        index = cls(store, M=M, ef_construction=ef_construction, ef=ef or saved_ef)
+        index._levels = data['levels'].tolist()
+        index._entry = None if entry < 0 else entry
+        layers = int(data['layers'])
+        index._links = [{} for _ in range(layers)]
+        index._saved = [(data[f'nodes{layer}'], data[f'offsets{layer}'], data[f'neighbors{layer}'])
+                        for layer in range(layers)]
+        return index
@@ -1,13 +1,35 @@
 """
 This module contains the necessary imports for the Flask application.
 """
-import base64
+import click
+import hashlib
 import logging
-from flask import Flask, redirect, request, send_from_directory, session, url_for, render_template
-import requests
+import math
+from flask import Flask, Response, abort, g, jsonify, redirect, request, send_from_directory, session, url_for
+from flask import render_template as flask_render_template
 import urllib.parse
 import os
+import time
+import requests
 from dotenv import load_dotenv
+from spotify_client import API_BASE_URL, SpotifyClient
+from single_flight import FileLockBackend, SingleFlight
+from session_store import RedisSessionBackend, ServerSideSessionInterface, SQLiteSessionBackend
+from secret_keys import load_secret_keys, rotate_key_file
+from catalog_cache import CatalogCache, SQLiteEntityStore
+from prefetch import Prefetcher
+from rate_limit import RateLimitExceeded, UpstreamScheduler
+from recommend import RecommendationFanOut, merge_and_rerank
+from pagination import Paginator
+from feature_store import RecommendationEngine, TrackFeatureStore
+from ann_index import HNSWIndex
+from embedding_store import MappedFeatureStore, write_embedding_file
+from collaborative import FactorModel, InteractionMatrix, read_interactions, record_interactions, train_als
+from cooccurrence import CooccurrenceBuilder, TrackNeighbors
+from models import MODELS, PLAYLIST_FIELDS, PLAYLIST_TRACKS_FIELDS, Artist, Playlist, Track
+from metrics import MetricsRegistry
+from tracing import Tracer, render_waterfall, span
+from profiler import RequestProfiler
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,10 +37,23 @@ load_dotenv()
 # Initialize Flask application
 app = Flask(__name__)
 
-# Generate a random secret key for the application.
-# This key is used to secure session data and other
-# sensitive information.
-app.secret_key = os.urandom(24)
+# Load the secret key used to sign session IDs. Every worker and node must
+# share it, so it comes from SECRET_KEY or a key file rather than being
+# generated per process. Previous keys remain valid after a rotation.
+os.makedirs(app.instance_path, exist_ok=True)
+DEFAULT_SECRET_KEY_FILE = os.path.join(app.instance_path, 'secret_key')
+app.secret_key, app.config['SECRET_KEY_FALLBACKS'] = load_secret_keys(os.environ, DEFAULT_SECRET_KEY_FILE)
+
+# Keep session data on the server so the cookie only carries an opaque,
+# signed session ID. Redis is used when SESSION_REDIS_URL is set, otherwise
+# a SQLite file shared by the workers on this node.
+if os.getenv('SESSION_REDIS_URL'):
+    session_backend = RedisSessionBackend.from_url(os.environ['SESSION_REDIS_URL'])
+else:
+    session_backend = SQLiteSessionBackend(
+        os.getenv('SESSION_DB_PATH', os.path.join(app.instance_path, 'sessions.sqlite3'))
+    )
+app.session_interface = ServerSideSessionInterface(session_backend)
 
 # Set CLIENT_ID and CLIENT_SECRET variables from environment variables
 # or exit if these variables are not set.
@@ -28,15 +63,379 @@ CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 if not CLIENT_ID or not CLIENT_SECRET:
     raise ValueError("CLIENT_ID and CLIENT_SECRET must be set in environment variables")
 
-# Spotify API endpoints
-REDIRECT_URI = 'http://127.0.0.1:5000/callback'
-AUTH_URL = "https://accounts.spotify.com/authorize"
-TOKEN_URL = "https://accounts.spotify.com/api/token"
+# Spotify API endpoints. SPOTIFY_ACCOUNTS_URL and SPOTIFY_API_URL can point
+# the app at a local stand-in such as fake_spotify.py.
+REDIRECT_URI = os.getenv('REDIRECT_URI', 'http://127.0.0.1:5000/callback')
+SPOTIFY_ACCOUNTS_URL = os.getenv('SPOTIFY_ACCOUNTS_URL', 'https://accounts.spotify.com').rstrip('/')
+SPOTIFY_API_URL = os.getenv('SPOTIFY_API_URL', API_BASE_URL)
+AUTH_URL = f"{SPOTIFY_ACCOUNTS_URL}/authorize"
+TOKEN_URL = f"{SPOTIFY_ACCOUNTS_URL}/api/token"
 
 # URL to sign up for Spotify
 SIGNUP_URL = "https://www.spotify.com/signup/"
 
+# Request and upstream metrics, exported at /metrics. Setting METRICS_DIR
+# to a directory shared by the gunicorn workers makes every scrape report
+# the totals of all workers on this node.
+metrics = MetricsRegistry(os.getenv('METRICS_DIR'))
+metrics.histogram('songrec_request_duration_seconds', 'Time spent handling a request, per Flask endpoint.')
+metrics.counter('songrec_requests_total', 'Requests handled, per Flask endpoint and status code.')
+metrics.histogram('songrec_upstream_duration_seconds', 'Time spent on a Spotify call, per upstream endpoint.')
+metrics.counter('songrec_upstream_requests_total', 'Spotify calls, per upstream endpoint and status code.')
+metrics.counter('songrec_upstream_throttled_total', 'Spotify calls answered with 429.')
+metrics.counter('songrec_upstream_retries_total', 'Spotify calls retried after a 429.')
+metrics.counter('songrec_upstream_rejected_total', 'Spotify calls given up on because of rate limiting.')
+metrics.counter('songrec_cache_hits_total', 'Catalog cache hits.')
+metrics.counter('songrec_cache_misses_total', 'Catalog cache misses.')
+
+# Per-request span tracing. Send `X-Trace: <TRACE_TOKEN>` to trace a request,
+# or set TRACE_SAMPLE_RATE to trace a fraction of all requests. Traces are
+# served, to requests carrying the same header, at /traces/<trace_id> (JSON)
+# and /traces/<trace_id>/waterfall.
+tracer = Tracer(
+    sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', '0')),
+    keep=int(os.getenv('TRACE_KEEP', '100')),
+    directory=os.getenv('TRACE_DIR'),
+    token=os.getenv('TRACE_TOKEN')
+)
+
+# On-demand profiling. A request sent with `X-Profile: <PROFILE_TOKEN>`, or
+# the next request after `flask profile-next`, runs under cProfile and its
+# profile is written to PROFILE_DIR.
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+app.wsgi_app = RequestProfiler(app.wsgi_app, PROFILE_DIR, token=os.getenv('PROFILE_TOKEN'))
+
+# Tiered cache for track and artist metadata: an in-process LRU in front of
+# a SQLite store shared by the workers on this node. Entities are kept as
+# the compact models from models.py that the templates render.
+catalog = CatalogCache(
+    store=SQLiteEntityStore(os.getenv('CATALOG_DB_PATH', os.path.join(app.instance_path, 'catalog.sqlite3'))),
+    maxsize=int(os.getenv('CATALOG_CACHE_SIZE', '2048')),
+    ttls={
+        'track': int(os.getenv('TRACK_CACHE_TTL', str(7 * 24 * 3600))),
+        'artist': int(os.getenv('ARTIST_CACHE_TTL', str(24 * 3600)))
+    },
+    models=MODELS
+)
+
+# Refresh access tokens this many seconds before Spotify says they expire.
+TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', '60'))
+
+# Collapse concurrent refreshes of the same token into one call. Setting
+# TOKEN_REFRESH_LOCK_DIR shares the lock between gunicorn workers.
+token_refresher = SingleFlight(
+    backend=FileLockBackend(os.environ['TOKEN_REFRESH_LOCK_DIR']) if os.getenv('TOKEN_REFRESH_LOCK_DIR') else None
+)
+
+# A single pooled, keep-alive client shared by every route in this worker.
+spotify = SpotifyClient(
+    CLIENT_ID,
+    CLIENT_SECRET,
+    api_base_url=SPOTIFY_API_URL,
+    token_url=TOKEN_URL,
+    pool_size=int(os.getenv('SPOTIFY_POOL_SIZE', '10')),
+    timeout=float(os.getenv('SPOTIFY_TIMEOUT', '10')),
+    scheduler=UpstreamScheduler(
+        rate=float(os.getenv('SPOTIFY_RATE_LIMIT', '10')),
+        burst=int(os.getenv('SPOTIFY_RATE_BURST', '20')),
+        max_wait=float(os.getenv('SPOTIFY_QUEUE_TIMEOUT', '5')),
+        max_retries=int(os.getenv('SPOTIFY_MAX_RETRIES', '2'))
+    ),
+    metrics=metrics
+)
+
+def collect_counters():
+    """
+    Report the scheduler and cache counters with every metrics snapshot.
+    """
+    samples = [
+        ('songrec_cache_hits_total', {}, catalog.hits),
+        ('songrec_cache_misses_total', {}, catalog.misses),
+    ]
+    if spotify.scheduler is not None:
+        stats = spotify.scheduler.stats()
+        samples += [
+            ('songrec_upstream_throttled_total', {}, stats['throttled']),
+            ('songrec_upstream_retries_total', {}, stats['retries']),
+            ('songrec_upstream_rejected_total', {}, stats['rejected']),
+        ]
+    return samples
+
+metrics.add_collector(collect_counters)
+
+# Recommendation engine. 'spotify' asks Spotify for every page. 'local'
+# scores the tracks seen so far (recommended, top and playlist tracks)
+# against the user's top tracks in process, and falls back to Spotify until
+# LOCAL_ENGINE_MIN_TRACKS tracks are indexed.
+RECOMMENDATION_ENGINE = os.getenv('RECOMMENDATION_ENGINE', 'spotify')
+LOCAL_ENGINE_MIN_TRACKS = int(os.getenv('LOCAL_ENGINE_MIN_TRACKS', '200'))
+
+# Approximate nearest-neighbor index used by the local engine for candidate
+# generation once it holds ANN_MIN_TRACKS tracks; below that every track is
+# scored exactly, which is faster. ANN_EF trades recall for latency.
+# `flask build-ann-index` builds the index offline with ANN_M links per node
+# and saves it with an embedding file of the vectors (EMBEDDING_DTYPE float16
+# or int8). Workers memory-map the embedding file, so they share one copy of
+# the vectors, and insert the tracks indexed since.
+FEATURE_STORE_PATH = os.getenv('FEATURE_STORE_PATH', os.path.join(app.instance_path, 'features.emb'))
+ANN_INDEX_PATH = os.getenv('ANN_INDEX_PATH', os.path.join(app.instance_path, 'ann-index.npz'))
+EMBEDDING_DTYPE = os.getenv('EMBEDDING_DTYPE', 'float16')
+ANN_MIN_TRACKS = int(os.getenv('ANN_MIN_TRACKS', '50000'))
+ANN_M = int(os.getenv('ANN_M', '16'))
+ANN_EF_CONSTRUCTION = int(os.getenv('ANN_EF_CONSTRUCTION', '100'))
+ANN_EF = int(os.getenv('ANN_EF', '64'))
+
+def load_local_engine():
+    """
+    Maps the embedding file and loads the index saved by `flask
+    build-ann-index`, if any, and adds the vectors cached in the catalog
+    store since. Without them, every cached vector is loaded into memory.
+
+    Returns:
+    tuple: The feature store and its HNSWIndex.
+    """
+    store = None
+    if os.path.exists(FEATURE_STORE_PATH):
+        try:
+            store = MappedFeatureStore(FEATURE_STORE_PATH)
+        except ValueError as e:
+            logging.warning(f'Ignoring the embedding file: {e}')
+    if store is None:
+        store = TrackFeatureStore.from_items(catalog.store.items('features') if catalog.store else ())
+    else:
+        if catalog.store:
+            # Vectors expire one TTL after they are written, so this skips the ones in the file.
+            store.extend(catalog.store.items('features', expires_after=store.created + catalog.ttls['features']))
+        if os.path.exists(ANN_INDEX_PATH):
+            try:
+                index = HNSWIndex.load(ANN_INDEX_PATH, store, ef=ANN_EF)
+                # Tracks cached since the build are inserted after startup.
+                index.start_sync()
+                return store, index
+            except ValueError as e:
+                logging.warning(f'Rebuilding the recommendation index: {e}')
+    # The engine scores exactly below ANN_MIN_TRACKS, so the graph is only
+    # built, in the background, once the store reaches that size.
+    index = HNSWIndex(store, M=ANN_M, ef_construction=ANN_EF_CONSTRUCTION, ef=ANN_EF, min_rows=ANN_MIN_TRACKS)
+    index.start_sync()
+    return store, index
 
+# Collaborative filtering for the local engine. While it is on, the top,
+# saved and playlist tracks of each user are recorded in the catalog store;
+# `flask train-als` factorizes them offline into ALS_MODEL_PATH, which the
+# workers load at startup and blend with the content-based candidates.
+ALS_MODEL_PATH = os.getenv('ALS_MODEL_PATH', os.path.join(app.instance_path, 'als.npz'))
+SAVED_TRACKS_LIMIT = 50
+
+features = ann_index = engine = als_model = None
+if RECOMMENDATION_ENGINE == 'local':
+    features, ann_index = load_local_engine()
+    engine = RecommendationEngine(features, index=ann_index, exact_below=ANN_MIN_TRACKS)
+    if os.path.exists(ALS_MODEL_PATH):
+        als_model = FactorModel.load(ALS_MODEL_PATH)
+
+# "More like this" on track pages. The tracks of every playlist fetched are
+# recorded in the catalog store; `flask build-neighbors` turns them into
+# each track's top co-occurring tracks, saved to TRACK_NEIGHBORS_PATH and
+# loaded by the workers at startup.
+TRACK_NEIGHBORS_PATH = os.getenv('TRACK_NEIGHBORS_PATH', os.path.join(app.instance_path, 'neighbors.npz'))
+MORE_LIKE_THIS = 10
+track_neighbors = TrackNeighbors.load(TRACK_NEIGHBORS_PATH) if os.path.exists(TRACK_NEIGHBORS_PATH) else None
+
+# Warms the catalog cache in the background with the tracks and artists
+# shown on the recommendations page, and indexes tracks for the local engine.
+prefetcher = Prefetcher(spotify, catalog, max_workers=int(os.getenv('PREFETCH_WORKERS', '2')),
+                        features=features, ann_index=ann_index)
+
+# Number of top tracks and top artists used as recommendation seeds. With
+# more than one, each seed is requested concurrently and the results are
+# merged and reranked.
+RECOMMENDATION_SEEDS = int(os.getenv('RECOMMENDATION_SEEDS', '1'))
+recommender = RecommendationFanOut(spotify, max_workers=int(os.getenv('RECOMMENDATION_WORKERS', '8')))
+
+# Playlists are requested PLAYLIST_PAGE_SIZE at a time (Spotify allows up
+# to 50). After the first page every remaining page is fetched at once,
+# at most PAGINATION_WORKERS per worker.
+PLAYLIST_PAGE_SIZE = int(os.getenv('PLAYLIST_PAGE_SIZE', '50'))
+# Playlist tracks come 100 per page, the most Spotify returns.
+PLAYLIST_TRACKS_PAGE_SIZE = 100
+# Seconds a playlist's snapshot_id, as last seen on the playlists or
+# playlist page, is trusted before the playlist page checks it again.
+PLAYLIST_SNAPSHOT_MAX_AGE = int(os.getenv('PLAYLIST_SNAPSHOT_MAX_AGE', '300'))
+paginator = Paginator(spotify, max_workers=int(os.getenv('PAGINATION_WORKERS', '4')))
+
+@app.cli.command('rotate-secret-key')
+def rotate_secret_key():
+    """
+    Add a new secret key to the key file, keeping the previous ones valid.
+    Restart the workers afterwards to pick it up.
+    """
+    path = os.getenv('SECRET_KEY_FILE') or DEFAULT_SECRET_KEY_FILE
+    keys = rotate_key_file(path)
+    print(f'Rotated secret key in {path} ({len(keys) - 1} previous keys kept)')
+
+@app.cli.command('profile-next')
+@click.option('--count', default=1, show_default=True, help='Number of requests to profile.')
+def profile_next(count):
+    """
+    Profile the next requests served by any worker sharing PROFILE_DIR.
+    """
+    app.wsgi_app.arm(count)
+    print(f'Profiling the next {count} request(s); profiles are written to {PROFILE_DIR}')
+
+@app.cli.command('build-ann-index')
+@click.option('--m', default=ANN_M, show_default=True, help='Links per node.')
+@click.option('--ef-construction', default=ANN_EF_CONSTRUCTION, show_default=True, help='Search width while inserting.')
+def build_ann_index(m, ef_construction):
+    """
+    Build the recommendation index from every vector in the catalog store
+    and save it with the embedding file. Restart the workers to load it.
+    """
+    created = time.time()
+    store = TrackFeatureStore.from_items(catalog.store.items('features') if catalog.store else ())
+    index = HNSWIndex.build(store, M=m, ef_construction=ef_construction, ef=ANN_EF)
+    write_embedding_file(FEATURE_STORE_PATH, store, dtype=EMBEDDING_DTYPE, created=created)
+    # Write next to the target and rename, so starting workers never read a partial file.
+    partial = f'{ANN_INDEX_PATH}.partial.npz'
+    index.save(partial)
+    os.replace(partial, ANN_INDEX_PATH)
+    print(f'Indexed {len(index)} tracks in {time.time() - created:.1f}s; '
+          f'saved to {FEATURE_STORE_PATH} and {ANN_INDEX_PATH}')
+
+@app.cli.command('train-als')
+@click.option('--factors', default=32, show_default=True, help='Latent dimensions.')
+@click.option('--iterations', default=10, show_default=True, help='Alternating passes.')
+@click.option('--regularization', default=0.1, show_default=True, help='L2 penalty on the factors.')
+@click.option('--alpha', default=40.0, show_default=True, help='Confidence per unit of interaction weight.')
+def train_als_model(factors, iterations, regularization, alpha):
+    """
+    Train the collaborative filtering model on the recorded interactions
+    and save it to ALS_MODEL_PATH. Restart the workers to load it.
+    """
+    start = time.time()
+    matrix = InteractionMatrix.from_interactions(read_interactions(catalog.store) if catalog.store else ())
+    model = train_als(matrix, factors=factors, regularization=regularization, alpha=alpha, iterations=iterations)
+    # Write next to the target and rename, so starting workers never read a partial file.
+    partial = f'{ALS_MODEL_PATH}.partial.npz'
+    model.save(partial)
+    os.replace(partial, ALS_MODEL_PATH)
+    print(f'Trained on {matrix.shape[0]} users, {matrix.shape[1]} tracks and {matrix.nnz} interactions '
+          f'in {time.time() - start:.1f}s; saved to {ALS_MODEL_PATH}')
+
+@app.cli.command('build-neighbors')
+@click.option('--k', default=20, show_default=True, help='Neighbors kept per track.')
+@click.option('--min-count', default=2, show_default=True, help='Playlists two tracks must share.')
+def build_neighbors(k, min_count):
+    """
+    Build the "more like this" lists from the recorded playlist tracks and
+    save them to TRACK_NEIGHBORS_PATH. Restart the workers to load them.
+    """
+    start = time.time()
+    builder = CooccurrenceBuilder()
+    for _, track_ids in catalog.store.items('playlist_tracks') if catalog.store else ():
+        builder.add(track_ids)
+    neighbors = builder.build(k=k, min_count=min_count)
+    # Write next to the target and rename, so starting workers never read a partial file.
+    partial = f'{TRACK_NEIGHBORS_PATH}.partial.npz'
+    neighbors.save(partial)
+    os.replace(partial, TRACK_NEIGHBORS_PATH)
+    print(f'Built neighbors of {len(neighbors)} tracks from {builder.playlists} playlists '
+          f'in {time.time() - start:.1f}s; saved to {TRACK_NEIGHBORS_PATH}')
+
+@app.errorhandler(RateLimitExceeded)
+def rate_limited(e):
+    """
+    Tell the user to retry shortly when Spotify is rate limiting us.
+    """
+    logging.warning(str(e))
+    return 'Spotify is busy right now, please try again in a moment.', 503, {'Retry-After': str(math.ceil(e.retry_after))}
+
+@app.before_request
+def start_timer():
+    """
+    Record when the request started and start a trace if one was asked for.
+    """
+    g.request_start = time.perf_counter()
+    if request.endpoint not in ('list_traces', 'get_trace', 'get_trace_waterfall') and tracer.should_trace(request.headers):
+        g.trace, g.trace_token = tracer.start(f'{request.method} {request.path}')
+
+@app.after_request
+def record_request(response):
+    """
+    Record the request duration and status code for /metrics.
+    """
+    if 'request_start' in g:
+        endpoint = request.endpoint or 'unknown'
+        metrics.observe('songrec_request_duration_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+        metrics.inc('songrec_requests_total', endpoint=endpoint, status=str(response.status_code))
+        metrics.maybe_flush()
+    if 'trace' in g:
+        g.trace.add({
+            'span_id': 0,
+            'parent_id': None,
+            'name': f'view {request.endpoint}',
+            'start_ms': 0.0,
+            'duration_ms': round((time.perf_counter() - g.trace.start) * 1000, 3),
+            'thread': 'request',
+            'attrs': {'status': response.status_code},
+        })
+        response.headers['X-Trace-Id'] = g.trace.trace_id
+    return response
+
+@app.teardown_request
+def finish_trace(exc):
+    """
+    Store the trace of the request, if it was traced.
+    """
+    if 'trace' in g:
+        tracer.finish(g.pop('trace'), g.pop('trace_token'))
+
+def render_template(template_name, **context):
+    """
+    Render a template, recording a span when the request is traced.
+    """
+    with span('render', template=template_name):
+        return flask_render_template(template_name, **context)
+
+@app.route('/traces')
+def list_traces():
+    """
+    List the recent traces kept by this worker.
+    """
+    if not tracer.authorized(request.headers):
+        abort(404)
+    return jsonify(tracer.recent())
+
+@app.route('/traces/<trace_id>')
+def get_trace(trace_id):
+    """
+    Export a trace as JSON.
+    """
+    if not tracer.authorized(request.headers):
+        abort(404)
+    trace = tracer.get(trace_id)
+    if trace is None:
+        abort(404)
+    return jsonify(trace)
+
+@app.route('/traces/<trace_id>/waterfall')
+def get_trace_waterfall(trace_id):
+    """
+    Show a trace as a text waterfall.
+    """
+    if not tracer.authorized(request.headers):
+        abort(404)
+    trace = tracer.get(trace_id)
+    if trace is None:
+        abort(404)
+    return Response(render_waterfall(trace), mimetype='text/plain')
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Expose the metrics in the Prometheus text format.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 def get_spotify_headers(token):
     """
@@ -58,9 +457,7 @@ def get_user_id(token):
     """
     Retrieves user ID from Spotify API.
     """
-    headers = get_spotify_headers(token)
-    url = 'https://api.spotify.com/v1/me'
-    response = requests.get(url, headers=headers)
+    response = spotify.get('me', token)
 
     if response.status_code == 200:
         user_data = response.json()
@@ -102,7 +499,7 @@ def login():
     """
     Create the Spotify authorization URL with the necessary scopes and redirect to the login page.
     """
-    scope = 'user-read-private user-read-email playlist-read-private user-top-read playlist-modify-public playlist-modify-private'
+    scope = 'user-read-private user-read-email playlist-read-private user-top-read user-library-read playlist-modify-public playlist-modify-private'
     params = {
         'client_id': CLIENT_ID,
         'response_type': 'code',
@@ -128,8 +525,7 @@ def callback():
     code = request.args.get('code')
     token_data = get_token(code)
     if token_data:
-        session['token'] = token_data['access_token']
-        session['refresh_token'] = token_data['refresh_token']
+        store_token(token_data)
         return redirect(url_for('home'))
     else:
         logging.error('Failed to get token')
@@ -139,24 +535,32 @@ def get_token(code):
     """
     Get access and refresh tokens using the authorization code.
     """
-    auth_str = f"{CLIENT_ID}:{CLIENT_SECRET}"
-    b64_auth_str = base64.urlsafe_b64encode(auth_str.encode()).decode()
-    headers = {
-        'Authorization': f'Basic {b64_auth_str}',
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
     data = {
         'grant_type': 'authorization_code',
         'code': code,
         'redirect_uri': REDIRECT_URI
     }
-    response = requests.post(TOKEN_URL, headers=headers, data=data)
+    response = spotify.post_token(data)
     response_data = response.json()
     return {
         'access_token': response_data.get('access_token'),
-        'refresh_token': response_data.get('refresh_token')
+        'refresh_token': response_data.get('refresh_token'),
+        'expires_in': response_data.get('expires_in')
     }
 
+def store_token(token_data):
+    """
+    Store the token data returned by Spotify in the session, including the
+    absolute time at which the access token expires.
+    """
+    session['token'] = token_data['access_token']
+    if token_data.get('refresh_token'):
+        session['refresh_token'] = token_data['refresh_token']
+    if token_data.get('expires_in'):
+        session['token_expires_at'] = time.time() + int(token_data['expires_in'])
+    else:
+        session.pop('token_expires_at', None)
+
 def refresh_access_token(refresh_token):
     """
     Refresh the Spotify access token using the provided refresh token.
@@ -165,41 +569,70 @@ def refresh_access_token(refresh_token):
     refresh_token (str): The refresh token used to obtain a new access token.
 
     Returns:
-    str: A new access token if the refresh is successful, None otherwise.
+    dict: The new access token, its lifetime in seconds and, when Spotify
+    rotates it, a new refresh token. None if the refresh fails.
     """
-    auth_str = f"{CLIENT_ID}:{CLIENT_SECRET}"
-    b64_auth_str = base64.urlsafe_b64encode(auth_str.encode()).decode()
-    headers = {
-        'Authorization': f'Basic {b64_auth_str}',
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
     data = {
         'grant_type': 'refresh_token',
         'refresh_token': refresh_token
     }
-    response = requests.post(TOKEN_URL, headers=headers, data=data)
+    response = spotify.post_token(data)
     if response.status_code == 200:
         response_data = response.json()
-        return response_data.get('access_token')
+        return {
+            'access_token': response_data.get('access_token'),
+            'refresh_token': response_data.get('refresh_token'),
+            'expires_in': response_data.get('expires_in')
+        }
     else:
         logging.error('Failed to refresh token')
         return None
 
+def refresh_session_token():
+    """
+    Refresh the access token stored in the session. Concurrent requests
+    for the same user share a single refresh.
+
+    Returns:
+    str: The new access token, or None if there is no refresh token or the refresh fails.
+    """
+    refresh_token = session.get('refresh_token')
+    if not refresh_token:
+        return None
+    key = hashlib.sha256(refresh_token.encode()).hexdigest()
+    with span('token refresh'):
+        token_data = token_refresher.do(key, lambda: refresh_access_token(refresh_token))
+    if not token_data or not token_data.get('access_token'):
+        return None
+    store_token(token_data)
+    return token_data['access_token']
+
 def get_valid_token():
     """
-    Retrieve a valid Spotify access token. If the current token is expired, refresh it.
+    Retrieve a valid Spotify access token. If the current token is about to
+    expire, refresh it. No upstream call is made while the token is fresh.
     """
     token = session.get('token')
-    refresh_token = session.get('refresh_token')
-    if token:
-        headers = get_spotify_headers(token)
-        test_response = requests.get('https://api.spotify.com/v1/me', headers=headers)
-        if test_response.status_code == 401 and refresh_token:
-            token = refresh_access_token(refresh_token)
-            if token:
-                session['token'] = token
+    expires_at = session.get('token_expires_at')
+    if token and expires_at and time.time() >= expires_at - TOKEN_REFRESH_MARGIN:
+        token = refresh_session_token() or token
     return token
 
+def api_get(path, token, params=None):
+    """
+    Send a GET request to the Spotify API. If Spotify rejects the token with
+    a 401, refresh it once and retry.
+
+    Returns:
+    requests.Response: The upstream response.
+    """
+    response = spotify.get(path, token, params=params)
+    if response.status_code == 401:
+        new_token = refresh_session_token()
+        if new_token:
+            response = spotify.get(path, new_token, params=params)
+    return response
+
 @app.route('/profile')
 def profile():
     """
@@ -209,8 +642,7 @@ def profile():
     if not token:
         return redirect(url_for('login'))
 
-    headers = get_spotify_headers(token)
-    response = requests.get('https://api.spotify.com/v1/me', headers=headers)
+    response = api_get('me', token)
     if response.status_code != 200:
         return f'Failed to retrieve user info: {response.text}', response.status_code
 
@@ -232,17 +664,126 @@ def get_playlists():
     if not token:
         return redirect(url_for('login'))
 
-    headers = get_spotify_headers(token)
-    response = requests.get('https://api.spotify.com/v1/me/playlists', headers=headers, params={'limit': 20})
+    params = {'limit': PLAYLIST_PAGE_SIZE}
+    response = api_get('me/playlists', token, params=params)
     if response.status_code != 200:
         return f'Failed to retrieve playlists: {response.text}', response.status_code
 
     try:
-        playlists = response.json()
+        first_page = response.json()
+    except ValueError as e:
+        return f'Error decoding JSON: {e}, Response content: {response.text}', 500
+
+    # The remaining pages load while the template renders the first one.
+    items = paginator.paginate('me/playlists', session.get('token', token), first_page, params=params)
+    try:
+        return render_template('playlists.html', playlists={'items': remember_snapshots(items), 'total': items.total})
+    except RateLimitExceeded:
+        items.cancel()
+        raise
+    except requests.RequestException as e:
+        items.cancel()
+        logging.error(f'Failed to retrieve playlists: {e}')
+        return 'Failed to retrieve playlists', 502
+
+def remember_snapshots(playlists):
+    """
+    Yield the playlists as models while recording their snapshot IDs, and
+    when they were seen, in the session, so the playlist page can tell
+    whether its cached tracks are current.
+    """
+    snapshots = {}
+    now = time.time()
+    for playlist in map(Playlist.from_spotify, playlists):
+        snapshots[playlist.id] = [playlist.snapshot_id, now]
+        yield playlist
+    session['playlist_snapshots'] = snapshots
+
+def remember_snapshot(playlist_id, snapshot_id):
+    """
+    Record that a playlist was seen at a snapshot just now.
+    """
+    snapshots = dict(session.get('playlist_snapshots', {}))
+    snapshots[playlist_id] = [snapshot_id, time.time()]
+    session['playlist_snapshots'] = snapshots
+
+def current_snapshot_id(playlist_id, token):
+    """
+    Return the playlist's current snapshot ID with a request for that field
+    only, or None if it could not be read.
+    """
+    response = api_get(f'playlists/{playlist_id}', token, params={'fields': 'snapshot_id'})
+    if response.status_code != 200:
+        return None
+    try:
+        return response.json().get('snapshot_id')
+    except ValueError:
+        return None
+
+@app.route('/playlists/<playlist_id>')
+def get_playlist(playlist_id):
+    """
+    Retrieves every track of a playlist and renders them in 'playlist.html'.
+    Tracks are cached per snapshot_id: if the snapshot last seen is cached
+    and was seen less than PLAYLIST_SNAPSHOT_MAX_AGE ago, no Spotify call
+    is made. An older snapshot is checked by requesting the snapshot_id
+    alone, and the tracks are only refetched when it changed.
+    """
+    token = get_valid_token()
+    if not token:
+        return redirect(url_for('login'))
+
+    seen = session.get('playlist_snapshots', {}).get(playlist_id) or (None, 0)
+    # Sessions from before seen times were recorded hold the snapshot_id alone.
+    snapshot_id, seen_at = (seen, 0) if isinstance(seen, str) else seen
+    if snapshot_id:
+        playlist = catalog.get('playlist', f'{playlist_id}:{snapshot_id}')
+        if playlist is not None:
+            if time.time() - seen_at < PLAYLIST_SNAPSHOT_MAX_AGE:
+                return render_template('playlist.html', playlist=playlist)
+            if current_snapshot_id(playlist_id, token) == snapshot_id:
+                remember_snapshot(playlist_id, snapshot_id)
+                return render_template('playlist.html', playlist=playlist)
+
+    response = api_get(f'playlists/{playlist_id}', token, params={'fields': PLAYLIST_FIELDS, 'market': 'from_token'})
+    if response.status_code != 200:
+        return f'Failed to retrieve playlist: {response.text}', response.status_code
+
+    try:
+        playlist = response.json()
     except ValueError as e:
         return f'Error decoding JSON: {e}, Response content: {response.text}', 500
 
-    return render_template('playlists.html', playlists=playlists)
+    snapshot_id = playlist['snapshot_id']
+    cached = catalog.get('playlist', f'{playlist_id}:{snapshot_id}')
+    if cached is not None:
+        playlist = cached
+    else:
+        items = paginator.paginate(f'playlists/{playlist_id}/tracks', session.get('token', token),
+                                   playlist['tracks'], params={'limit': PLAYLIST_TRACKS_PAGE_SIZE,
+                                                               'fields': PLAYLIST_TRACKS_FIELDS,
+                                                               'market': 'from_token'})
+        try:
+            playlist['tracks'] = {'total': items.total, 'items': list(items)}
+        except RateLimitExceeded:
+            items.cancel()
+            raise
+        except requests.RequestException as e:
+            items.cancel()
+            logging.error(f'Failed to retrieve playlist tracks: {e}')
+            return 'Failed to retrieve playlist tracks', 502
+        playlist = Playlist.from_spotify(playlist)
+        catalog.set('playlist', f'{playlist_id}:{snapshot_id}', playlist)
+        catalog.set('playlist_tracks', playlist_id, [track.id for track in playlist.tracks if track.id],
+                    memory=False)
+        if features is not None:
+            prefetcher.submit(token, index_tracks=playlist.tracks)
+            if session.get('user_id'):
+                record_interactions(catalog, session['user_id'], f'playlist:{playlist_id}',
+                                    [track.id for track in playlist.tracks])
+
+    remember_snapshot(playlist_id, snapshot_id)
+    return render_template('playlist.html', playlist=playlist)
 
 @app.route('/recommendations', methods=['GET'])
 def get_recommendations():
@@ -254,33 +795,179 @@ def get_recommendations():
     if not token:
         return redirect(url_for('login'))
 
-    headers = get_spotify_headers(token)
-    top_tracks_response = requests.get('https://api.spotify.com/v1/me/top/tracks', headers=headers)
-    top_tracks = top_tracks_response.json().get('items', [])
+    # Without the local engine the multi-seed fan-out always runs, so top
+    # artists load alongside top tracks; otherwise they are only requested
+    # when the local engine leaves the page to Spotify.
+    top_artists = None
+    if RECOMMENDATION_SEEDS > 1 and engine is None:
+        top_artists = recommender.submit_top_artists(token, RECOMMENDATION_SEEDS)
 
-    if top_tracks:
-        seed_track = top_tracks[0]['id']
-        recommendations_response = requests.get('https://api.spotify.com/v1/recommendations', headers=headers, params={
-            'seed_tracks': seed_track,
-            'limit': 10
-        })
-    else:
-        user_location = request.form.get('location') or 'ET'
-        recommendations_response = requests.get('https://api.spotify.com/v1/recommendations', headers=headers, params={
-            'seed_genres': 'pop,rock',
-            'limit': 10,
-            'market': user_location
-        })
+    top_tracks_response = api_get('me/top/tracks', token)
+    if top_tracks_response.status_code != 200:
+        return f'Failed to retrieve top tracks: {top_tracks_response.text}', top_tracks_response.status_code
+
+    try:
+        top_tracks = top_tracks_response.json().get('items', [])
+    except ValueError as e:
+        return f'Error decoding JSON: {e}, Response content: {top_tracks_response.text}', 500
+
+    recommendations = None
+    if top_tracks and engine is not None:
+        user_id = current_user_id(token)
+        if user_id:
+            record_interactions(catalog, user_id, 'top', [track.get('id') for track in top_tracks if track])
+            if (catalog.get('interactions', f'{user_id}|saved', count=False, memory=False) is None
+                    and catalog.get('saved_tracks_attempt', user_id, count=False, memory=False) is None):
+                # Marked before it runs, so concurrent views schedule it once and a
+                # failure, e.g. a token granted before user-library-read was asked
+                # for, is only retried after the attempt expires.
+                catalog.set('saved_tracks_attempt', user_id, True, memory=False)
+                prefetcher.executor.submit(collect_saved_tracks, token, user_id)
+        recommendations = recommend_locally(token, top_tracks, limit=10, user_id=user_id)
+
+    if recommendations is None and top_tracks and RECOMMENDATION_SEEDS > 1:
+        # The track seeds are requested while top artists are still loading.
+        recommendations = recommender.recommend(
+            token,
+            track_ids=[track['id'] for track in top_tracks[:RECOMMENDATION_SEEDS]],
+            artist_ids=top_artists or recommender.submit_top_artists(token, RECOMMENDATION_SEEDS),
+            limit=10
+        )
+        if not recommendations['tracks']:
+            logging.error('Every multi-seed recommendation request failed')
+            recommendations = None
 
-    recommendations = recommendations_response.json()
-    session['recommendations'] = recommendations
+    if recommendations is None:
+        if top_tracks:
+            seed_track = top_tracks[0]['id']
+            recommendations_response = api_get('recommendations', token, params={
+                'seed_tracks': seed_track,
+                'limit': 10
+            })
+        else:
+            user_location = request.form.get('location') or 'ET'
+            recommendations_response = api_get('recommendations', token, params={
+                'seed_genres': 'pop,rock',
+                'limit': 10,
+                'market': user_location
+            })
+
+        if recommendations_response.status_code != 200:
+            return f'Failed to retrieve recommendations: {recommendations_response.text}', recommendations_response.status_code
+
+        try:
+            recommendations = recommendations_response.json()
+        except ValueError as e:
+            return f'Error decoding JSON: {e}, Response content: {recommendations_response.text}', 500
+
+    tracks = [Track.from_spotify(track) for track in recommendations.get('tracks') or [] if track]
+    seeds = [{'id': seed.get('id'), 'type': seed.get('type')} for seed in recommendations.get('seeds') or []]
+    session['recommendations'] = {'tracks': [track.to_dict() for track in tracks], 'seeds': seeds}
+    warm_catalog(token, tracks)
+    recommendations = {'tracks': tracks, 'seeds': seeds}
 
     return render_template('recommendations.html', recommendations=recommendations)
 
+def current_user_id(token):
+    """
+    Returns the user's Spotify ID, fetching it once per session.
+    """
+    if not session.get('user_id'):
+        response = api_get('me', token)
+        if response.status_code != 200:
+            return None
+        session['user_id'] = response.json().get('id')
+    return session['user_id']
+
+def collect_saved_tracks(token, user_id):
+    """
+    Records the user's most recently saved tracks as interactions and
+    indexes them. Runs on the prefetcher's threads.
+    """
+    try:
+        response = spotify.get('me/tracks', token, params={'limit': SAVED_TRACKS_LIMIT, 'market': 'from_token'})
+        response.raise_for_status()
+        tracks = [Track.from_spotify(item.get('track')) for item in response.json().get('items') or [] if item]
+    except (requests.RequestException, RateLimitExceeded, ValueError) as e:
+        logging.warning(f'Failed to collect saved tracks: {e}')
+        return
+    tracks = [track for track in tracks if track and track.id]
+    record_interactions(catalog, user_id, 'saved', [track.id for track in tracks])
+    prefetcher.index(token, tracks)
+
+def recommend_locally(token, top_tracks, limit=10, user_id=None):
+    """
+    Recommends tracks scored in process: the indexed tracks closest to the
+    user's top tracks and, if the user is in the collaborative filtering
+    model, the tracks similar listeners have, merged by reciprocal rank.
+
+    Args:
+    token (str): The user's access token.
+    top_tracks (list): The user's top tracks from Spotify.
+    limit (int): Number of tracks to recommend.
+    user_id (str): The user's Spotify ID, if known.
+
+    Returns:
+    dict: Recommendations shaped like Spotify's, or None if neither signal
+        is available yet and Spotify should be asked.
+    """
+    seeds = [Track.from_spotify(track) for track in top_tracks if track and track.get('id')]
+    content_ready = len(features) >= LOCAL_ENGINE_MIN_TRACKS
+    if content_ready:
+        # Index the seeds first so a new user's taste is known on this
+        # request; seeds indexed before cost no Spotify call.
+        prefetcher.index(token, seeds)
+    else:
+        prefetcher.submit(token, index_tracks=seeds)
+        if als_model is None or user_id not in als_model:
+            return None
+    seed_ids = [seed.id for seed in seeds]
+    # Ask for spare candidates in case some dropped out of the catalog.
+    ranked = []
+    if content_ready:
+        taste = engine.taste_vector(seed_ids)
+        if taste is not None:
+            ranked.append(engine.candidates(taste, k=3 * limit, exclude=seed_ids))
+    if als_model is not None and user_id in als_model:
+        ranked.append(als_model.recommend(user_id, k=3 * limit, exclude=seed_ids))
+    if not ranked:
+        return None
+    candidates = merge_and_rerank([[{'id': track_id} for track_id, _ in result] for result in ranked], 3 * limit)
+    tracks = []
+    for candidate in candidates:
+        track = catalog.get('track', candidate['id'], count=False)
+        if track is not None:
+            tracks.append(track)
+            if len(tracks) == limit:
+                break
+    if not tracks:
+        return None
+    return {'tracks': tracks, 'seeds': [{'id': seed_id, 'type': 'TRACK'} for seed_id in seed_ids]}
+
+def warm_catalog(token, tracks):
+    """
+    Cache the track objects we already have and prefetch their primary
+    artists in the background, so clicks from the recommendations page are
+    served locally. Only tracks not cached yet are written, so repeat
+    views cost no store writes.
+    """
+    missing = set(catalog.missing('track', [track.id for track in tracks if track.id]))
+    artist_ids = []
+    for track in tracks:
+        if not track.id:
+            continue
+        if track.id in missing:
+            catalog.set('track', track.id, track)
+        if track.artists:
+            artist_ids.append(track.artists[0].id)
+    if artist_ids or features is not None:
+        prefetcher.submit(token, artist_ids=artist_ids, index_tracks=tracks if features is not None else ())
+
 @app.route('/tracks/<track_id>')
 def get_track(track_id):
     """
     Retrieve a track by its ID and render the track info in a template.
+    Cached tracks are rendered without calling Spotify.
     
     Args:
         track_id (str): The ID of the track to retrieve.
@@ -292,28 +979,48 @@ def get_track(track_id):
     if not token:
         return redirect(url_for('login'))
 
-    headers = get_spotify_headers(token)
-    response = requests.get(f'https://api.spotify.com/v1/tracks/{track_id}', headers=headers)
-    if response.status_code == 200:
-        track_info = response.json()
-        return render_template('track.html', track=track_info)
-    else:
-        return f'Error retrieving track: {response.text}', response.status_code
+    track_info = catalog.get('track', track_id)
+    if track_info is None:
+        response = api_get(f'tracks/{track_id}', token, params={'market': 'from_token'})
+        if response.status_code != 200:
+            return f'Error retrieving track: {response.text}', response.status_code
+        track_info = Track.from_spotify(response.json())
+        catalog.set('track', track_id, track_info)
+    return render_template('track.html', track=track_info, more_like_this=more_like_this(token, track_id))
+
+def more_like_this(token, track_id):
+    """
+    Returns the cached tracks that most often share playlists with a track.
+    Neighbors that are not cached are prefetched for the next visit.
+    """
+    if track_neighbors is None:
+        return []
+    neighbor_ids = [neighbor_id for neighbor_id, _ in track_neighbors.neighbors(track_id, limit=MORE_LIKE_THIS)]
+    missing = catalog.missing('track', neighbor_ids)
+    if missing:
+        prefetcher.submit(token, track_ids=missing)
+    tracks = (catalog.get('track', neighbor_id, count=False) for neighbor_id in neighbor_ids)
+    return [track for track in tracks if track is not None]
 
 @app.route('/artists/<artist_id>')
 def get_artist(artist_id):
     """
     Retrieves artist information by ID and renders it in 'artist.html'.
+    Cached artists are rendered without calling Spotify.
     """
     
     token = get_valid_token()
     if not token:
         return redirect(url_for('login'))
 
-    headers = get_spotify_headers(token)
-    response = requests.get(f'https://api.spotify.com/v1/artists/{artist_id}', headers=headers)
+    artist_info = catalog.get('artist', artist_id)
+    if artist_info is not None:
+        return render_template('artist.html', artist=artist_info)
+
+    response = api_get(f'artists/{artist_id}', token)
     if response.status_code == 200:
-        artist_info = response.json()
+        artist_info = Artist.from_spotify(response.json())
+        catalog.set('artist', artist_id, artist_info)
         return render_template('artist.html', artist=artist_info)
     else:
         return f'Error retrieving artist: {response.text}', response.status_code
@@ -0,0 +1,135 @@
+"""
+This module contains a DataLoader-style batching loader that collects
+single-ID lookups and sends them to Spotify's multi-ID endpoints.
+"""
+import threading
+from concurrent.futures import Future
+
+# Spotify batch endpoints per entity type: (path, response key, max IDs per call)
+BATCH_ENDPOINTS = {
+    'track': ('tracks', 'tracks', 50),
+    'artist': ('artists', 'artists', 50),
+    'audio_features': ('audio-features', 'audio_features', 100),
+}
+
+# Extra query parameters per entity type. With a market Spotify leaves out
+# the long `available_markets` lists; 'from_token' uses the user's country.
+BATCH_PARAMS = {
+    'track': {'market': 'from_token'},
+}
+
+
+class BatchLoader:
+    """
+    Collects keys passed to `load` and resolves them with a single call to
+    `batch_fn`. A batch is sent when it reaches max_batch_size, when the
+    collection window elapses, or when `dispatch` is called.
+
+    Each key is loaded at most once per loader; loading it again returns
+    the same future. Loaders are meant to be short-lived, e.g. one per
+    request or per background job.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=50, window=0.002):
+        """
+        Args:
+        batch_fn (callable): Takes a list of keys and returns a dict mapping
+            each key to its value. Missing keys resolve to None.
+        max_batch_size (int): Maximum number of keys per call.
+        window (float): Seconds to wait for more keys before sending a batch.
+            None waits for `dispatch` or a full batch.
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._pending = []
+        self._timer = None
+
+    def load(self, key):
+        """
+        Schedules the key for loading.
+
+        Returns:
+        concurrent.futures.Future: Resolves to the value for the key.
+        """
+        batch = None
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                return future
+            future = self._futures[key] = Future()
+            self._pending.append(key)
+            if len(self._pending) >= self.max_batch_size:
+                batch = self._take()
+            elif self._timer is None and self.window is not None:
+                self._timer = threading.Timer(self.window, self.dispatch)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._run(batch)
+        return future
+
+    def load_many(self, keys):
+        """
+        Schedules every key for loading.
+
+        Returns:
+        list: One future per key, in the same order.
+        """
+        return [self.load(key) for key in keys]
+
+    def dispatch(self):
+        """
+        Sends the pending keys now.
+        """
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._run(batch)
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _run(self, batch):
+        futures = [self._futures[key] for key in batch]
+        try:
+            results = self.batch_fn(batch)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for key, future in zip(batch, futures):
+            future.set_result(results.get(key))
+
+
+def spotify_loader(client, token, kind, window=0.002):
+    """
+    Creates a loader that resolves track or artist IDs through Spotify's
+    multi-ID endpoint, e.g. `/v1/tracks?ids=`.
+
+    Args:
+    client (SpotifyClient): The shared Spotify client.
+    token (str): The user's access token.
+    kind (str): A key of BATCH_ENDPOINTS, e.g. 'track', 'artist' or 'audio_features'.
+    window (float): Seconds to wait for more IDs; None waits for `dispatch`.
+
+    Returns:
+    BatchLoader: Resolves each ID to its entity, or None if Spotify does not know it.
+    """
+    path, key, max_batch_size = BATCH_ENDPOINTS[kind]
+
+    def fetch(ids):
+        response = client.get(path, token, params=dict(BATCH_PARAMS.get(kind, {}), ids=','.join(ids)))
+        response.raise_for_status()
+        # With a market Spotify may relink a track to a playable copy with
+        # another ID; the requested ID is then in `linked_from`.
+        return {(entity.get('linked_from') or {}).get('id') or entity['id']: entity
+                for entity in response.json().get(key) or [] if entity}
+
+    return BatchLoader(fetch, max_batch_size=max_batch_size, window=window)
@@ -0,0 +1,83 @@
+"""
+Approximate nearest-neighbor benchmark.
+
+Builds an HNSW index over synthetic track vectors shaped like the feature
+store's (clustered, non-negative, unit norm) and reports build time, then
+recall@k and queries per second for exact search and for the index at each
+search width `ef`.
+
+Usage:
+    python benchmarks/bench_ann.py
+    python benchmarks/bench_ann.py --tracks 200000 --ef 32,64,128 --M 16 --ef-construction 100
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from ann_index import HNSWIndex
+from feature_store import DIMENSIONS, RecommendationEngine, TrackFeatureStore
+
+
+def synthetic_store(tracks, clusters, seed):
+    """
+    Returns a feature store of clustered random unit vectors, plus the
+    generator for drawing queries near them.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.random((clusters, DIMENSIONS))
+    vectors = centers[rng.integers(0, clusters, tracks)] + rng.normal(0, 0.15, (tracks, DIMENSIONS))
+    vectors = np.clip(vectors, 0, None)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store = TrackFeatureStore(capacity=tracks)
+    for i, vector in enumerate(vectors):
+        store.add(f't{i:07d}', vector)
+    return store, rng
+
+
+def run(search, queries, k):
+    """
+    Runs every query and returns the result ID sets and the queries per second.
+    """
+    start = time.perf_counter()
+    results = [{track_id for track_id, _ in search(query, k)} for query in queries]
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=50000)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--ef', default='16,32,64,128', help='Comma-separated search widths.')
+    parser.add_argument('--M', type=int, default=16)
+    parser.add_argument('--ef-construction', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    store, rng = synthetic_store(args.tracks, args.clusters, args.seed)
+    queries = store.matrix[rng.integers(0, len(store), args.queries)] + rng.normal(0, 0.05, (args.queries, DIMENSIONS))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+    start = time.perf_counter()
+    index = HNSWIndex.build(store, M=args.M, ef_construction=args.ef_construction, seed=args.seed)
+    print(f'{args.tracks} tracks, {DIMENSIONS} dimensions; built M={args.M} '
+          f'ef_construction={args.ef_construction} in {time.perf_counter() - start:.1f}s')
+
+    engine = RecommendationEngine(store)
+    exact, qps = run(engine.top_k, queries, args.k)
+    print(f'{"search":<12} {f"recall@{args.k}":>10} {"QPS":>10}')
+    print(f'{"exact":<12} {1.0:>10.3f} {qps:>10.0f}')
+    for ef in (int(value) for value in args.ef.split(',')):
+        found, qps = run(lambda query, k: index.search(query, k, ef=ef), queries, args.k)
+        recall = np.mean([len(a & b) / args.k for a, b in zip(found, exact)])
+        print(f'{f"hnsw ef={ef}":<12} {recall:>10.3f} {qps:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
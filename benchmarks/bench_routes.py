@@ -0,0 +1,239 @@
+"""
+Route-level benchmark and load test.
+
+Drives every Flask route at a fixed concurrency against the local Spotify
+stand-in (fake_spotify.py) and reports p50/p95/p99 latency, requests per
+second and upstream calls per request. Results are compared with a stored
+baseline and the script exits with status 1 on a regression.
+
+Usage:
+    python benchmarks/bench_routes.py                      # compare with baseline.json
+    python benchmarks/bench_routes.py --update-baseline    # record a new baseline
+    python benchmarks/bench_routes.py --requests 500 --concurrency 16 --latency lognormal:40:0.5
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import requests
+from fake_spotify import create_fake_spotify, serve_in_thread
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# IDs cycled through by the /tracks and /artists routes, so hot entities repeat.
+TRACK_IDS = [f'bt{i:03d}' for i in range(50)]
+ARTIST_IDS = [f'ba{i:03d}' for i in range(50)]
+
+ROUTES = [
+    ('landing', lambda i: '/'),
+    ('home', lambda i: '/home'),
+    ('login', lambda i: '/login'),
+    ('callback', lambda i: '/callback?code=fake-code'),
+    ('profile', lambda i: '/profile'),
+    ('playlists', lambda i: '/playlists'),
+    ('playlist', lambda i: f'/playlists/pl{i % 45:05d}'),
+    ('recommendations', lambda i: '/recommendations'),
+    ('track', lambda i: f'/tracks/{TRACK_IDS[i % len(TRACK_IDS)]}'),
+    ('artist', lambda i: f'/artists/{ARTIST_IDS[i % len(ARTIST_IDS)]}'),
+    ('images', lambda i: '/images/t.jpg'),
+]
+
+
+def percentile(sorted_values, pct):
+    """
+    Returns the nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def start_app(fake_url, workdir):
+    """
+    Imports the app configured against the stand-in and serves it from a thread.
+
+    Returns:
+    tuple: The server and its base URL.
+    """
+    os.environ.update({
+        'CLIENT_ID': os.environ.get('CLIENT_ID', 'bench-client'),
+        'CLIENT_SECRET': os.environ.get('CLIENT_SECRET', 'bench-secret'),
+        'SECRET_KEY': 'bench-secret-key',
+        'SPOTIFY_API_URL': f'{fake_url}/v1',
+        'SPOTIFY_ACCOUNTS_URL': fake_url,
+        'SESSION_DB_PATH': os.path.join(workdir, 'sessions.sqlite3'),
+        'CATALOG_DB_PATH': os.path.join(workdir, 'catalog.sqlite3'),
+        'SPOTIFY_RATE_LIMIT': '100000',
+        'SPOTIFY_RATE_BURST': '100000',
+    })
+    os.chdir(ROOT)
+    from app import app
+    return serve_in_thread(app)
+
+
+def wait_until_quiet(fake, quiet_for=0.1, timeout=5):
+    """
+    Waits until the stand-in stops receiving calls, so background work
+    (e.g. prefetches) is attributed to the route that caused it.
+    """
+    deadline = time.monotonic() + timeout
+    last = sum(fake.calls.values())
+    while time.monotonic() < deadline:
+        time.sleep(quiet_for)
+        current = sum(fake.calls.values())
+        if current == last:
+            return
+        last = current
+
+
+def run_route(base_url, path_for, sessions, total, fake):
+    """
+    Sends `total` requests to one route using one logged-in session per worker.
+
+    Returns:
+    dict: Latency percentiles in milliseconds, requests/sec, upstream calls
+    per request and the number of failed requests.
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker(http):
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            response = http.get(base_url + path_for(i), allow_redirects=False)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+    wait_until_quiet(fake)
+    calls_before = sum(fake.calls.values())
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+        list(executor.map(worker, sessions))
+    wall = time.perf_counter() - start
+    wait_until_quiet(fake)
+    upstream = sum(fake.calls.values()) - calls_before
+
+    latencies.sort()
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'rps': round(total / wall, 1),
+        'upstream_per_request': round(upstream / total, 3),
+        'errors': len(errors),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results with the baseline.
+
+    Returns:
+    list: One message per regression.
+    """
+    regressions = []
+    for route, result in results.items():
+        base = baseline.get(route)
+        if not base:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance) + 1:
+            regressions.append(f"{route}: p95 {result['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if result['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{route}: {result['rps']} req/s < baseline {base['rps']} req/s")
+        if result['upstream_per_request'] > base['upstream_per_request'] + 0.01:
+            regressions.append(f"{route}: {result['upstream_per_request']} upstream calls/request "
+                               f"> baseline {base['upstream_per_request']}")
+        if result['errors'] > base.get('errors', 0):
+            regressions.append(f"{route}: {result['errors']} failed requests")
+    return regressions
+
+
+def main():
+    """
+    Runs the benchmark from the command line.
+    """
+    parser = argparse.ArgumentParser(description='Route-level benchmark against the Spotify stand-in')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', default='fixed:20', help='stand-in latency distribution')
+    parser.add_argument('--routes', nargs='*', help='only run these routes')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help='allowed relative slowdown in p95 and req/s before failing')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    fake = create_fake_spotify(latency=args.latency, seed=0)
+    fake_server, fake_url = serve_in_thread(fake)
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    app_server, app_url = start_app(fake_url, workdir)
+
+    sessions = []
+    for _ in range(args.concurrency):
+        http = requests.Session()
+        http.get(f'{app_url}/callback?code=fake-code', allow_redirects=False)
+        sessions.append(http)
+
+    results = {}
+    print(f"{'route':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'up/req':>8}{'errors':>8}")
+    for name, path_for in ROUTES:
+        if args.routes and name not in args.routes:
+            continue
+        result = results[name] = run_route(app_url, path_for, sessions, args.requests, fake)
+        print(f"{name:<16}{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+              f"{result['rps']:>9}{result['upstream_per_request']:>8}{result['errors']:>8}")
+
+    app_server.shutdown()
+    fake_server.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    settings = {'requests': args.requests, 'concurrency': args.concurrency, 'latency': args.latency}
+    if args.update_baseline:
+        with open(args.baseline, 'w') as output:
+            json.dump({'settings': settings, 'routes': results}, output, indent=2, sort_keys=True)
+            output.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline found; run with --update-baseline to record one')
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline['settings'] != settings:
+        print(f"Baseline was recorded with {baseline['settings']}; rerun with the same settings to compare")
+        return 2
+    regressions = compare(results, baseline['routes'], args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+This module contains the tiered cache for Spotify catalog entities such as
+tracks and artists: an in-process LRU with TTL in front of a SQLite store
+shared by every worker on the node.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Default time-to-live in seconds per entity type. Track metadata is
+# effectively immutable; artist data (followers, images) changes slowly.
+# Playlist tracks are keyed by snapshot_id, so an entry never goes stale.
+DEFAULT_TTLS = {
+    'track': 7 * 24 * 3600,
+    'artist': 24 * 3600,
+    'playlist': 7 * 24 * 3600,
+    'features': 30 * 24 * 3600,
+    'interactions': 30 * 24 * 3600,
+    'playlist_tracks': 30 * 24 * 3600,
+    # Marks a saved tracks collection as started, so a user whose token lacks
+    # the library scope is not asked again on every page view.
+    'saved_tracks_attempt': 3600,
+}
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded LRU cache whose entries expire at a given time.
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        Args:
+        maxsize (int): Maximum number of entries kept in memory.
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the value for the key, or None if missing or expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires):
+        """
+        Stores the value until the absolute time `expires`.
+        """
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteEntityStore:
+    """
+    Stores JSON entities in a SQLite database shared by the workers on a node.
+    """
+
+    # Purge expired rows after this many writes.
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        """
+        Args:
+        path (str): Path of the SQLite database file.
+        """
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entities '
+                         '(kind TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, '
+                         'expires REAL NOT NULL, PRIMARY KEY (kind, id))')
+            conn.execute('CREATE INDEX IF NOT EXISTS entities_expires ON entities (expires)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def get(self, kind, entity_id):
+        """
+        Returns (expires, value) for the entity, or None if missing or expired.
+        """
+        row = self._connect().execute(
+            'SELECT expires, data FROM entities WHERE kind = ? AND id = ? AND expires > ?',
+            (kind, entity_id, time.time())
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def set(self, kind, entity_id, value, expires):
+        """
+        Stores the entity until the absolute time `expires`.
+        """
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO entities (kind, id, data, expires) VALUES (?, ?, ?, ?)',
+                         (kind, entity_id, json.dumps(value), expires))
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute('DELETE FROM entities WHERE expires <= ?', (time.time(),))
+
+    def items(self, kind, expires_after=None):
+        """
+        Yields (entity_id, value) for every unexpired entity of a type.
+
+        Args:
+        kind (str): The entity type.
+        expires_after (float): Optionally, only yield entities expiring
+            after this time, e.g. the ones written since a given time.
+        """
+        rows = self._connect().execute('SELECT id, data FROM entities WHERE kind = ? AND expires > ?',
+                                       (kind, max(time.time(), expires_after or 0)))
+        for entity_id, data in rows:
+            yield entity_id, json.loads(data)
+
+    def purge_expired(self):
+        """
+        Deletes every expired entity.
+        """
+        with self._connect() as conn:
+            conn.execute('DELETE FROM entities WHERE expires <= ?', (time.time(),))
+
+
+class CatalogCache:
+    """
+    Looks entities up in memory first, then in the shared store. Entries
+    found in the store are promoted to memory with their remaining TTL.
+    """
+
+    def __init__(self, store=None, maxsize=1024, ttls=None, models=None):
+        """
+        Args:
+        store (SQLiteEntityStore): Optional shared on-disk store.
+        maxsize (int): Maximum number of entities kept in memory.
+        ttls (dict): Time-to-live in seconds per entity type.
+        models (dict): Optional model class per entity type, see models.py.
+            Entities are converted with `from_spotify` before caching, kept
+            as models in memory and written to the store with `to_dict`.
+        """
+        self.store = store
+        self.memory = LRUCache(maxsize)
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.models = models or {}
+        self.hits = 0
+        self.misses = 0
+
+    def _from_store(self, kind, entity_id):
+        """
+        Returns (expires, value) from the store, or None. Entries written in
+        an older format are treated as missing.
+        """
+        entry = self.store.get(kind, entity_id) if self.store is not None else None
+        if entry is None or kind not in self.models:
+            return entry
+        try:
+            return entry[0], self.models[kind].from_dict(entry[1])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def get(self, kind, entity_id, count=True, memory=True):
+        """
+        Returns the cached entity, or None on a miss.
+
+        Args:
+        kind (str): The entity type, e.g. 'track' or 'artist'.
+        entity_id (str): The Spotify ID.
+        count (bool): Whether the lookup counts towards hits and misses;
+            background jobs pass False.
+        memory (bool): Whether an entry found in the store is promoted to
+            memory; False for bulk data written with `set(memory=False)`.
+        """
+        key = (kind, entity_id)
+        value = self.memory.get(key)
+        if value is None:
+            entry = self._from_store(kind, entity_id)
+            if entry is not None:
+                expires, value = entry
+                if memory:
+                    self.memory.set(key, value, expires)
+        if not count:
+            return value
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def missing(self, kind, entity_ids):
+        """
+        Returns the IDs, without duplicates, that are in neither tier.
+        Unlike `get` this does not count towards hits and misses.
+        """
+        missing = []
+        for entity_id in dict.fromkeys(entity_ids):
+            if self.memory.get((kind, entity_id)) is not None:
+                continue
+            entry = self._from_store(kind, entity_id)
+            if entry is not None:
+                self.memory.set((kind, entity_id), entry[1], entry[0])
+                continue
+            missing.append(entity_id)
+        return missing
+
+    def set(self, kind, entity_id, value, memory=True):
+        """
+        Caches the entity in both tiers for the TTL of its type. With
+        `memory=False` only the shared store is written, for bulk data that
+        would otherwise evict hot entries from the in-process LRU.
+        """
+        model = self.models.get(kind)
+        if model is not None:
+            value = model.from_spotify(value)
+        expires = time.time() + self.ttls.get(kind, 3600)
+        if memory or self.store is None:
+            self.memory.set((kind, entity_id), value, expires)
+        if self.store is not None:
+            self.store.set(kind, entity_id, value.to_dict() if model is not None else value, expires)
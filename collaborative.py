@@ -0,0 +1,234 @@
+"""
+This module contains collaborative filtering for the local engine: the log
+of tracks each user interacted with, an implicit-feedback ALS trainer over
+the sparse user x track matrix built from it, and the factor model the
+recommendations path scores.
+
+Interactions are kept in the catalog store, one entry per user and source
+('top', 'saved' or 'playlist:<id>'), so every worker records into the same
+place and the trainer reads them offline. Training follows Hu, Koren and
+Volinsky's implicit ALS: every interaction is a preference of 1 with
+confidence 1 + alpha * weight, and every other track a preference of 0
+with confidence 1.
+"""
+import numpy as np
+
+# Interaction weight per source; a track found in several sources adds up.
+SOURCE_WEIGHTS = {'top': 3.0, 'saved': 2.0, 'playlist': 1.0}
+
+
+def record_interactions(catalog, user_id, source, track_ids):
+    """
+    Records the tracks a user has in one source, replacing the previous
+    list. Nothing is written if the list did not change.
+
+    Args:
+    catalog (CatalogCache): The catalog cache whose store is shared.
+    user_id (str): The Spotify user ID.
+    source (str): 'top', 'saved' or 'playlist:<playlist_id>'.
+    track_ids (iterable): The track IDs, in order.
+    """
+    key = f'{user_id}|{source}'
+    track_ids = list(dict.fromkeys(track_id for track_id in track_ids if track_id))
+    if catalog.get('interactions', key, count=False, memory=False) != track_ids:
+        catalog.set('interactions', key, track_ids, memory=False)
+
+
+def read_interactions(store):
+    """
+    Yields (user_id, track_id, weight) for every recorded interaction.
+
+    Args:
+    store (SQLiteEntityStore): The catalog store.
+    """
+    for key, track_ids in store.items('interactions'):
+        user_id, _, source = key.partition('|')
+        weight = SOURCE_WEIGHTS.get(source.partition(':')[0], 1.0)
+        for track_id in track_ids:
+            yield user_id, track_id, weight
+
+
+class InteractionMatrix:
+    """
+    A sparse matrix in compressed sparse row form: the columns and values
+    of row r are `indices[indptr[r]:indptr[r + 1]]` and the same slice of
+    `data`.
+    """
+
+    def __init__(self, row_ids, column_ids, indptr, indices, data):
+        self.row_ids = row_ids
+        self.column_ids = column_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @property
+    def shape(self):
+        return len(self.row_ids), len(self.column_ids)
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @classmethod
+    def _from_coordinates(cls, row_ids, column_ids, rows, columns, values):
+        """
+        Builds the matrix from coordinate arrays, summing duplicate entries.
+        """
+        keys, inverse = np.unique(rows.astype(np.int64) * len(column_ids) + columns, return_inverse=True)
+        data = np.bincount(inverse, weights=values).astype(np.float32)
+        rows = keys // max(len(column_ids), 1)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(row_ids))))).astype(np.int64)
+        return cls(row_ids, column_ids, indptr, (keys % max(len(column_ids), 1)).astype(np.int32), data)
+
+    @classmethod
+    def from_interactions(cls, interactions):
+        """
+        Builds the user x track matrix.
+
+        Args:
+        interactions (iterable): (user_id, track_id, weight) triples, e.g.
+            from `read_interactions`.
+
+        Returns:
+        InteractionMatrix: Rows are users and columns tracks, both in order
+            of first appearance.
+        """
+        users = {}
+        tracks = {}
+        rows = []
+        columns = []
+        values = []
+        for user_id, track_id, weight in interactions:
+            rows.append(users.setdefault(user_id, len(users)))
+            columns.append(tracks.setdefault(track_id, len(tracks)))
+            values.append(weight)
+        return cls._from_coordinates(list(users), list(tracks), np.array(rows, dtype=np.int64),
+                                     np.array(columns, dtype=np.int64), np.array(values, dtype=np.float64))
+
+    def transpose(self):
+        """
+        Returns the column x row matrix, e.g. tracks x users.
+        """
+        rows = np.repeat(np.arange(len(self.row_ids)), np.diff(self.indptr))
+        return InteractionMatrix._from_coordinates(self.column_ids, self.row_ids, self.indices.astype(np.int64),
+                                                   rows, self.data.astype(np.float64))
+
+
+def _least_squares(matrix, fixed, regularization, alpha):
+    """
+    Solves the factors of every row of `matrix` with the other side fixed.
+    Only a row's nonzero columns are visited: the shared Gram matrix of
+    `fixed` stands in for every unobserved column.
+    """
+    factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(factors)
+    solved = np.zeros((matrix.shape[0], factors))
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        observed = fixed[matrix.indices[start:end]]
+        confidence = 1 + alpha * matrix.data[start:end].astype(np.float64)
+        a = gram + (observed.T * (confidence - 1)) @ observed
+        solved[row] = np.linalg.solve(a, observed.T @ confidence)
+    return solved
+
+
+def train_als(matrix, factors=32, regularization=0.1, alpha=40.0, iterations=10, seed=0):
+    """
+    Factorizes an implicit-feedback matrix with alternating least squares.
+
+    Args:
+    matrix (InteractionMatrix): The user x track matrix.
+    factors (int): Latent dimensions.
+    regularization (float): L2 penalty on the factors.
+    alpha (float): Confidence gained per unit of interaction weight.
+    iterations (int): Alternating passes over users and tracks.
+    seed (int): Seed for the initial factors.
+
+    Returns:
+    FactorModel: The trained model.
+    """
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(0, 0.01, (matrix.shape[0], factors))
+    track_factors = rng.normal(0, 0.01, (matrix.shape[1], factors))
+    by_track = matrix.transpose()
+    for _ in range(iterations):
+        user_factors = _least_squares(matrix, track_factors, regularization, alpha)
+        track_factors = _least_squares(by_track, user_factors, regularization, alpha)
+    return FactorModel(matrix.row_ids, matrix.column_ids, user_factors.astype(np.float32),
+                       track_factors.astype(np.float32), matrix.indptr, matrix.indices)
+
+
+class FactorModel:
+    """
+    Trained user and track factors. A user's scores for every track are one
+    matrix-vector product; tracks the user already interacted with are left
+    out.
+    """
+
+    def __init__(self, user_ids, track_ids, user_factors, track_factors, indptr, indices):
+        """
+        Args:
+        user_ids (list): User IDs in row order of `user_factors`.
+        track_ids (list): Track IDs in row order of `track_factors`.
+        user_factors (numpy.ndarray): (users, factors) matrix.
+        track_factors (numpy.ndarray): (tracks, factors) matrix.
+        indptr, indices (numpy.ndarray): The tracks each user interacted
+            with, in compressed sparse row form.
+        """
+        self.user_ids = list(user_ids)
+        self.track_ids = list(track_ids)
+        self.user_factors = user_factors
+        self.track_factors = track_factors
+        self.indptr = indptr
+        self.indices = indices
+        self._users = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self._tracks = {track_id: row for row, track_id in enumerate(self.track_ids)}
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def recommend(self, user_id, k=10, exclude=()):
+        """
+        Returns the k tracks the user is most likely to interact with.
+
+        Args:
+        user_id (str): The Spotify user ID.
+        k (int): Number of tracks to return.
+        exclude (iterable): Further track IDs to leave out, e.g. the seeds.
+
+        Returns:
+        list: (track_id, score) pairs, best first; empty for unknown users.
+        """
+        row = self._users.get(user_id)
+        if row is None or k <= 0 or not self.track_ids:
+            return []
+        scores = self.track_factors @ self.user_factors[row]
+        scores[self.indices[self.indptr[row]:self.indptr[row + 1]]] = -np.inf
+        for track_id in exclude:
+            column = self._tracks.get(track_id)
+            if column is not None:
+                scores[column] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.track_ids[column], float(scores[column])) for column in top if scores[column] != -np.inf]
+
+    def save(self, path):
+        """
+        Writes the model to a .npz file.
+        """
+        np.savez(path, user_ids=np.array(self.user_ids, dtype=str), track_ids=np.array(self.track_ids, dtype=str),
+                 user_factors=self.user_factors, track_factors=self.track_factors,
+                 indptr=self.indptr, indices=self.indices)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a model written by `save`.
+        """
+        with np.load(path) as data:
+            return cls([str(user_id) for user_id in data['user_ids']], [str(track_id) for track_id in data['track_ids']],
+                       data['user_factors'], data['track_factors'], data['indptr'], data['indices'])
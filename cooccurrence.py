@@ -0,0 +1,162 @@
+"""
+This module contains the item-item co-occurrence model behind "more like
+this": tracks that share playlists with a track, ranked by how often they
+do relative to how common both tracks are.
+
+Playlists are streamed into a sparse co-occurrence count matrix, reduced a
+chunk of pairs at a time so memory stays bounded by the number of distinct
+pairs. Counts are normalized to cosine similarity,
+count(i, j) / sqrt(playlists(i) * playlists(j)), and only the top k
+neighbors of each track are kept, in compressed sparse row arrays. A
+lookup is then a dict access and an array slice.
+"""
+import numpy as np
+
+
+class CooccurrenceBuilder:
+    """
+    Accumulates co-occurrence counts from playlists, one at a time.
+    """
+
+    def __init__(self, max_playlist_length=500, chunk_pairs=4000000):
+        """
+        Args:
+        max_playlist_length (int): Tracks used from each playlist. Pairs grow
+            with the square of the length, and very long playlists say
+            little about which tracks go together.
+        chunk_pairs (int): Pairs buffered before they are reduced into the
+            running counts.
+        """
+        self.max_playlist_length = max_playlist_length
+        self.chunk_pairs = chunk_pairs
+        self.track_ids = []
+        self._tracks = {}
+        self._occurrences = []
+        self._pending = []
+        self._pending_pairs = 0
+        # Running counts: keys encode (row << 32) | column.
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.float64)
+        self.playlists = 0
+
+    def add(self, track_ids):
+        """
+        Adds one playlist's tracks. Repeated tracks count once.
+        """
+        columns = []
+        for track_id in dict.fromkeys(track_ids):
+            if not track_id:
+                continue
+            column = self._tracks.get(track_id)
+            if column is None:
+                column = self._tracks[track_id] = len(self.track_ids)
+                self.track_ids.append(track_id)
+                self._occurrences.append(0)
+            columns.append(column)
+            if len(columns) == self.max_playlist_length:
+                break
+        self.playlists += 1
+        for column in columns:
+            self._occurrences[column] += 1
+        if len(columns) < 2:
+            return
+        columns = np.array(columns, dtype=np.int64)
+        rows, cols = np.meshgrid(columns, columns, indexing='ij')
+        mask = rows != cols
+        self._pending.append((rows[mask] << 32) | cols[mask])
+        self._pending_pairs += int(mask.sum())
+        if self._pending_pairs >= self.chunk_pairs:
+            self._reduce()
+
+    def _reduce(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([self._keys] + self._pending)
+        counts = np.concatenate([self._counts, np.ones(self._pending_pairs)])
+        self._keys, inverse = np.unique(keys, return_inverse=True)
+        self._counts = np.bincount(inverse, weights=counts)
+        self._pending = []
+        self._pending_pairs = 0
+
+    def build(self, k=20, min_count=1):
+        """
+        Normalizes the counts and keeps each track's top k neighbors.
+
+        Args:
+        k (int): Neighbors kept per track.
+        min_count (int): Playlists two tracks must share to be neighbors.
+
+        Returns:
+        TrackNeighbors: The neighbor lists.
+        """
+        self._reduce()
+        keep = self._counts >= min_count
+        rows = (self._keys[keep] >> 32).astype(np.int64)
+        columns = (self._keys[keep] & 0xFFFFFFFF).astype(np.int64)
+        occurrences = np.array(self._occurrences, dtype=np.float64)
+        scores = self._counts[keep] / np.sqrt(occurrences[rows] * occurrences[columns])
+
+        # Sort by row, best score first, then keep the first k of each row.
+        order = np.lexsort((columns, -scores, rows))
+        rows, columns, scores = rows[order], columns[order], scores[order]
+        row_starts = np.searchsorted(rows, rows, side='left')
+        ranks = np.arange(len(rows)) - row_starts
+        top = ranks < k
+        rows, columns, scores = rows[top], columns[top], scores[top]
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(self.track_ids)))))
+        return TrackNeighbors(self.track_ids, indptr.astype(np.int64), columns.astype(np.int32),
+                              scores.astype(np.float32))
+
+
+class TrackNeighbors:
+    """
+    The top neighbors of every track, in compressed sparse row form: the
+    neighbors of track row r are `indices[indptr[r]:indptr[r + 1]]`, best
+    first, with their similarities in the same slice of `scores`.
+    """
+
+    def __init__(self, track_ids, indptr, indices, scores):
+        self.track_ids = list(track_ids)
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self._tracks = {track_id: row for row, track_id in enumerate(self.track_ids)}
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def neighbors(self, track_id, limit=None):
+        """
+        Returns the tracks that most often share playlists with a track.
+
+        Args:
+        track_id (str): The track.
+        limit (int): Optional cap below the k the lists were built with.
+
+        Returns:
+        list: (track_id, similarity) pairs, best first; empty for unknown tracks.
+        """
+        row = self._tracks.get(track_id)
+        if row is None:
+            return []
+        start, end = self.indptr[row], self.indptr[row + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return [(self.track_ids[column], float(score))
+                for column, score in zip(self.indices[start:end].tolist(), self.scores[start:end].tolist())]
+
+    def save(self, path):
+        """
+        Writes the neighbor lists to a .npz file.
+        """
+        np.savez(path, track_ids=np.array(self.track_ids, dtype=str), indptr=self.indptr,
+                 indices=self.indices, scores=self.scores)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads neighbor lists written by `save`.
+        """
+        with np.load(path) as data:
+            return cls([str(track_id) for track_id in data['track_ids']], data['indptr'], data['indices'],
+                       data['scores'])
@@ -0,0 +1,242 @@
+"""
+This module contains the on-disk embedding file and the feature store that
+memory-maps it, so every gunicorn worker shares one page-cache copy of the
+track vectors instead of loading its own.
+
+File layout, every section aligned to 64 bytes:
+
+- header: magic, version, vector type, track count, dimensions, ID width,
+  a checksum of the feature layout and the time the vectors were read
+- scales: float32 per dimension; a stored value times its dimension's
+  scale gives the feature value
+- IDs in row order, fixed-width ASCII
+- IDs sorted, with the row of each, for binary-search lookups
+- vectors: float16, or int8 quantized per dimension
+"""
+import mmap
+import os
+import struct
+import time
+import zlib
+import numpy as np
+from feature_store import DIMENSIONS, FEATURE_NAMES, TrackFeatureStore
+
+MAGIC = b'SRECEMB1'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQIIId')
+ALIGNMENT = 64
+
+# Vector type codes written in the header.
+DTYPES = {'float16': 1, 'int8': 2}
+
+# Rows scored at a time, to bound the float32 copy made of quantized rows.
+SCORE_CHUNK = 65536
+
+
+def _layout_checksum():
+    return zlib.crc32(','.join(FEATURE_NAMES).encode())
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _sections(count, dimensions, id_width, dtype):
+    """
+    Returns the byte offsets of the scales, IDs, sorted IDs, sorted rows and
+    vectors, and the file size.
+    """
+    offsets = []
+    offset = HEADER.size
+    for size in (4 * dimensions, id_width * count, id_width * count, 4 * count,
+                 np.dtype(dtype).itemsize * count * dimensions):
+        offset = _aligned(offset)
+        offsets.append(offset)
+        offset += size
+    return offsets, offset
+
+
+def quantize(matrix, dtype):
+    """
+    Converts float32 vectors to the stored type.
+
+    Returns:
+    tuple: The stored vectors and the per-dimension scales.
+    """
+    if dtype == 'float16':
+        return matrix.astype(np.float16), np.ones(matrix.shape[1], dtype=np.float32)
+    if dtype != 'int8':
+        raise ValueError(f'Unknown embedding type {dtype!r}; use float16 or int8')
+    peaks = np.abs(matrix).max(axis=0) if len(matrix) else np.zeros(matrix.shape[1], dtype=np.float32)
+    scales = np.where(peaks > 0, peaks / 127, 1).astype(np.float32)
+    return np.round(matrix / scales).astype(np.int8), scales
+
+
+def write_embedding_file(path, store, dtype='float16', created=None):
+    """
+    Writes every vector of a feature store to an embedding file. The file is
+    written next to `path` and renamed over it, so workers that have the
+    old file mapped keep reading it until they reopen.
+
+    Args:
+    path (str): The file to write.
+    store (TrackFeatureStore): The vectors to write.
+    dtype (str): 'float16' or 'int8'.
+    created (float): When the vectors were read, so readers can add the
+        ones cached since; defaults to now.
+    """
+    ids = [store.id_at(row) for row in range(len(store))]
+    matrix = store.vectors(np.arange(len(ids)))
+    vectors, scales = quantize(matrix, dtype)
+    id_array = np.array(ids, dtype='S')
+    id_width = max(id_array.dtype.itemsize, 1)
+    order = np.argsort(id_array, kind='stable')
+    offsets, size = _sections(len(ids), DIMENSIONS, id_width, vectors.dtype)
+
+    partial = f'{path}.partial'
+    with open(partial, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, DTYPES[dtype], len(ids), DIMENSIONS, id_width, _layout_checksum(),
+                             time.time() if created is None else created))
+        for offset, data in zip(offsets, (scales, id_array, id_array[order], order.astype(np.uint32), vectors)):
+            f.seek(offset)
+            f.write(np.ascontiguousarray(data).tobytes())
+        f.truncate(size)
+    os.replace(partial, path)
+
+
+class MappedFeatureStore:
+    """
+    A feature store whose rows come from a memory-mapped embedding file,
+    followed by in-memory rows for tracks indexed after the file was
+    written. Opening only reads the header; pages are loaded on first use
+    and shared by every process mapping the file.
+
+    It has the reading interface of `TrackFeatureStore`, so the engine and
+    the nearest-neighbor index work with either. Tracks in the file are
+    read-only: adding one again keeps its stored vector.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+        path (str): An embedding file written by `write_embedding_file`.
+
+        Raises:
+        ValueError: If the file is not an embedding file or was written
+            with a different feature layout.
+        """
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            raise ValueError(f'{path} is not an embedding file')
+        magic, version, dtype_code, count, dimensions, id_width, checksum, created = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION or dtype_code not in DTYPES.values():
+            raise ValueError(f'{path} is not an embedding file')
+        if dimensions != DIMENSIONS or checksum != _layout_checksum():
+            raise ValueError(f'{path} was built with a different feature layout')
+        self.created = created
+        self.dtype = next(name for name, code in DTYPES.items() if code == dtype_code)
+        offsets, size = _sections(count, dimensions, id_width, self.dtype)
+        if len(self._mmap) < size:
+            raise ValueError(f'{path} is truncated')
+
+        def section(offset, dtype, shape):
+            return np.frombuffer(self._mmap, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+
+        self._scales = section(offsets[0], np.float32, (dimensions,))
+        self._ids = section(offsets[1], f'S{id_width}', (count,))
+        self._sorted_ids = section(offsets[2], f'S{id_width}', (count,))
+        self._sorted_rows = section(offsets[3], np.uint32, (count,))
+        self._vectors = section(offsets[4], self.dtype, (count, dimensions))
+        self._count = count
+        self._tail = TrackFeatureStore()
+
+    def __len__(self):
+        return self._count + len(self._tail)
+
+    def __contains__(self, track_id):
+        return self.row(track_id) is not None
+
+    def _file_row(self, track_id):
+        key = track_id.encode()
+        position = int(np.searchsorted(self._sorted_ids, key))
+        if position < self._count and self._sorted_ids[position] == key:
+            return int(self._sorted_rows[position])
+        return None
+
+    def row(self, track_id):
+        """
+        Returns the row of a track, or None if it is not stored.
+        """
+        row = self._file_row(track_id)
+        if row is not None:
+            return row
+        row = self._tail.row(track_id)
+        return None if row is None else self._count + row
+
+    def id_at(self, row):
+        """
+        Returns the track ID of a row.
+        """
+        if row < self._count:
+            return self._ids[row].decode()
+        return self._tail.id_at(row - self._count)
+
+    def get(self, track_id):
+        """
+        Returns the vector of a track, or None if it is not stored.
+        """
+        row = self.row(track_id)
+        return None if row is None else self.vectors([row])[0]
+
+    def vectors(self, rows):
+        """
+        Returns the (len(rows), DIMENSIONS) float32 vectors of the given rows.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        in_file = rows < self._count
+        if in_file.all():
+            return self._vectors[rows].astype(np.float32) * self._scales
+        result = np.empty((len(rows), DIMENSIONS), dtype=np.float32)
+        result[in_file] = self._vectors[rows[in_file]].astype(np.float32) * self._scales
+        result[~in_file] = self._tail.vectors(rows[~in_file] - self._count)
+        return result
+
+    def scores(self, query):
+        """
+        Returns the inner product of every stored vector with `query`. The
+        scales are folded into the query, so stored rows are only widened
+        to float32 a chunk at a time.
+        """
+        # The prefetcher may add tail rows meanwhile; size the result from one read of the tail.
+        tail = self._tail.scores(np.asarray(query, dtype=np.float32))
+        scaled = (np.asarray(query, dtype=np.float32) * self._scales).astype(np.float32)
+        scores = np.empty(self._count + len(tail), dtype=np.float32)
+        for start in range(0, self._count, SCORE_CHUNK):
+            end = min(start + SCORE_CHUNK, self._count)
+            scores[start:end] = self._vectors[start:end].astype(np.float32) @ scaled
+        scores[self._count:] = tail
+        return scores
+
+    def add(self, track_id, vector):
+        """
+        Stores the vector of a track that is not in the file.
+
+        Returns:
+        int: The track's row.
+        """
+        row = self._file_row(track_id)
+        if row is not None:
+            return row
+        return self._count + self._tail.add(track_id, vector)
+
+    def extend(self, items):
+        """
+        Adds (track_id, vector) pairs for tracks not stored yet; see
+        `TrackFeatureStore.extend`.
+
+        Returns:
+        int: The number of tracks added.
+        """
+        return self._tail.extend((track_id, vector) for track_id, vector in items
+                                 if self._file_row(track_id) is None)
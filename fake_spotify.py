@@ -0,0 +1,507 @@
+"""
+This module contains a local stand-in for the Spotify accounts service and
+Web API, used to exercise, benchmark and load-test the app offline.
+
+It serves deterministic fake data with realistic payload shapes and can add
+latency, server errors and 429 responses. Run it with:
+
+    python fake_spotify.py --port 5001 --latency lognormal:40:0.5 --error-rate 0.01 --throttle-rate 0.02
+
+and point the app at it with:
+
+    SPOTIFY_API_URL=http://127.0.0.1:5001/v1 SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:5001
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from flask import Flask, jsonify, redirect, request
+from werkzeug.serving import make_server
+
+GENRES = ['pop', 'rock', 'indie', 'hip hop', 'jazz', 'electronic', 'soul', 'folk',
+          'metal', 'classical', 'reggae', 'afrobeat', 'r&b', 'country', 'ethio-jazz']
+
+# Synthetic market codes; real track objects carry ~180 of them.
+MARKETS = [a + b for a in 'ABCDEFGHIJ' for b in 'ABCDEFGHIJKLMNOPQR']
+
+
+class Latency:
+    """
+    Samples the artificial latency added to each request.
+
+    Specs: 'none', 'fixed:MS', 'uniform:MIN_MS:MAX_MS' or 'lognormal:MEDIAN_MS:SIGMA'.
+    """
+
+    def __init__(self, spec='none', rng=None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, *args = spec.split(':')
+        self.kind = kind
+        self.args = [float(arg) for arg in args]
+        if kind not in ('none', 'fixed', 'uniform', 'lognormal'):
+            raise ValueError(f'Unknown latency distribution: {spec}')
+
+    def sample(self):
+        """
+        Returns a latency in seconds.
+        """
+        if self.kind == 'fixed':
+            return self.args[0] / 1000
+        if self.kind == 'uniform':
+            return self.rng.uniform(self.args[0], self.args[1]) / 1000
+        if self.kind == 'lognormal':
+            return self.rng.lognormvariate(math.log(self.args[0]), self.args[1]) / 1000
+        return 0.0
+
+
+def _images(seed):
+    return [{'url': f'https://i.scdn.co/image/{seed}-{size}', 'height': size, 'width': size}
+            for size in (640, 300, 64)]
+
+
+def fake_artist(artist_id, full=True):
+    """
+    Returns a deterministic artist object; `full=False` gives the simplified form.
+    """
+    artist = {
+        'id': artist_id,
+        'name': f'Artist {artist_id}',
+        'type': 'artist',
+        'uri': f'spotify:artist:{artist_id}',
+        'href': f'https://api.spotify.com/v1/artists/{artist_id}',
+        'external_urls': {'spotify': f'https://open.spotify.com/artist/{artist_id}'}
+    }
+    if full:
+        rng = random.Random(artist_id)
+        artist.update({
+            'genres': rng.sample(GENRES, 2),
+            'followers': {'href': None, 'total': rng.randint(100, 5000000)},
+            'images': _images(artist_id),
+            'popularity': rng.randint(0, 100)
+        })
+    return artist
+
+
+def fake_track(track_id):
+    """
+    Returns a deterministic full track object.
+    """
+    rng = random.Random(track_id)
+    artists = [fake_artist(f'ar{rng.randint(0, 999):04d}', full=False) for _ in range(rng.randint(1, 2))]
+    album_id = f'al{rng.randint(0, 9999):05d}'
+    return {
+        'id': track_id,
+        'name': f'Track {track_id}',
+        'type': 'track',
+        'uri': f'spotify:track:{track_id}',
+        'href': f'https://api.spotify.com/v1/tracks/{track_id}',
+        'external_urls': {'spotify': f'https://open.spotify.com/track/{track_id}'},
+        'external_ids': {'isrc': f'FAKE{rng.randint(0, 10 ** 8):08d}'},
+        'artists': artists,
+        'album': {
+            'id': album_id,
+            'name': f'Album {album_id}',
+            'album_type': 'album',
+            'total_tracks': rng.randint(5, 20),
+            'release_date': f'{rng.randint(1970, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'release_date_precision': 'day',
+            'images': _images(album_id),
+            'artists': artists,
+            'available_markets': MARKETS,
+            'uri': f'spotify:album:{album_id}',
+            'href': f'https://api.spotify.com/v1/albums/{album_id}',
+            'external_urls': {'spotify': f'https://open.spotify.com/album/{album_id}'}
+        },
+        'available_markets': MARKETS,
+        'disc_number': 1,
+        'track_number': rng.randint(1, 12),
+        'duration_ms': rng.randint(120000, 360000),
+        'explicit': rng.random() < 0.2,
+        'is_local': False,
+        'popularity': rng.randint(0, 100),
+        'preview_url': f'https://p.scdn.co/mp3-preview/{track_id}' if rng.random() < 0.7 else None
+    }
+
+
+def fake_audio_features(track_id):
+    """
+    Returns deterministic audio features for a track.
+    """
+    rng = random.Random(f'features-{track_id}')
+    return {
+        'id': track_id,
+        'type': 'audio_features',
+        'danceability': round(rng.random(), 3),
+        'energy': round(rng.random(), 3),
+        'key': rng.randint(0, 11),
+        'loudness': round(rng.uniform(-30, 0), 3),
+        'mode': rng.randint(0, 1),
+        'speechiness': round(rng.random() * 0.5, 4),
+        'acousticness': round(rng.random(), 4),
+        'instrumentalness': round(rng.random() ** 3, 4),
+        'liveness': round(rng.random() * 0.6, 4),
+        'valence': round(rng.random(), 3),
+        'tempo': round(rng.uniform(60, 200), 3),
+        'duration_ms': rng.randint(120000, 360000),
+        'time_signature': 4
+    }
+
+
+def fake_playlist(index, user_id, version=1):
+    """
+    Returns a deterministic simplified playlist object. Bumping `version`
+    changes its snapshot_id, as editing a real playlist does.
+    """
+    playlist_id = f'pl{index:05d}'
+    rng = random.Random(playlist_id)
+    return {
+        'id': playlist_id,
+        'name': f'Playlist {index}',
+        'description': '',
+        'collaborative': False,
+        'public': True,
+        'snapshot_id': f'snap-{playlist_id}-{version}',
+        'images': _images(playlist_id),
+        'owner': {'id': user_id, 'display_name': 'Fake User', 'type': 'user'},
+        'tracks': {'href': f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks',
+                   'total': rng.randint(0, 300)},
+        'type': 'playlist',
+        'uri': f'spotify:playlist:{playlist_id}',
+        'href': f'https://api.spotify.com/v1/playlists/{playlist_id}',
+        'external_urls': {'spotify': f'https://open.spotify.com/playlist/{playlist_id}'}
+    }
+
+
+def fake_playlist_track(playlist_id, position, version=1):
+    """
+    Returns the playlist track object at a position of a fake playlist.
+    """
+    return {
+        'added_at': '2024-01-01T00:00:00Z',
+        'added_by': {'id': 'fakeuser', 'type': 'user'},
+        'is_local': False,
+        'track': fake_track(f'{playlist_id}v{version}t{position:04d}')
+    }
+
+
+def parse_fields(spec):
+    """
+    Parses a `fields` filter such as 'id,tracks(total,items(track(id)))'
+    into a nested dict; None marks a field kept whole.
+    """
+    root = {}
+    stack = [root]
+    name = ''
+    for char in spec + ',':
+        if char not in ',()':
+            name += char
+            continue
+        name = name.strip()
+        if char == '(':
+            child = stack[-1][name] = {}
+            stack.append(child)
+        elif name:
+            stack[-1][name] = None
+        if char == ')' and len(stack) > 1:
+            stack.pop()
+        name = ''
+    return root
+
+
+def apply_fields(value, fields):
+    """
+    Keeps only the fields selected by a parsed `fields` filter.
+    """
+    if fields is None:
+        return value
+    if isinstance(value, list):
+        return [apply_fields(item, fields) for item in value]
+    if isinstance(value, dict):
+        return {key: apply_fields(value[key], sub) for key, sub in fields.items() if key in value}
+    return value
+
+
+def strip_markets(value):
+    """
+    Drops `available_markets`, as Spotify does when a market is given.
+    """
+    if isinstance(value, list):
+        return [strip_markets(item) for item in value]
+    if isinstance(value, dict):
+        return {key: strip_markets(item) for key, item in value.items() if key != 'available_markets'}
+    return value
+
+
+def _page(items, limit, offset, total, url):
+    next_url = None
+    if offset + limit < total:
+        next_url = f"{url}?{urllib.parse.urlencode({'limit': limit, 'offset': offset + limit})}"
+    return {'items': items, 'limit': limit, 'offset': offset, 'total': total, 'next': next_url,
+            'previous': None, 'href': url}
+
+
+def create_fake_spotify(latency='none', error_rate=0.0, throttle_rate=0.0, retry_after=1,
+                        playlist_count=45, seed=None):
+    """
+    Creates the stand-in Flask app.
+
+    Args:
+    latency (str): Latency distribution spec, see `Latency`.
+    error_rate (float): Fraction of requests answered with a 500.
+    throttle_rate (float): Fraction of requests answered with a 429.
+    retry_after (int): Retry-After seconds sent with each 429.
+    playlist_count (int): Number of playlists the fake user owns.
+    seed (int): Seed for latency and fault injection.
+
+    Returns:
+    Flask: The app. `app.calls` counts requests per endpoint.
+    """
+    fake = Flask(__name__)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    delay = Latency(latency, rng)
+    tokens = itertools.count(1)
+    user_id = 'fakeuser'
+    fake.calls = Counter()
+    # Edits per playlist ID; see /_edit/<playlist_id>.
+    fake.playlist_versions = Counter()
+    calls_lock = threading.Lock()
+
+    @fake.before_request
+    def inject_faults():
+        if request.path.startswith('/_'):
+            return None
+        with calls_lock:
+            fake.calls[request.endpoint] += 1
+        with rng_lock:
+            wait = delay.sample()
+            roll = rng.random()
+        if wait:
+            time.sleep(wait)
+        if roll < throttle_rate:
+            return jsonify(error={'status': 429, 'message': 'API rate limit exceeded'}), 429, \
+                {'Retry-After': str(retry_after)}
+        if roll < throttle_rate + error_rate:
+            return jsonify(error={'status': 500, 'message': 'Server error'}), 500
+        if request.path.startswith('/v1/') and not request.headers.get('Authorization', '').startswith('Bearer '):
+            return jsonify(error={'status': 401, 'message': 'No token provided'}), 401
+        return None
+
+    @fake.after_request
+    def trim_payload(response):
+        if response.status_code != 200 or not response.is_json:
+            return response
+        if not request.args.get('market') and not request.args.get('fields'):
+            return response
+        body = response.get_json()
+        if request.args.get('market'):
+            body = strip_markets(body)
+        if request.args.get('fields'):
+            body = apply_fields(body, parse_fields(request.args['fields']))
+        response.set_data(json.dumps(body))
+        return response
+
+    @fake.route('/_stats')
+    def stats():
+        with calls_lock:
+            return jsonify(dict(fake.calls))
+
+    @fake.route('/_reset', methods=['POST'])
+    def reset():
+        with calls_lock:
+            fake.calls.clear()
+        fake.playlist_versions.clear()
+        return '', 204
+
+    @fake.route('/_edit/<playlist_id>', methods=['POST'])
+    def edit_playlist(playlist_id):
+        fake.playlist_versions[playlist_id] += 1
+        return '', 204
+
+    def playlist_version(playlist_id):
+        return fake.playlist_versions[playlist_id] + 1
+
+    def playlist_index(playlist_id):
+        if not playlist_id.startswith('pl') or not playlist_id[2:].isdigit() or \
+                int(playlist_id[2:]) >= playlist_count:
+            return None
+        return int(playlist_id[2:])
+
+    def playlist_tracks_page(playlist, limit, offset):
+        version = playlist_version(playlist['id'])
+        total = playlist['tracks']['total']
+        items = [fake_playlist_track(playlist['id'], i, version) for i in range(offset, min(offset + limit, total))]
+        return _page(items, limit, offset, total, f"{request.host_url}v1/playlists/{playlist['id']}/tracks")
+
+    @fake.route('/authorize')
+    def authorize():
+        params = {'code': 'fake-code'}
+        if request.args.get('state'):
+            params['state'] = request.args['state']
+        return redirect(f"{request.args['redirect_uri']}?{urllib.parse.urlencode(params)}")
+
+    @fake.route('/api/token', methods=['POST'])
+    def token():
+        grant_type = request.form.get('grant_type')
+        if grant_type not in ('authorization_code', 'refresh_token'):
+            return jsonify(error='unsupported_grant_type'), 400
+        body = {'access_token': f'fake-access-{next(tokens)}', 'token_type': 'Bearer', 'expires_in': 3600}
+        if grant_type == 'authorization_code':
+            body['refresh_token'] = 'fake-refresh'
+            body['scope'] = 'user-read-private user-read-email playlist-read-private user-top-read'
+        return jsonify(body)
+
+    @fake.route('/v1/me')
+    def me():
+        return jsonify({
+            'id': user_id,
+            'display_name': 'Fake User',
+            'email': 'fake@example.com',
+            'country': 'ET',
+            'product': 'premium',
+            'followers': {'href': None, 'total': 0},
+            'images': _images(user_id),
+            'type': 'user',
+            'uri': f'spotify:user:{user_id}',
+            'external_urls': {'spotify': f'https://open.spotify.com/user/{user_id}'}
+        })
+
+    @fake.route('/v1/me/top/tracks')
+    def top_tracks():
+        limit = int(request.args.get('limit', 20))
+        offset = int(request.args.get('offset', 0))
+        items = [fake_track(f'top{i:04d}') for i in range(offset, min(offset + limit, 50))]
+        return jsonify(_page(items, limit, offset, 50, request.base_url))
+
+    @fake.route('/v1/me/top/artists')
+    def top_artists():
+        limit = int(request.args.get('limit', 20))
+        offset = int(request.args.get('offset', 0))
+        items = [fake_artist(f'ar{i:04d}') for i in range(offset, min(offset + limit, 50))]
+        return jsonify(_page(items, limit, offset, 50, request.base_url))
+
+    @fake.route('/v1/me/tracks')
+    def saved_tracks():
+        limit = min(int(request.args.get('limit', 20)), 50)
+        offset = int(request.args.get('offset', 0))
+        items = [{'added_at': '2024-01-01T00:00:00Z', 'track': fake_track(f'saved{i:04d}')}
+                 for i in range(offset, min(offset + limit, 100))]
+        return jsonify(_page(items, limit, offset, 100, request.base_url))
+
+    @fake.route('/v1/me/playlists')
+    def playlists():
+        limit = min(int(request.args.get('limit', 20)), 50)
+        offset = int(request.args.get('offset', 0))
+        items = [fake_playlist(i, user_id, playlist_version(f'pl{i:05d}'))
+                 for i in range(offset, min(offset + limit, playlist_count))]
+        return jsonify(_page(items, limit, offset, playlist_count, request.base_url))
+
+    @fake.route('/v1/playlists/<playlist_id>')
+    def playlist(playlist_id):
+        index = playlist_index(playlist_id)
+        if index is None:
+            return jsonify(error={'status': 404, 'message': 'Not found.'}), 404
+        body = fake_playlist(index, user_id, playlist_version(playlist_id))
+        body['followers'] = {'href': None, 'total': 0}
+        body['tracks'] = playlist_tracks_page(body, 100, 0)
+        return jsonify(body)
+
+    @fake.route('/v1/playlists/<playlist_id>/tracks')
+    def playlist_tracks(playlist_id):
+        index = playlist_index(playlist_id)
+        if index is None:
+            return jsonify(error={'status': 404, 'message': 'Not found.'}), 404
+        limit = min(int(request.args.get('limit', 100)), 100)
+        offset = int(request.args.get('offset', 0))
+        playlist = fake_playlist(index, user_id, playlist_version(playlist_id))
+        return jsonify(playlist_tracks_page(playlist, limit, offset))
+
+    @fake.route('/v1/recommendations')
+    def recommendations():
+        limit = min(int(request.args.get('limit', 20)), 100)
+        seeds = []
+        for param, seed_type in (('seed_tracks', 'TRACK'), ('seed_artists', 'ARTIST'), ('seed_genres', 'GENRE')):
+            seeds += [{'id': seed_id, 'type': seed_type} for seed_id in request.args.get(param, '').split(',') if seed_id]
+        if not seeds:
+            return jsonify(error={'status': 400, 'message': 'No seeds'}), 400
+        seed_rng = random.Random(','.join(seed['id'] for seed in seeds))
+        tracks = [fake_track(f'rec{seed_rng.randint(0, 99999):05d}') for _ in range(limit)]
+        return jsonify({'tracks': tracks, 'seeds': seeds})
+
+    @fake.route('/v1/tracks/<track_id>')
+    def track(track_id):
+        return jsonify(fake_track(track_id))
+
+    @fake.route('/v1/tracks')
+    def tracks():
+        ids = [track_id for track_id in request.args.get('ids', '').split(',') if track_id]
+        if not ids or len(ids) > 50:
+            return jsonify(error={'status': 400, 'message': 'Invalid ids'}), 400
+        return jsonify({'tracks': [fake_track(track_id) for track_id in ids]})
+
+    @fake.route('/v1/audio-features/<track_id>')
+    def audio_features(track_id):
+        return jsonify(fake_audio_features(track_id))
+
+    @fake.route('/v1/audio-features')
+    def several_audio_features():
+        ids = [track_id for track_id in request.args.get('ids', '').split(',') if track_id]
+        if not ids or len(ids) > 100:
+            return jsonify(error={'status': 400, 'message': 'Invalid ids'}), 400
+        return jsonify({'audio_features': [fake_audio_features(track_id) for track_id in ids]})
+
+    @fake.route('/v1/artists/<artist_id>')
+    def artist(artist_id):
+        return jsonify(fake_artist(artist_id))
+
+    @fake.route('/v1/artists')
+    def artists():
+        ids = [artist_id for artist_id in request.args.get('ids', '').split(',') if artist_id]
+        if not ids or len(ids) > 50:
+            return jsonify(error={'status': 400, 'message': 'Invalid ids'}), 400
+        return jsonify({'artists': [fake_artist(artist_id) for artist_id in ids]})
+
+    return fake
+
+
+def serve_in_thread(fake, host='127.0.0.1', port=0):
+    """
+    Serves the app from a background thread.
+
+    Returns:
+    tuple: The server (call `shutdown()` to stop it) and its base URL.
+    """
+    server = make_server(host, port, fake, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+def main():
+    """
+    Runs the stand-in from the command line.
+    """
+    parser = argparse.ArgumentParser(description='Local Spotify API stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--latency', default='none',
+                        help="'none', 'fixed:MS', 'uniform:MIN_MS:MAX_MS' or 'lognormal:MEDIAN_MS:SIGMA'")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--playlists', type=int, default=45)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    fake = create_fake_spotify(args.latency, args.error_rate, args.throttle_rate,
+                               args.retry_after, args.playlists, args.seed)
+    fake.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+This module contains the local track feature store and the vectorized
+recommendation engine that scores it.
+
+Each track is a normalized vector of its audio features, its popularity and
+one-hot flags for the genres of its primary artist. The store keeps the
+vectors in one NumPy matrix with an ID-to-row index, so scoring every
+candidate against a user's taste is one matrix-vector product followed by
+an `argpartition` top-k.
+"""
+import threading
+import numpy as np
+
+# Audio features used, with the range each is scaled from to [0, 1].
+AUDIO_FEATURES = {
+    'danceability': (0.0, 1.0),
+    'energy': (0.0, 1.0),
+    'valence': (0.0, 1.0),
+    'acousticness': (0.0, 1.0),
+    'instrumentalness': (0.0, 1.0),
+    'speechiness': (0.0, 1.0),
+    'liveness': (0.0, 1.0),
+    'loudness': (-60.0, 0.0),
+    'tempo': (0.0, 250.0),
+}
+
+# Broad genres used as one-hot flags. An artist genre sets every flag whose
+# name is one of its words or the whole genre, e.g. 'indie rock' sets
+# 'indie' and 'rock'.
+GENRES = ('pop', 'rock', 'indie', 'hip hop', 'rap', 'jazz', 'electronic', 'dance', 'soul', 'r&b', 'folk',
+          'country', 'metal', 'punk', 'classical', 'reggae', 'latin', 'afrobeat', 'blues', 'ambient')
+
+# Weight of the genre flags relative to the audio features.
+GENRE_WEIGHT = 0.5
+
+FEATURE_NAMES = tuple(AUDIO_FEATURES) + ('popularity',) + tuple(f'genre:{genre}' for genre in GENRES)
+DIMENSIONS = len(FEATURE_NAMES)
+
+
+def track_vector(audio_features, popularity=0, genres=()):
+    """
+    Builds the normalized feature vector of a track.
+
+    Args:
+    audio_features (dict): The track's audio features object from Spotify.
+    popularity (int): The track's popularity, 0 to 100.
+    genres (iterable): Genre names of the track's primary artist.
+
+    Returns:
+    numpy.ndarray: A float32 vector of length DIMENSIONS with unit norm.
+    """
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for i, (name, (low, high)) in enumerate(AUDIO_FEATURES.items()):
+        value = audio_features.get(name)
+        if value is not None:
+            vector[i] = min(max((value - low) / (high - low), 0.0), 1.0)
+    vector[len(AUDIO_FEATURES)] = (popularity or 0) / 100
+    offset = len(AUDIO_FEATURES) + 1
+    words = set()
+    for genre in genres:
+        words.add(genre)
+        words.update(genre.split())
+    for i, genre in enumerate(GENRES):
+        if genre in words:
+            vector[offset + i] = GENRE_WEIGHT
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class TrackFeatureStore:
+    """
+    Holds one normalized feature vector per track in a growable matrix.
+    Adding is thread-safe; readers see a consistent prefix of the rows.
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        Args:
+        capacity (int): Rows allocated up front; the matrix doubles when full.
+        """
+        self._data = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        self._ids = []
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, track_id):
+        return track_id in self._index
+
+    @property
+    def matrix(self):
+        """
+        The (n, DIMENSIONS) matrix of the n stored vectors.
+        """
+        return self._data[:len(self._ids)]
+
+    @property
+    def ids(self):
+        """
+        Track IDs in row order.
+        """
+        return self._ids
+
+    def row(self, track_id):
+        """
+        Returns the row of a track, or None if it is not stored.
+        """
+        return self._index.get(track_id)
+
+    def id_at(self, row):
+        """
+        Returns the track ID of a row.
+        """
+        return self._ids[row]
+
+    def get(self, track_id):
+        """
+        Returns the vector of a track, or None if it is not stored.
+        """
+        row = self._index.get(track_id)
+        return None if row is None else self._data[row]
+
+    def vectors(self, rows):
+        """
+        Returns the (len(rows), DIMENSIONS) float32 vectors of the given rows.
+        """
+        return self._data[rows]
+
+    def scores(self, query):
+        """
+        Returns the inner product of every stored vector with `query`.
+        """
+        return self.matrix @ query
+
+    def add(self, track_id, vector):
+        """
+        Stores or replaces the vector of a track.
+
+        Returns:
+        int: The track's row.
+        """
+        with self._lock:
+            row = self._index.get(track_id)
+            if row is None:
+                row = len(self._ids)
+                if row == len(self._data):
+                    grown = np.zeros((max(1, 2 * len(self._data)), DIMENSIONS), dtype=np.float32)
+                    grown[:row] = self._data
+                    self._data = grown
+                self._data[row] = vector
+                # Publish the ID after its vector so readers never see an empty row.
+                self._index[track_id] = row
+                self._ids.append(track_id)
+            else:
+                self._data[row] = vector
+            return row
+
+    def extend(self, items):
+        """
+        Adds (track_id, vector) pairs for tracks not stored yet, e.g. the
+        vectors kept in the catalog store. Vectors of another length,
+        written with an older feature layout, are skipped.
+
+        Returns:
+        int: The number of tracks added.
+        """
+        added = 0
+        for track_id, vector in items:
+            if track_id not in self._index and len(vector) == DIMENSIONS:
+                self.add(track_id, vector)
+                added += 1
+        return added
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        Builds a store from (track_id, vector) pairs, see `extend`.
+        """
+        store = cls()
+        store.extend(items)
+        return store
+
+
+class RecommendationEngine:
+    """
+    Finds the stored tracks closest to a user's taste vector, by scoring
+    every track or, for large stores, through an approximate index.
+    """
+
+    def __init__(self, store, index=None, exact_below=50000):
+        """
+        Args:
+        store (TrackFeatureStore): The feature store to recommend from.
+        index (HNSWIndex): Optional approximate index over the store, used
+            for candidate generation.
+        exact_below (int): Store size under which every track is scored
+            instead, as one matrix-vector product is faster than walking
+            the graph in Python.
+        """
+        self.store = store
+        self.index = index
+        self.exact_below = exact_below
+
+    def taste_vector(self, track_ids, weights=None):
+        """
+        Returns the normalized, optionally weighted mean of the vectors of
+        the given tracks, or None if none of them is stored.
+        """
+        rows = []
+        row_weights = []
+        for i, track_id in enumerate(track_ids):
+            row = self.store.row(track_id)
+            if row is not None:
+                rows.append(row)
+                row_weights.append(1.0 if weights is None else weights[i])
+        if not rows:
+            return None
+        taste = np.average(self.store.vectors(rows), axis=0, weights=row_weights)
+        norm = np.linalg.norm(taste)
+        return taste / norm if norm else taste
+
+    def candidates(self, taste, k=10, exclude=()):
+        """
+        Returns about the k tracks most similar to the taste vector, from
+        the index when the store is large enough and exactly otherwise.
+        Takes the same arguments and returns the same pairs as `top_k`.
+        """
+        if self.index is not None and len(self.index) >= self.exact_below:
+            return self.index.search(taste, k, exclude=exclude)
+        return self.top_k(taste, k, exclude)
+
+    def top_k(self, taste, k=10, exclude=()):
+        """
+        Returns the k tracks most similar to the taste vector.
+
+        Args:
+        taste (numpy.ndarray): A vector from `taste_vector`.
+        k (int): Number of tracks to return.
+        exclude (iterable): Track IDs to leave out, e.g. the seeds.
+
+        Returns:
+        list: (track_id, score) pairs, best first.
+        """
+        if not len(self.store) or k <= 0:
+            return []
+        scores = self.store.scores(taste)
+        for track_id in exclude:
+            row = self.store.row(track_id)
+            if row is not None and row < len(scores):
+                scores[row] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.store.id_at(row), float(scores[row])) for row in top if scores[row] != -np.inf]
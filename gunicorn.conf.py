@@ -0,0 +1,32 @@
+"""
+Gunicorn settings, picked up automatically when gunicorn is started from
+this directory (`gunicorn app:app`).
+
+WORKER_MODE selects how a worker waits on Spotify:
+
+- sync (default): one request at a time per worker.
+- gthread: GUNICORN_THREADS requests at a time per worker.
+- gevent: cooperative workers. gevent patches sockets, locks and sleeps
+  before the app is loaded, so the pooled Spotify client, the rate limiter
+  and the recommendation fan-out become non-blocking and one worker keeps
+  up to WORKER_CONNECTIONS requests in flight. gevent cannot patch
+  `flock`, so the shared token refresh lock (TOKEN_REFRESH_LOCK_DIR) is
+  polled instead of waited on. Requires the gevent package, which is left
+  out of requirements.txt on purpose: sync and gthread workers do not
+  need it.
+"""
+import os
+
+WORKER_MODE = os.getenv('WORKER_MODE', 'sync')
+
+if WORKER_MODE == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', '8'))
+elif WORKER_MODE == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.getenv('WORKER_CONNECTIONS', '1000'))
+    # With hundreds of requests in flight, keep more keep-alive connections
+    # to Spotify than the default of 10 so they are reused, not reopened.
+    os.environ.setdefault('SPOTIFY_POOL_SIZE', '100')
+elif WORKER_MODE != 'sync':
+    raise ValueError(f'Unknown WORKER_MODE {WORKER_MODE!r}; use sync, gthread or gevent')
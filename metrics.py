@@ -0,0 +1,224 @@
+"""
+This module contains a small Prometheus-style metrics registry with
+counters and histograms, rendered in the Prometheus text format.
+
+With several gunicorn workers each worker writes its own snapshot to a
+shared directory and the worker answering the scrape merges them, so
+/metrics reports totals for the whole node no matter which worker serves it.
+Snapshots of workers that have exited are deleted at the next scrape, so a
+recycled worker's counts drop out of the totals like a counter reset.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+# Default histogram buckets in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = [(key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for key, value in pairs]
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _dead_worker(path):
+    """
+    Returns whether a snapshot was written by a process that no longer exists.
+    """
+    pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class MetricsRegistry:
+    """
+    Holds the counters and histograms of one worker.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        """
+        Args:
+        directory (str): Shared directory for per-worker snapshots. None
+            keeps metrics in this process only.
+        flush_interval (float): Minimum seconds between snapshot writes.
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._buckets = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._last_flush = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def counter(self, name, help_text):
+        """
+        Declares a counter.
+        """
+        self._help[name] = help_text
+        self._types[name] = 'counter'
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        """
+        Declares a histogram with the given upper bounds.
+        """
+        self._help[name] = help_text
+        self._types[name] = 'histogram'
+        self._buckets[name] = tuple(buckets)
+
+    def add_collector(self, collector):
+        """
+        Registers a callable that returns (name, labels, value) counter
+        samples read from elsewhere (e.g. cache or scheduler counters)
+        each time a snapshot is taken.
+        """
+        self._collectors.append(collector)
+
+    def inc(self, name, amount=1, **labels):
+        """
+        Increments a counter.
+        """
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """
+        Records a value in a histogram.
+        """
+        buckets = self._buckets[name]
+        key = (name, _labels_key(labels))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = {'counts': [0] * (len(buckets) + 1), 'sum': 0.0}
+            entry['counts'][bisect.bisect_left(buckets, value)] += 1
+            entry['sum'] += value
+
+    def snapshot(self):
+        """
+        Returns this worker's metrics as JSON-serialisable data.
+        """
+        with self._lock:
+            counters = [[name, list(map(list, labels)), value]
+                        for (name, labels), value in self._counters.items()]
+            histograms = [[name, list(map(list, labels)), list(entry['counts']), entry['sum']]
+                          for (name, labels), entry in self._histograms.items()]
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                counters.append([name, list(map(list, _labels_key(labels))), value])
+        return {'counters': counters, 'histograms': histograms}
+
+    def flush(self):
+        """
+        Writes this worker's snapshot to the shared directory. Threads of
+        the worker flush one at a time, and a failed write is logged rather
+        than raised so that it never fails the request being recorded.
+        """
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with self._flush_lock:
+            try:
+                with open(tmp_path, 'w') as snapshot_file:
+                    json.dump(self.snapshot(), snapshot_file)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.warning(f'Failed to write metrics snapshot: {e}')
+            self._last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        """
+        Flushes if the last flush is older than the flush interval.
+        """
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _snapshots(self):
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if _dead_worker(path):
+                # The worker exited (e.g. recycled by gunicorn); its totals go with it.
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """
+        Renders the merged metrics of every worker in the Prometheus text format.
+        """
+        counters = {}
+        histograms = {}
+        for snapshot in self._snapshots():
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, counts, total in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.setdefault(key, {'counts': [0] * len(counts), 'sum': 0.0})
+                merged['counts'] = [a + b for a, b in zip(merged['counts'], counts)]
+                merged['sum'] += total
+
+        lines = []
+        for name in sorted(self._types):
+            lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} {self._types[name]}')
+            if self._types[name] == 'counter':
+                for (sample_name, labels), value in sorted(counters.items()):
+                    if sample_name == name:
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            bounds = list(self._buckets[name]) + [float('inf')]
+            for (sample_name, labels), entry in sorted(histograms.items()):
+                if sample_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(bounds, entry['counts']):
+                    cumulative += count
+                    le = (('le', _format_value(bound)),)
+                    lines.append(f'{name}_bucket{_format_labels(labels, le)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(entry["sum"])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
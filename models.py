@@ -0,0 +1,245 @@
+"""
+This module contains the compact view models built once from Spotify JSON
+and used by the caches, the session and the templates. They are slotted
+classes that keep only the fields the pages render. Artist, album and genre
+strings are interned because the same ones repeat across thousands of
+cached tracks.
+
+Each model has `from_spotify` to build it from a Spotify object, and
+`to_dict`/`from_dict` for the JSON written to the shared cache and the
+session.
+"""
+import sys
+
+# Track fields read by `Track.from_spotify`, in Spotify's `fields` syntax.
+TRACK_FIELDS = 'id,name,preview_url,popularity,artists(id,name),album(id,name,release_date,images)'
+PLAYLIST_FIELDS = f'id,name,snapshot_id,tracks(total,limit,items(track({TRACK_FIELDS})))'
+PLAYLIST_TRACKS_FIELDS = f'total,limit,items(track({TRACK_FIELDS}))'
+
+
+def _intern(value):
+    return sys.intern(value) if value else value
+
+
+def _image_url(images):
+    """
+    Returns the URL of the largest image; Spotify lists images widest first.
+    """
+    return _intern(images[0].get('url')) if images else None
+
+
+class ArtistRef:
+    """
+    An artist as listed on a track.
+    """
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = _intern(id)
+        self.name = _intern(name)
+
+    def __eq__(self, other):
+        return isinstance(other, ArtistRef) and (self.id, self.name) == (other.id, other.name)
+
+    def __repr__(self):
+        return f'ArtistRef({self.id!r}, {self.name!r})'
+
+
+class Album:
+    """
+    The album a track belongs to.
+    """
+    __slots__ = ('id', 'name', 'release_date', 'image_url')
+
+    def __init__(self, id, name, release_date=None, image_url=None):
+        self.id = _intern(id)
+        self.name = _intern(name)
+        self.release_date = _intern(release_date)
+        self.image_url = _intern(image_url)
+
+    def to_list(self):
+        return [self.id, self.name, self.release_date, self.image_url]
+
+    def __eq__(self, other):
+        return isinstance(other, Album) and self.to_list() == other.to_list()
+
+    def __repr__(self):
+        return f'Album({self.id!r}, {self.name!r})'
+
+
+class Track:
+    """
+    A track as shown on the track, playlist and recommendations pages.
+    """
+    __slots__ = ('id', 'name', 'artists', 'album', 'preview_url', 'popularity')
+
+    def __init__(self, id, name, artists=(), album=None, preview_url=None, popularity=0):
+        self.id = id
+        self.name = name
+        self.artists = tuple(artists)
+        self.album = album or Album(None, None)
+        self.preview_url = preview_url
+        self.popularity = popularity
+
+    @property
+    def spotify_url(self):
+        return f'https://open.spotify.com/track/{self.id}'
+
+    @classmethod
+    def from_spotify(cls, track):
+        """
+        Builds a track from a Spotify track object.
+
+        Args:
+        track (dict): A full or simplified track object, or a Track.
+
+        Returns:
+        Track: The model, or None for a missing track.
+        """
+        if not track or isinstance(track, cls):
+            return track or None
+        album = track.get('album') or {}
+        return cls(
+            track.get('id'),
+            track.get('name'),
+            [ArtistRef(artist.get('id'), artist.get('name')) for artist in track.get('artists') or []],
+            Album(album.get('id'), album.get('name'), album.get('release_date'), _image_url(album.get('images'))),
+            track.get('preview_url'),
+            track.get('popularity', 0)
+        )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'artists': [[artist.id, artist.name] for artist in self.artists],
+            'album': self.album.to_list(),
+            'preview_url': self.preview_url,
+            'popularity': self.popularity,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['name'], [ArtistRef(*artist) for artist in data['artists']],
+                   Album(*data['album']), data['preview_url'], data['popularity'])
+
+    def __eq__(self, other):
+        return isinstance(other, Track) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f'Track({self.id!r}, {self.name!r})'
+
+
+class Artist:
+    """
+    An artist as shown on the artist page.
+    """
+    __slots__ = ('id', 'name', 'genres', 'followers', 'image_url')
+
+    def __init__(self, id, name, genres=(), followers=0, image_url=None):
+        self.id = _intern(id)
+        self.name = _intern(name)
+        self.genres = tuple(_intern(genre) for genre in genres)
+        self.followers = followers
+        self.image_url = image_url
+
+    @property
+    def spotify_url(self):
+        return f'https://open.spotify.com/artist/{self.id}'
+
+    @classmethod
+    def from_spotify(cls, artist):
+        """
+        Builds an artist from a Spotify artist object.
+
+        Args:
+        artist (dict): A full artist object, or an Artist.
+
+        Returns:
+        Artist: The model, or None for a missing artist.
+        """
+        if not artist or isinstance(artist, cls):
+            return artist or None
+        return cls(
+            artist.get('id'),
+            artist.get('name'),
+            artist.get('genres') or (),
+            (artist.get('followers') or {}).get('total', 0),
+            _image_url(artist.get('images'))
+        )
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'genres': list(self.genres),
+                'followers': self.followers, 'image_url': self.image_url}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['name'], data['genres'], data['followers'], data['image_url'])
+
+    def __eq__(self, other):
+        return isinstance(other, Artist) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f'Artist({self.id!r}, {self.name!r})'
+
+
+class Playlist:
+    """
+    A playlist, with its tracks when shown on the playlist page.
+    """
+    __slots__ = ('id', 'name', 'snapshot_id', 'total', 'tracks')
+
+    def __init__(self, id, name, snapshot_id=None, total=0, tracks=()):
+        self.id = id
+        self.name = name
+        self.snapshot_id = snapshot_id
+        self.total = total
+        self.tracks = tuple(tracks)
+
+    @classmethod
+    def from_spotify(cls, playlist):
+        """
+        Builds a playlist from a Spotify playlist object. The tracks in its
+        `tracks` paging object are kept, without local or unavailable
+        tracks that have no ID.
+
+        Args:
+        playlist (dict): A full or simplified playlist object, or a Playlist.
+
+        Returns:
+        Playlist: The model.
+        """
+        if isinstance(playlist, cls):
+            return playlist
+        tracks = playlist.get('tracks') or {}
+        return cls(
+            playlist.get('id'),
+            playlist.get('name'),
+            playlist.get('snapshot_id'),
+            tracks.get('total', 0),
+            [Track.from_spotify(item['track']) for item in tracks.get('items') or []
+             if item and item.get('track') and item['track'].get('id')]
+        )
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'snapshot_id': self.snapshot_id, 'total': self.total,
+                'tracks': [track.to_dict() for track in self.tracks]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['name'], data['snapshot_id'], data['total'],
+                   [Track.from_dict(track) for track in data['tracks']])
+
+    def __eq__(self, other):
+        return isinstance(other, Playlist) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f'Playlist({self.id!r}, {self.name!r})'
+
+
+# Model per catalog entity type.
+MODELS = {
+    'track': Track,
+    'artist': Artist,
+    'playlist': Playlist,
+}
@@ -0,0 +1,88 @@
+"""
+This module contains offset-parallel pagination for Spotify's paging
+objects. The first page gives the `total`; every remaining page is then
+requested at once on a bounded thread pool, so a library of any size loads
+in about two round trips instead of one per page.
+"""
+import contextvars
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PagedResult:
+    """
+    The items of a paged Spotify endpoint, yielded in order as their pages
+    arrive. `total` is known as soon as the first page is in.
+    """
+
+    def __init__(self, first_page, futures):
+        self.total = first_page.get('total', len(first_page.get('items', [])))
+        self._first_items = first_page.get('items') or []
+        self._futures = futures
+
+    def __iter__(self):
+        yield from self._first_items
+        for future in self._futures:
+            yield from future.result()
+
+    def cancel(self):
+        """
+        Cancels pages that have not started yet, e.g. when rendering failed.
+        """
+        for future in self._futures:
+            future.cancel()
+
+
+class Paginator:
+    """
+    Fetches the remaining pages of a paged endpoint concurrently.
+    """
+
+    def __init__(self, client, max_workers=4):
+        """
+        Args:
+        client (SpotifyClient): The shared Spotify client.
+        max_workers (int): Maximum number of pages fetched at once.
+        """
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='paginate')
+
+    def _fetch_page(self, path, token, params):
+        response = self.client.get(path, token, params=params)
+        response.raise_for_status()
+        return response.json().get('items') or []
+
+    def paginate(self, path, token, first_page, params=None):
+        """
+        Starts fetching every page after `first_page` and returns at once.
+
+        The caller fetches the first page itself, so a 401 on it can still be
+        handled with the user's session. A page that fails raises its error
+        when iteration reaches it.
+
+        Args:
+        path (str): The paged endpoint, e.g. 'me/playlists'.
+        token (str): The user's access token.
+        first_page (dict): The decoded first page, requested with `limit`
+            and offset 0.
+        params (dict): Query parameters sent with every page, including `limit`.
+
+        Returns:
+        PagedResult: Iterates over the items of all pages in order.
+        """
+        params = dict(params or {})
+        limit = params.get('limit') or first_page.get('limit') or len(first_page.get('items') or []) or 1
+        params['limit'] = limit
+        total = first_page.get('total', 0)
+        futures = []
+        for page in range(1, math.ceil(total / limit)):
+            page_params = dict(params, offset=page * limit)
+            futures.append(self.executor.submit(contextvars.copy_context().run,
+                                                self._fetch_page, path, token, page_params))
+        return PagedResult(first_page, futures)
+
+    def shutdown(self):
+        """
+        Stops the threads after pending pages finish.
+        """
+        self.executor.shutdown(wait=True)
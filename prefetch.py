@@ -0,0 +1,125 @@
+"""
+This module contains the background prefetcher that warms the catalog cache
+with tracks and artists the user is likely to click on next, and adds the
+tracks it sees to the local feature store.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from batch_loader import spotify_loader
+from feature_store import track_vector
+
+
+class Prefetcher:
+    """
+    Fetches uncached tracks and artists through Spotify's multi-ID endpoints
+    on a small background thread pool and stores them in the catalog cache.
+    """
+
+    def __init__(self, client, catalog, max_workers=2, features=None, ann_index=None):
+        """
+        Args:
+        client (SpotifyClient): The shared Spotify client.
+        catalog (CatalogCache): The cache to warm.
+        max_workers (int): Number of background threads.
+        features (TrackFeatureStore): Optional feature store to index
+            tracks into for the local recommendation engine.
+        ann_index (HNSWIndex): Optional approximate index over `features`,
+            updated after tracks are indexed.
+        """
+        self.client = client
+        self.catalog = catalog
+        self.features = features
+        self.ann_index = ann_index
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+
+    def submit(self, token, track_ids=(), artist_ids=(), index_tracks=()):
+        """
+        Schedules a prefetch and returns immediately.
+
+        Returns:
+        concurrent.futures.Future: Resolves to the number of entities cached.
+        """
+        return self.executor.submit(self._run, token, list(track_ids), list(artist_ids), list(index_tracks))
+
+    def _run(self, token, track_ids, artist_ids, index_tracks):
+        cached = self.prefetch(token, track_ids, artist_ids)
+        if index_tracks:
+            self.index(token, index_tracks)
+        return cached
+
+    def _load(self, token, kind, ids):
+        """
+        Fetches entities by ID in as few calls as possible.
+
+        Returns:
+        dict: The entities that were found, by ID.
+        """
+        loader = spotify_loader(self.client, token, kind, window=None)
+        futures = loader.load_many(ids)
+        loader.dispatch()
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            logging.warning(f'Prefetch of {len(errors)} {kind} failed: {errors[0]}')
+        return {entity_id: future.result() for entity_id, future in zip(ids, futures)
+                if future.exception() is None and future.result()}
+
+    def prefetch(self, token, track_ids=(), artist_ids=()):
+        """
+        Fetches every uncached track and artist in as few calls as possible.
+
+        Returns:
+        int: The number of entities added to the cache.
+        """
+        cached = 0
+        for kind, ids in (('track', track_ids), ('artist', artist_ids)):
+            missing = self.catalog.missing(kind, ids)
+            if not missing:
+                continue
+            for entity in self._load(token, kind, missing).values():
+                self.catalog.set(kind, entity['id'], entity)
+                cached += 1
+        return cached
+
+    def index(self, token, tracks):
+        """
+        Adds the tracks that are not in the feature store yet, using their
+        audio features and the genres of their primary artist. Indexed
+        tracks and their vectors are written to the shared catalog store, so
+        the engine can render them and other workers can load the vectors.
+
+        Args:
+        token (str): The user's access token.
+        tracks (list): Track models.
+
+        Returns:
+        int: The number of tracks indexed.
+        """
+        if self.features is None:
+            return 0
+        tracks = {track.id: track for track in tracks if track and track.id and track.id not in self.features}
+        if not tracks:
+            return 0
+        self.prefetch(token, artist_ids=[track.artists[0].id for track in tracks.values() if track.artists])
+        audio_features = self._load(token, 'audio_features', list(tracks))
+
+        indexed = 0
+        for track_id, track in tracks.items():
+            if track_id not in audio_features:
+                continue
+            artist = self.catalog.get('artist', track.artists[0].id, count=False) if track.artists else None
+            vector = track_vector(audio_features[track_id], track.popularity, artist.genres if artist else ())
+            if self.catalog.get('track', track_id, count=False) is None:
+                self.catalog.set('track', track_id, track, memory=False)
+            self.catalog.set('features', track_id, vector.tolist(), memory=False)
+            self.features.add(track_id, vector)
+            indexed += 1
+        if indexed and self.ann_index is not None:
+            # Inserted on the index's own thread; a running sync picks the new rows up.
+            self.ann_index.start_sync()
+        return indexed
+
+    def shutdown(self):
+        """
+        Stops the background threads after pending prefetches finish.
+        """
+        self.executor.shutdown(wait=True)
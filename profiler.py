@@ -0,0 +1,140 @@
+"""
+This module contains on-demand request profiling. A request runs under
+cProfile when it carries the profile header with the configured token, or
+when an operator has armed the profiler with `flask profile-next`. The
+result is saved as a .prof file (open it with pstats, snakeviz or
+flameprof) next to a text summary of the slowest functions.
+
+Other requests pay only for a header lookup and a stat of the flag file.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import threading
+import time
+
+FLAG_NAME = 'profile-next'
+
+
+class RequestProfiler:
+    """
+    WSGI middleware that profiles single requests on demand.
+    """
+
+    def __init__(self, wsgi_app, directory, token=None, header='X-Profile', top=40):
+        """
+        Args:
+        wsgi_app (callable): The WSGI application to wrap.
+        directory (str): Directory the profiles are written to. It also
+            holds the flag file, so share it between workers.
+        token (str): Secret expected in the profile header. Without a token
+            the header is ignored and only the flag file triggers profiling.
+        header (str): Request header carrying the token.
+        top (int): Number of functions listed in the text summary.
+        """
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.token = token
+        self.environ_key = 'HTTP_' + header.upper().replace('-', '_')
+        self.top = top
+        self.flag_path = os.path.join(directory, FLAG_NAME)
+        # Only one profiler can be active per process.
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def arm(self, count=1):
+        """
+        Profiles the next `count` requests served by any worker sharing the directory.
+        """
+        with open(self.flag_path, 'w') as flag_file:
+            flag_file.write(str(count))
+
+    def _take_flag(self):
+        """
+        Claims one armed request. Returns True if this request should be profiled.
+        """
+        if not os.path.exists(self.flag_path):
+            return False
+        claimed = f'{self.flag_path}.{os.getpid()}.{threading.get_ident()}'
+        try:
+            # The rename is atomic, so only one worker claims each request.
+            os.rename(self.flag_path, claimed)
+        except OSError:
+            return False
+        try:
+            with open(claimed) as flag_file:
+                remaining = int(flag_file.read().strip() or 1) - 1
+        except (OSError, ValueError):
+            remaining = 0
+        if remaining > 0:
+            with open(claimed, 'w') as flag_file:
+                flag_file.write(str(remaining))
+            os.replace(claimed, self.flag_path)
+        else:
+            os.remove(claimed)
+        return True
+
+    def should_profile(self, environ):
+        """
+        Returns True if the request asked for profiling or the profiler is armed.
+        """
+        value = environ.get(self.environ_key)
+        if value is not None and self.token and hmac.compare_digest(value, self.token):
+            return True
+        return self._take_flag()
+
+    def __call__(self, environ, start_response):
+        if not self.should_profile(environ) or not self._lock.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        try:
+            return self._profile(environ, start_response)
+        finally:
+            self._lock.release()
+
+    def _profile(self, environ, start_response):
+        profile = cProfile.Profile()
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            app_iter = self.wsgi_app(environ, capture_start_response)
+            try:
+                body = list(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+        finally:
+            profile.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        name = self.save(profile, environ.get('REQUEST_METHOD', 'GET'), environ.get('PATH_INFO', '/'), elapsed_ms)
+        headers = list(captured['headers']) + [('X-Profile-File', name)]
+        start_response(captured['status'], headers, captured['exc_info'])
+        return body
+
+    def save(self, profile, method, path, elapsed_ms):
+        """
+        Writes the profile and its text summary.
+
+        Returns:
+        str: The file name of the .prof file.
+        """
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', path).strip('_') or 'root'
+        base = f'{int(time.time() * 1000)}-{method}-{slug[:60]}-{elapsed_ms:.0f}ms'
+        profile.dump_stats(os.path.join(self.directory, f'{base}.prof'))
+
+        summary = io.StringIO()
+        summary.write(f'{method} {path} {elapsed_ms:.1f} ms\n\n')
+        pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(self.top)
+        with open(os.path.join(self.directory, f'{base}.txt'), 'w') as summary_file:
+            summary_file.write(summary.getvalue())
+        return f'{base}.prof'
@@ -0,0 +1,160 @@
+"""
+This module contains the scheduler that every upstream Spotify call goes
+through. It paces calls with a token bucket per client ID, queues callers
+up to a deadline and backs off when Spotify answers 429 with Retry-After.
+"""
+import threading
+import time
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when a call cannot be sent to Spotify before its deadline.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f'Spotify rate limit exceeded, retry after {retry_after:.1f}s')
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. Callers reserve a token and are told how
+    long to wait before using it, so waiting happens outside the lock.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Args:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens (burst size).
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token.
+
+        Returns:
+        float: Seconds the caller must wait before sending.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0, -self.tokens / self.rate, self.blocked_until - now)
+
+    def refund(self):
+        """
+        Returns a reserved token that was not used.
+        """
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def block(self, seconds):
+        """
+        Holds every caller back for the given number of seconds.
+        """
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(value, default=1.0):
+    """
+    Parses a Retry-After header given in seconds.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class UpstreamScheduler:
+    """
+    Sends upstream calls at a sustainable rate.
+
+    Calls wait in line for a token until `max_wait` seconds have passed.
+    A 429 response blocks the bucket for Retry-After seconds and the call
+    is retried up to `max_retries` times while it still fits the deadline.
+    """
+
+    def __init__(self, rate=10, burst=20, max_wait=5, max_retries=2, sleep=time.sleep):
+        """
+        Args:
+        rate (float): Sustained calls per second.
+        burst (int): Calls allowed back to back before pacing starts.
+        max_wait (float): Seconds a call may wait in line, including backoff.
+        max_retries (int): Retries after a 429 response.
+        sleep (callable): Used to wait; replaceable in tests.
+        """
+        self.bucket = TokenBucket(rate, burst)
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'queued': 0,
+            'wait_seconds': 0.0,
+            'throttled': 0,
+            'retries': 0,
+            'rejected': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def stats(self):
+        """
+        Returns a snapshot of the counters.
+        """
+        with self._lock:
+            return dict(self.counters)
+
+    def call(self, send):
+        """
+        Sends a call through the scheduler.
+
+        Args:
+        send (callable): Performs the HTTP call and returns a requests.Response.
+
+        Returns:
+        requests.Response: The first response that is not a 429.
+
+        Raises:
+        RateLimitExceeded: If the call cannot be sent before its deadline or
+        Spotify keeps answering 429 after every retry.
+        """
+        deadline = time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            wait = self.bucket.reserve()
+            if time.monotonic() + wait > deadline:
+                self.bucket.refund()
+                self._count('rejected')
+                raise RateLimitExceeded(wait)
+            if wait:
+                self._count('queued')
+                self._count('wait_seconds', wait)
+                self.sleep(wait)
+
+            response = send()
+            self._count('requests')
+            if response.status_code != 429:
+                return response
+
+            self._count('throttled')
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            self.bucket.block(retry_after)
+            if attempt >= self.max_retries:
+                self._count('rejected')
+                raise RateLimitExceeded(retry_after)
+            attempt += 1
+            self._count('retries')
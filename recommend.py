@@ -0,0 +1,124 @@
+"""
+This module contains the multi-seed recommendation fan-out: one Spotify
+recommendations request per seed, run concurrently, then merged,
+de-duplicated and reranked.
+"""
+import contextvars
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Damping constant for reciprocal rank fusion.
+RRF_K = 60
+
+
+def merge_and_rerank(result_lists, limit, exclude=()):
+    """
+    Merges ranked track lists with reciprocal rank fusion. Tracks suggested
+    by several seeds, or ranked high by one, come first; ties are broken by
+    popularity.
+
+    Args:
+    result_lists (list): One ranked list of track objects per seed.
+    limit (int): Number of tracks to return.
+    exclude (iterable): Track IDs to leave out, e.g. the seed tracks.
+
+    Returns:
+    list: Up to `limit` unique track objects.
+    """
+    exclude = set(exclude)
+    scores = {}
+    tracks = {}
+    for result in result_lists:
+        for rank, track in enumerate(result):
+            if not track or not track.get('id') or track['id'] in exclude:
+                continue
+            scores[track['id']] = scores.get(track['id'], 0) + 1 / (RRF_K + rank + 1)
+            tracks.setdefault(track['id'], track)
+    ranked = sorted(scores, key=lambda track_id: (scores[track_id], tracks[track_id].get('popularity', 0)),
+                    reverse=True)
+    return [tracks[track_id] for track_id in ranked[:limit]]
+
+
+class RecommendationFanOut:
+    """
+    Runs one recommendations request per seed on a bounded thread pool so
+    the page waits for the slowest call instead of the sum of all calls.
+    """
+
+    def __init__(self, client, max_workers=8, per_seed_limit=20):
+        """
+        Args:
+        client (SpotifyClient): The shared Spotify client.
+        max_workers (int): Maximum number of concurrent upstream calls.
+        per_seed_limit (int): Tracks requested per seed before merging.
+        """
+        self.client = client
+        self.per_seed_limit = per_seed_limit
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='recommend')
+
+    def submit_top_artists(self, token, limit):
+        """
+        Starts fetching the user's top artists in the background.
+
+        Returns:
+        concurrent.futures.Future: Resolves to a list of artist IDs, empty on failure.
+        """
+        def fetch():
+            response = self.client.get('me/top/artists', token, params={'limit': limit})
+            if response.status_code != 200:
+                logging.warning(f'Failed to retrieve top artists: {response.status_code}')
+                return []
+            return [artist['id'] for artist in response.json().get('items', [])]
+        return self.executor.submit(contextvars.copy_context().run, fetch)
+
+    def _fetch(self, token, seed_param, seed_id, market):
+        params = {seed_param: seed_id, 'limit': self.per_seed_limit}
+        if market:
+            params['market'] = market
+        response = self.client.get('recommendations', token, params=params)
+        response.raise_for_status()
+        return response.json().get('tracks') or []
+
+    def recommend(self, token, track_ids=(), artist_ids=(), limit=10, market=None):
+        """
+        Fetches recommendations for every seed concurrently and merges them.
+        Seeds whose request fails are skipped.
+
+        Args:
+        token (str): The user's access token.
+        track_ids (list): Seed track IDs.
+        artist_ids (list or Future): Seed artist IDs, or a future resolving
+            to them, e.g. from `submit_top_artists`. The track seeds are
+            requested while it resolves.
+        limit (int): Number of tracks to return.
+        market (str): Optional market code.
+
+        Returns:
+        dict: {'tracks': [...], 'seeds': [...]} in the shape of Spotify's
+        recommendations response.
+        """
+        def submit(param, seed_id):
+            return self.executor.submit(contextvars.copy_context().run, self._fetch, token, param, seed_id, market)
+
+        seeds = [('seed_tracks', seed_id, 'TRACK') for seed_id in track_ids]
+        futures = [submit(param, seed_id) for param, seed_id, _ in seeds]
+        if isinstance(artist_ids, Future):
+            artist_ids = artist_ids.result()
+        artist_seeds = [('seed_artists', seed_id, 'ARTIST') for seed_id in artist_ids]
+        futures += [submit(param, seed_id) for param, seed_id, _ in artist_seeds]
+        seeds += artist_seeds
+
+        result_lists = []
+        used_seeds = []
+        for (_, seed_id, seed_type), future in zip(seeds, futures):
+            try:
+                result_lists.append(future.result())
+            except Exception as e:
+                logging.warning(f'Recommendations for seed {seed_id} failed: {e}')
+                continue
+            used_seeds.append({'id': seed_id, 'type': seed_type})
+
+        return {
+            'tracks': merge_and_rerank(result_lists, limit, exclude=track_ids),
+            'seeds': used_seeds
+        }
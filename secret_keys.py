@@ -0,0 +1,91 @@
+"""
+This module loads the secret keys used to sign session IDs. Keys come from
+configuration or a key file so that every worker and node shares them, and
+previous keys stay valid after a rotation.
+"""
+import os
+import secrets
+import tempfile
+
+
+def read_key_file(path):
+    """
+    Reads a key file holding one key per line, newest first.
+
+    Returns:
+    list: The keys in the file, newest first. Empty if the file does not exist.
+    """
+    try:
+        with open(path) as key_file:
+            return [line.strip() for line in key_file if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def write_key_file(path, keys):
+    """
+    Atomically writes the keys, newest first, with owner-only permissions.
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as key_file:
+        key_file.write('\n'.join(keys) + '\n')
+    os.replace(tmp_path, path)
+
+
+def create_key_file(path):
+    """
+    Creates a key file with a new random key unless it already exists.
+    When several workers start at once only one of them creates it: the key
+    is written to a temporary file first and then linked into place, so no
+    worker ever reads a file that exists but is still empty.
+    """
+    if os.path.exists(path):
+        return
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as key_file:
+            key_file.write(secrets.token_hex(32) + '\n')
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(tmp_path)
+
+
+def rotate_key_file(path, keep=3):
+    """
+    Puts a new key at the top of the key file and keeps up to `keep`
+    previous keys so that existing sessions stay valid.
+
+    Returns:
+    list: The keys now in the file, newest first.
+    """
+    keys = [secrets.token_hex(32)] + read_key_file(path)[:keep]
+    write_key_file(path, keys)
+    return keys
+
+
+def load_secret_keys(environ, default_key_file):
+    """
+    Loads the secret keys from the environment.
+
+    SECRET_KEY and SECRET_KEY_FALLBACKS (comma separated, newest first) take
+    precedence. Otherwise the keys are read from SECRET_KEY_FILE, which
+    defaults to `default_key_file` and is created on first use.
+
+    Returns:
+    tuple: The current key and a list of previous keys, newest first.
+    """
+    if environ.get('SECRET_KEY'):
+        fallbacks = [key.strip() for key in environ.get('SECRET_KEY_FALLBACKS', '').split(',') if key.strip()]
+        return environ['SECRET_KEY'], fallbacks
+
+    path = environ.get('SECRET_KEY_FILE') or default_key_file
+    if not environ.get('SECRET_KEY_FILE'):
+        create_key_file(path)
+    keys = read_key_file(path)
+    if not keys:
+        raise ValueError(f'No secret key found in {path}')
+    return keys[0], keys[1:]
@@ -0,0 +1,209 @@
+"""
+This module contains the server-side session store. The session data lives
+in SQLite (default) or Redis and the cookie only carries a signed, opaque
+session ID.
+"""
+import secrets
+import sqlite3
+import threading
+import time
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """
+    A session whose data is stored on the server under `sid`.
+    """
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class SQLiteSessionBackend:
+    """
+    Stores sessions in a SQLite database. WAL mode lets several gunicorn
+    workers on the same node share the file.
+    """
+
+    # Purge expired rows after this many writes.
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        """
+        Args:
+        path (str): Path of the SQLite database file.
+        """
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS sessions '
+                         '(sid TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        """
+        Returns the stored data for the session ID, or None if missing or expired.
+        """
+        row = self._connect().execute(
+            'SELECT data FROM sessions WHERE sid = ? AND expires > ?', (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, data, ttl):
+        """
+        Stores the data for the session ID for ttl seconds.
+        """
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+                         (sid, data, time.time() + ttl))
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute('DELETE FROM sessions WHERE expires <= ?', (time.time(),))
+
+    def delete(self, sid):
+        """
+        Removes the session ID from the store.
+        """
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+
+class RedisSessionBackend:
+    """
+    Stores sessions in Redis so that every node behind a load balancer
+    sees the same sessions.
+
+    Any object with Redis's `get`, `setex` and `delete` methods can be used
+    as the client, which lets tests pass a local stand-in.
+    """
+
+    def __init__(self, client, prefix='session:'):
+        """
+        Args:
+        client: A redis.Redis instance or compatible object.
+        prefix (str): Key prefix for session entries.
+        """
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, sid):
+        """
+        Returns the stored data for the session ID, or None if missing or expired.
+        """
+        return self.client.get(self.prefix + sid)
+
+    def set(self, sid, data, ttl):
+        """
+        Stores the data for the session ID for ttl seconds.
+        """
+        self.client.setex(self.prefix + sid, int(ttl), data)
+
+    def delete(self, sid):
+        """
+        Removes the session ID from the store.
+        """
+        self.client.delete(self.prefix + sid)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """
+        Creates a backend from a Redis URL. Requires the optional `redis` package.
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('The redis package is required for SESSION_REDIS_URL') from e
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    A Flask session interface that keeps session data in a backend and
+    puts only a signed session ID in the cookie.
+    """
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, backend):
+        """
+        Args:
+        backend: A SQLiteSessionBackend, RedisSessionBackend or compatible object.
+        """
+        self.backend = backend
+
+    def get_signer(self, app):
+        """
+        Returns the signer used for session IDs, or None if no secret key is set.
+        New IDs are signed with the current key; IDs signed with any key in
+        SECRET_KEY_FALLBACKS are still accepted.
+        """
+        if not app.secret_key:
+            return None
+        fallbacks = app.config.get('SECRET_KEY_FALLBACKS') or []
+        return Signer([*reversed(fallbacks), app.secret_key], salt='server-side-session')
+
+    def open_session(self, app, request):
+        signer = self.get_signer(app)
+        if signer is None:
+            return None
+        cookie = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        if cookie:
+            try:
+                sid = signer.unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.backend.get(sid)
+                if data is not None:
+                    try:
+                        return self.session_class(self.serializer.loads(data), sid=sid)
+                    except ValueError:
+                        pass
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = app.config['SESSION_COOKIE_NAME']
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified:
+            ttl = app.permanent_session_lifetime.total_seconds()
+            self.backend.set(session.sid, self.serializer.dumps(dict(session)), ttl)
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        cookie = self.get_signer(app).sign(session.sid.encode()).decode()
+        response.set_cookie(
+            name,
+            cookie,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
@@ -0,0 +1,206 @@
+"""
+This module contains the single-flight helper used to collapse concurrent
+token refreshes for the same user into one upstream call.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+class _Call:
+    """
+    An in-flight call that other threads can wait on.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class FileLockBackend:
+    """
+    Shares locks and results between gunicorn workers on the same node
+    through a directory of lock files.
+
+    Results are written with owner-only permissions because they contain
+    access tokens, and are deleted by `prune` once they can no longer be
+    reused.
+    """
+
+    def __init__(self, directory, poll_interval=0.01):
+        """
+        Args:
+        directory (str): Directory holding the lock and result files.
+        poll_interval (float): Seconds slept between attempts to take a
+            lock held by another worker.
+        """
+        if fcntl is None:
+            raise RuntimeError('FileLockBackend requires fcntl (Unix only)')
+        self.directory = directory
+        self.poll_interval = poll_interval
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, f'{key}{suffix}')
+
+    @contextmanager
+    def lock(self, key):
+        """
+        Holds an exclusive lock for the key across processes. A held lock is
+        polled with `time.sleep` rather than waited on in `flock`, which
+        gevent cannot make cooperative: a blocking call would stall every
+        greenlet of the worker until the other worker's refresh finished.
+        """
+        path = self._path(key, '.lock')
+        while True:
+            lock_file = open(path, 'a')
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    time.sleep(self.poll_interval)
+            # `prune` may have unlinked the file while we waited; lock the new one instead.
+            try:
+                if os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def load(self, key, max_age):
+        """
+        Returns the result saved for the key if it is at most max_age seconds old.
+        """
+        try:
+            with open(self._path(key, '.json')) as result_file:
+                saved = json.load(result_file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - saved.get('time', 0) > max_age:
+            return None
+        return saved.get('value')
+
+    def save(self, key, value):
+        """
+        Saves the result for the key so that other workers can reuse it.
+        """
+        path = self._path(key, '.json')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as result_file:
+            json.dump({'time': time.time(), 'value': value}, result_file)
+        os.replace(tmp_path, path)
+
+    def prune(self, max_age):
+        """
+        Deletes results older than max_age seconds, so access tokens do not
+        outlive their reuse window on disk, and the lock files of keys that
+        are no longer refreshed. Locks held by another process are kept.
+        """
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.stat(path).st_mtime <= max_age:
+                    continue
+                if not name.endswith('.lock'):
+                    os.remove(path)
+                    continue
+                with open(path, 'a') as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class SingleFlight:
+    """
+    Makes sure that at most one call per key runs at a time.
+
+    Threads that ask for a key while a call is in flight wait for it and
+    receive its result. Results are kept for result_ttl seconds so that
+    requests arriving just after the call finished (e.g. from another tab
+    still carrying the old token) reuse them instead of calling again.
+    With a shared backend the same holds across worker processes.
+    """
+
+    def __init__(self, backend=None, result_ttl=30):
+        """
+        Args:
+        backend (FileLockBackend): Optional cross-process lock backend.
+        result_ttl (float): Seconds a finished result stays reusable.
+        """
+        self.backend = backend
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = {}
+
+    def _cached(self, key, now):
+        cached = self._results.get(key)
+        if cached and now - cached[0] <= self.result_ttl:
+            return cached[1]
+        return None
+
+    def do(self, key, fn):
+        """
+        Runs fn for the key unless a call for it is in flight or finished recently.
+
+        Args:
+        key (str): Identifies the call, e.g. a hash of the refresh token.
+        fn (callable): The call to make. A None result is not shared.
+
+        Returns:
+        The result of fn, possibly produced by another thread or worker.
+        """
+        with self._lock:
+            now = time.time()
+            result = self._cached(key, now)
+            if result is not None:
+                return result
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            return call.result
+
+        try:
+            if self.backend is None:
+                call.result = fn()
+            else:
+                with self.backend.lock(key):
+                    call.result = self.backend.load(key, self.result_ttl)
+                    if call.result is None:
+                        call.result = fn()
+                        if call.result is not None:
+                            self.backend.save(key, call.result)
+                self.backend.prune(self.result_ttl)
+            return call.result
+        finally:
+            with self._lock:
+                del self._calls[key]
+                now = time.time()
+                self._results = {k: v for k, v in self._results.items()
+                                 if now - v[0] <= self.result_ttl}
+                if call.result is not None:
+                    self._results[key] = (now, call.result)
+            call.event.set()
@@ -0,0 +1,155 @@
+"""
+This module contains the pooled HTTP client used to talk to the Spotify API.
+"""
+import base64
+import time
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+from tracing import span
+
+# Default Spotify endpoints
+API_BASE_URL = 'https://api.spotify.com/v1'
+TOKEN_URL = 'https://accounts.spotify.com/api/token'
+
+
+def upstream_endpoint(path):
+    """
+    Names the Web API endpoint a path belongs to, without IDs, for use as a
+    metrics label, e.g. 'me/top/tracks' -> 'top/tracks' and 'tracks/abc' -> 'tracks'.
+    """
+    path = urllib.parse.urlsplit(path).path
+    parts = [part for part in path.split('/') if part]
+    if parts[:1] == ['v1']:
+        parts = parts[1:]
+    if parts[:1] == ['me'] and len(parts) > 1:
+        parts = parts[1:]
+    if not parts:
+        return 'unknown'
+    if parts[0] in ('tracks', 'artists', 'albums'):
+        return parts[0]
+    if parts[0] == 'playlists' and len(parts) > 2:
+        return 'playlists/' + '/'.join(parts[2:])
+    if parts[0] == 'playlists' and len(parts) == 2:
+        return 'playlist'
+    return '/'.join(parts)
+
+
+class SpotifyClient:
+    """
+    Keeps a pooled, keep-alive connection to the Spotify Web API and the
+    accounts service so that upstream calls reuse TCP/TLS connections.
+
+    One instance is created per worker and shared by every route.
+    """
+
+    def __init__(self, client_id, client_secret, api_base_url=API_BASE_URL,
+                 token_url=TOKEN_URL, pool_size=10, timeout=(3.05, 10), scheduler=None,
+                 metrics=None):
+        """
+        Args:
+        client_id (str): The Spotify application client ID.
+        client_secret (str): The Spotify application client secret.
+        api_base_url (str): Base URL of the Spotify Web API.
+        token_url (str): URL of the accounts token endpoint.
+        pool_size (int): Number of keep-alive connections kept per host.
+        timeout (float or tuple): Default (connect, read) timeout in seconds.
+        scheduler (UpstreamScheduler): Optional rate limiter every call goes through.
+        metrics (MetricsRegistry): Optional registry for per-endpoint latency and status.
+        """
+        self.api_base_url = api_base_url.rstrip('/')
+        self.token_url = token_url
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.metrics = metrics
+
+        auth_str = f"{client_id}:{client_secret}"
+        b64_auth_str = base64.urlsafe_b64encode(auth_str.encode()).decode()
+        self.token_headers = {
+            'Authorization': f'Basic {b64_auth_str}',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+
+    def api_url(self, path):
+        """
+        Builds an absolute Web API URL from a path such as 'me/playlists'.
+        Absolute URLs (e.g. pagination 'next' links) are returned unchanged.
+        """
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return f"{self.api_base_url}/{path.lstrip('/')}"
+
+    def _send(self, endpoint, send):
+        if self.metrics is not None:
+            send = self._timed(endpoint, send)
+        with span(f'spotify {endpoint}'):
+            if self.scheduler is None:
+                return send()
+            return self.scheduler.call(send)
+
+    def _timed(self, endpoint, send):
+        def timed():
+            start = time.perf_counter()
+            status = 'error'
+            try:
+                response = send()
+                status = str(response.status_code)
+                return response
+            finally:
+                self.metrics.observe('songrec_upstream_duration_seconds',
+                                     time.perf_counter() - start, endpoint=endpoint)
+                self.metrics.inc('songrec_upstream_requests_total', endpoint=endpoint, status=status)
+        return timed
+
+    @staticmethod
+    def api_headers(token):
+        """
+        Generates Web API request headers for the given access token.
+        """
+        return {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json'
+        }
+
+    def get(self, path, token, params=None, timeout=None):
+        """
+        Sends a GET request to the Spotify Web API.
+
+        Args:
+        path (str): The API path, relative to the API base URL.
+        token (str): The user's access token.
+        params (dict): Optional query string parameters.
+        timeout (float or tuple): Overrides the default timeout.
+
+        Returns:
+        requests.Response: The upstream response.
+        """
+        url = self.api_url(path)
+        return self._send(upstream_endpoint(url), lambda: self.http.get(
+            url, headers=self.api_headers(token), params=params, timeout=timeout or self.timeout))
+
+    def post_token(self, data, timeout=None):
+        """
+        Sends a form POST to the accounts token endpoint using the
+        precomputed client credentials header.
+
+        Args:
+        data (dict): The form fields, e.g. grant_type and code.
+        timeout (float or tuple): Overrides the default timeout.
+
+        Returns:
+        requests.Response: The upstream response.
+        """
+        return self._send('token', lambda: self.http.post(
+            self.token_url, headers=self.token_headers, data=data, timeout=timeout or self.timeout))
+
+    def close(self):
+        """
+        Closes every pooled connection.
+        """
+        self.http.close()
@@ -0,0 +1,190 @@
+"""
+A Test suite for the HNSW approximate nearest-neighbor index.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ann_index import HNSWIndex
+from feature_store import DIMENSIONS, RecommendationEngine, TrackFeatureStore
+
+def random_store(count, seed=0):
+    """
+    Returns a store of random non-negative unit vectors.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = rng.random((count, DIMENSIONS))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store = TrackFeatureStore()
+    for i, vector in enumerate(vectors):
+        store.add(f't{i}', vector)
+    return store
+
+class TestHNSWIndex(unittest.TestCase):
+    """
+    Test suite for the `HNSWIndex` class.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.store = random_store(1500)
+        cls.index = HNSWIndex.build(cls.store, M=8, ef_construction=64, seed=1)
+        cls.exact = RecommendationEngine(cls.store)
+
+    def recall(self, index, ef, k=10):
+        """
+        Returns the mean recall@k of the index against exact search.
+        """
+        rng = np.random.default_rng(2)
+        found = 0
+        for row in rng.integers(0, len(self.store), 50):
+            query = self.store.matrix[row]
+            exact = {track_id for track_id, _ in self.exact.top_k(query, k)}
+            found += len(exact & {track_id for track_id, _ in index.search(query, k, ef=ef)})
+        return found / (50 * k)
+
+    def test_recall_against_exact_search(self):
+        """
+        Test that the index finds nearly all true neighbors, and more with a wider search.
+        """
+        narrow = self.recall(self.index, ef=10)
+        wide = self.recall(self.index, ef=100)
+        self.assertGreaterEqual(wide, 0.95)
+        self.assertGreaterEqual(wide, narrow)
+
+    def test_results_are_sorted_and_excluded(self):
+        """
+        Test that results come best first with exact scores and without excluded tracks.
+        """
+        query = self.store.get('t0')
+        results = self.index.search(query, k=5, exclude=['t0'])
+        self.assertEqual(len(results), 5)
+        self.assertNotIn('t0', [track_id for track_id, _ in results])
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertAlmostEqual(scores[0], float(self.store.get(results[0][0]) @ query), places=5)
+
+    def test_sync_inserts_new_rows(self):
+        """
+        Test that rows added to the store after the build become searchable.
+        """
+        store = random_store(200)
+        index = HNSWIndex.build(store, seed=1)
+        vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        vector[0] = 1.0
+        store.add('new', vector)
+        self.assertEqual(index.sync(), 1)
+        self.assertEqual(index.sync(), 0)
+        self.assertEqual(index.search(vector, k=1)[0][0], 'new')
+
+    def test_nothing_is_built_below_min_rows(self):
+        """
+        Test that an empty index waits for `min_rows` and then syncs on its own thread.
+        """
+        store = random_store(50)
+        index = HNSWIndex(store, seed=1, min_rows=60)
+        index.start_sync()
+        self.assertIsNone(index._thread)
+        self.assertEqual(index.sync(), 0)
+        for row in range(10):
+            vector = np.zeros(DIMENSIONS, dtype=np.float32)
+            vector[row] = 1.0
+            store.add(f'extra{row}', vector)
+        index.start_sync()
+        index._thread.join()
+        self.assertEqual(len(index), 60)
+
+    def test_empty_index_returns_nothing(self):
+        """
+        Test that searching an empty index returns no tracks.
+        """
+        index = HNSWIndex(TrackFeatureStore())
+        self.assertEqual(index.search(np.ones(DIMENSIONS), k=3), [])
+
+    def test_save_and_load_round_trip(self):
+        """
+        Test that a loaded graph answers like the saved one and catches up on
+        new rows in the background, not while loading.
+        """
+        store = random_store(200)
+        index = HNSWIndex.build(store, seed=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ann-index.npz')
+            index.save(path)
+            store.add('new', store.get('t1'))
+            loaded = HNSWIndex.load(path, store, ef=50)
+        self.assertEqual(len(loaded), len(store) - 1)
+        self.assertEqual(loaded.ef, 50)
+        query = store.get('t2')
+        self.assertEqual(loaded.search(query, k=5), index.search(query, k=5, ef=50))
+        loaded.start_sync()
+        loaded._thread.join()
+        self.assertEqual(len(loaded), len(store))
+
+    def test_loaded_graph_stays_mapped(self):
+        """
+        Test that a loaded graph keeps its links in memory-mapped arrays,
+        holds only the links changed since in memory, and saves both.
+        """
+        store = random_store(200)
+        index = HNSWIndex.build(store, seed=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ann-index.npz')
+            index.save(path)
+            loaded = HNSWIndex.load(path, store)
+            self.assertIsInstance(loaded._saved[0][2], np.memmap)
+            self.assertEqual(loaded._links, [{} for _ in loaded._saved])
+
+            for i in range(20):
+                store.add(f'new{i}', store.get(f't{i}'))
+            index.sync()
+            loaded.sync()
+            self.assertLess(len(loaded._links[0]), len(store))
+            query = store.get('t3')
+            self.assertEqual(loaded.search(query, k=10), index.search(query, k=10))
+
+            resaved = os.path.join(directory, 'resaved.npz')
+            loaded.save(resaved)
+            reloaded = HNSWIndex.load(resaved, store)
+            self.assertEqual(len(reloaded), len(store))
+            self.assertEqual(reloaded.search(query, k=10), index.search(query, k=10))
+
+    def test_load_rejects_another_store(self):
+        """
+        Test that a graph is not loaded over a store with other tracks.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ann-index.npz')
+            self.index.save(path)
+            with self.assertRaises(ValueError):
+                HNSWIndex.load(path, TrackFeatureStore.from_items([('other', self.store.get('t0'))]))
+
+class TestEngineCandidates(unittest.TestCase):
+    """
+    Test suite for candidate generation in `RecommendationEngine`.
+    """
+
+    def test_uses_index_only_for_large_stores(self):
+        """
+        Test that the engine scores exactly below `exact_below` and asks the index above it.
+        """
+        store = random_store(100)
+        index = HNSWIndex.build(store, seed=1)
+        calls = []
+        index.search = lambda *args, **kwargs: calls.append(args) or [('from-index', 1.0)]
+        taste = store.get('t0')
+
+        engine = RecommendationEngine(store, index=index, exact_below=101)
+        self.assertEqual(engine.candidates(taste, k=1)[0][0], 't0')
+        engine.exact_below = 100
+        self.assertEqual(engine.candidates(taste, k=1), [('from-index', 1.0)])
+        self.assertEqual(len(calls), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+A Test suite for the `BatchLoader` class and the Spotify loaders.
+"""
+
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import Mock
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_loader import BatchLoader, spotify_loader
+
+class TestBatchLoader(unittest.TestCase):
+    """
+    Test suite for the `BatchLoader` class.
+    """
+
+    def setUp(self):
+        self.calls = []
+
+    def fetch(self, keys):
+        """
+        Records the batch and returns a value for every key except 'unknown'.
+        """
+        self.calls.append(list(keys))
+        return {key: key.upper() for key in keys if key != 'unknown'}
+
+    def test_lookups_within_window_are_batched(self):
+        """
+        Test that lookups from several threads inside the window share one call.
+        """
+        loader = BatchLoader(self.fetch, window=0.05)
+        futures = []
+        threads = [threading.Thread(target=lambda key=key: futures.append(loader.load(key)))
+                   for key in ('a', 'b', 'c')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(future.result(timeout=1) for future in futures), ['A', 'B', 'C'])
+        self.assertEqual(len(self.calls), 1)
+
+    def test_each_caller_gets_its_own_result(self):
+        """
+        Test that futures resolve per key and unknown keys resolve to None.
+        """
+        loader = BatchLoader(self.fetch, window=None)
+        futures = loader.load_many(['a', 'unknown', 'a'])
+        loader.dispatch()
+        self.assertEqual([future.result() for future in futures], ['A', None, 'A'])
+        self.assertEqual(self.calls, [['a', 'unknown']])
+
+    def test_full_batch_is_sent_immediately(self):
+        """
+        Test that batches never exceed max_batch_size.
+        """
+        loader = BatchLoader(self.fetch, max_batch_size=2, window=None)
+        loader.load_many(['a', 'b', 'c'])
+        self.assertEqual(self.calls, [['a', 'b']])
+        loader.dispatch()
+        self.assertEqual(self.calls, [['a', 'b'], ['c']])
+
+    def test_errors_are_propagated_to_every_caller(self):
+        """
+        Test that a failed batch call fails each future in it.
+        """
+        def fail(keys):
+            raise RuntimeError('upstream down')
+
+        loader = BatchLoader(fail, window=None)
+        futures = loader.load_many(['a', 'b'])
+        loader.dispatch()
+        for future in futures:
+            self.assertIsInstance(future.exception(), RuntimeError)
+
+class TestSpotifyLoader(unittest.TestCase):
+    """
+    Test suite for `spotify_loader`.
+    """
+
+    def test_relinked_tracks_resolve_under_the_requested_id(self):
+        """
+        Test that a track Spotify relinked to another ID is keyed by the ID requested.
+        """
+        response = Mock(status_code=200)
+        response.json.return_value = {'tracks': [
+            {'id': 'copy', 'name': 'Song', 'linked_from': {'id': 'original'}},
+            {'id': 'plain', 'name': 'Other'},
+            None,
+        ]}
+        client = Mock()
+        client.get.return_value = response
+        loader = spotify_loader(client, 'tok', 'track', window=None)
+        futures = loader.load_many(['original', 'plain', 'unknown'])
+        loader.dispatch()
+        self.assertEqual([future.result() and future.result()['name'] for future in futures], ['Song', 'Other', None])
+
+if __name__ == '__main__':
+    unittest.main()
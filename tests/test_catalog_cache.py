@@ -0,0 +1,132 @@
+"""
+A Test suite for the tiered catalog cache.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from catalog_cache import CatalogCache, LRUCache, SQLiteEntityStore
+from fake_spotify import fake_artist
+from models import MODELS, Artist
+
+class TestLRUCache(unittest.TestCase):
+    """
+    Test suite for the `LRUCache` class.
+    """
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """
+        Test that the cache never grows past maxsize.
+        """
+        cache = LRUCache(maxsize=2)
+        expires = time.time() + 60
+        cache.set('a', 1, expires)
+        cache.set('b', 2, expires)
+        cache.get('a')
+        cache.set('c', 3, expires)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    def test_expired_entry_is_a_miss(self):
+        """
+        Test that entries are dropped after they expire.
+        """
+        cache = LRUCache()
+        cache.set('a', 1, time.time() - 1)
+        self.assertIsNone(cache.get('a'))
+
+class TestCatalogCache(unittest.TestCase):
+    """
+    Test suite for the `CatalogCache` class.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'catalog.sqlite3')
+
+    def test_store_is_shared_between_workers(self):
+        """
+        Test that an entity cached by one worker is served from disk to another.
+        """
+        first = CatalogCache(store=SQLiteEntityStore(self.path))
+        second = CatalogCache(store=SQLiteEntityStore(self.path))
+        first.set('track', 't1', {'name': 'Song'})
+        self.assertEqual(second.get('track', 't1'), {'name': 'Song'})
+        self.assertEqual(len(second.memory), 1)
+
+    def test_store_purges_expired_rows_periodically(self):
+        """
+        Test that expired rows are deleted every PURGE_EVERY writes.
+        """
+        store = SQLiteEntityStore(self.path)
+        store.PURGE_EVERY = 3
+        store.set('track', 'old', {}, time.time() - 1)
+        store.set('track', 'new', {}, time.time() + 60)
+        count = lambda: store._connect().execute('SELECT COUNT(*) FROM entities').fetchone()[0]
+        self.assertEqual(count(), 2)
+        store.set('track', 'newer', {}, time.time() + 60)
+        self.assertEqual(count(), 2)
+
+    def test_store_reads_can_skip_memory(self):
+        """
+        Test that bulk entries read with memory=False are not promoted to memory.
+        """
+        catalog = CatalogCache(store=SQLiteEntityStore(self.path))
+        catalog.set('interactions', 'u1|top', ['t1'], memory=False)
+        self.assertEqual(catalog.get('interactions', 'u1|top', memory=False), ['t1'])
+        self.assertEqual(len(catalog.memory), 0)
+
+    def test_store_items_written_since(self):
+        """
+        Test that store items can be limited to the ones expiring after a time.
+        """
+        store = SQLiteEntityStore(self.path)
+        now = time.time()
+        store.set('features', 'old', [1.0], now + 100)
+        store.set('features', 'new', [2.0], now + 200)
+        store.set('track', 'other', {}, now + 200)
+        self.assertEqual(sorted(store.items('features')), [('new', [2.0]), ('old', [1.0])])
+        self.assertEqual(list(store.items('features', expires_after=now + 150)), [('new', [2.0])])
+
+    def test_ttl_is_per_entity_type(self):
+        """
+        Test that each entity type uses its own TTL.
+        """
+        cache = CatalogCache(store=SQLiteEntityStore(self.path), ttls={'artist': -1})
+        cache.set('track', 'id', {'name': 'Song'})
+        cache.set('artist', 'id', {'name': 'Band'})
+        self.assertEqual(cache.get('track', 'id'), {'name': 'Song'})
+        self.assertIsNone(cache.get('artist', 'id'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_entities_are_cached_as_models(self):
+        """
+        Test that entities are kept as models in memory and as dicts on disk.
+        """
+        cache = CatalogCache(store=SQLiteEntityStore(self.path), models=MODELS)
+        cache.set('artist', 'a1', fake_artist('a1'))
+        artist = cache.get('artist', 'a1')
+        self.assertIsInstance(artist, Artist)
+        self.assertEqual(cache.store.get('artist', 'a1')[1], artist.to_dict())
+        other = CatalogCache(store=SQLiteEntityStore(self.path), models=MODELS)
+        self.assertEqual(other.get('artist', 'a1'), artist)
+
+    def test_entries_in_an_old_format_are_misses(self):
+        """
+        Test that a stored entry the model cannot read is treated as missing.
+        """
+        SQLiteEntityStore(self.path).set('track', 't1', {'name': 'Song'}, time.time() + 60)
+        cache = CatalogCache(store=SQLiteEntityStore(self.path), models=MODELS)
+        self.assertIsNone(cache.get('track', 't1'))
+        self.assertEqual(cache.missing('track', ['t1']), ['t1'])
+
+if __name__ == '__main__':
+    unittest.main()
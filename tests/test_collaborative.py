@@ -0,0 +1,141 @@
+"""
+A Test suite for the interaction log, the ALS trainer and the factor model.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from catalog_cache import CatalogCache, SQLiteEntityStore
+from collaborative import FactorModel, InteractionMatrix, read_interactions, record_interactions, train_als
+
+def two_groups(users=40, tracks=10, per_user=4, seed=0):
+    """
+    Returns interactions where even users only play 'a' tracks and odd users only 'b' tracks.
+    """
+    rng = np.random.default_rng(seed)
+    interactions = []
+    for user in range(users):
+        group = 'ab'[user % 2]
+        for track in rng.choice(tracks, per_user, replace=False):
+            interactions.append((f'u{user}', f'{group}{track}', 1.0))
+    return interactions
+
+class TestInteractionLog(unittest.TestCase):
+    """
+    Test suite for `record_interactions` and `read_interactions`.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = SQLiteEntityStore(os.path.join(directory.name, 'catalog.sqlite3'))
+        self.catalog = CatalogCache(store=self.store)
+
+    def test_interactions_are_weighted_by_source(self):
+        """
+        Test that each source's tracks are read back with the source's weight.
+        """
+        record_interactions(self.catalog, 'u1', 'top', ['t1', 't2', 't1'])
+        record_interactions(self.catalog, 'u1', 'saved', ['t2'])
+        record_interactions(self.catalog, 'u1', 'playlist:p1', ['t3'])
+        self.assertEqual(sorted(read_interactions(self.store)),
+                         [('u1', 't1', 3.0), ('u1', 't2', 2.0), ('u1', 't2', 3.0), ('u1', 't3', 1.0)])
+
+    def test_unchanged_lists_are_not_rewritten(self):
+        """
+        Test that recording the same list again does not write to the store.
+        """
+        record_interactions(self.catalog, 'u1', 'top', ['t1'])
+        writes = []
+        original = self.store.set
+        self.store.set = lambda *args: writes.append(args) or original(*args)
+        record_interactions(self.catalog, 'u1', 'top', ['t1'])
+        record_interactions(self.catalog, 'u1', 'top', ['t2'])
+        self.assertEqual(len(writes), 1)
+        # Interaction lists stay out of the in-process LRU.
+        self.assertEqual(len(self.catalog.memory), 0)
+
+class TestInteractionMatrix(unittest.TestCase):
+    """
+    Test suite for the `InteractionMatrix` class.
+    """
+
+    def test_duplicates_are_summed(self):
+        """
+        Test that a track found in several sources adds up its weights.
+        """
+        matrix = InteractionMatrix.from_interactions([('u1', 't1', 3.0), ('u2', 't2', 1.0), ('u1', 't1', 2.0),
+                                                      ('u1', 't2', 1.0)])
+        self.assertEqual(matrix.shape, (2, 2))
+        self.assertEqual(matrix.nnz, 3)
+        self.assertEqual(matrix.indptr.tolist(), [0, 2, 3])
+        self.assertEqual(matrix.indices.tolist(), [0, 1, 1])
+        self.assertEqual(matrix.data.tolist(), [5.0, 1.0, 1.0])
+
+    def test_transpose(self):
+        """
+        Test that transposing swaps rows and columns.
+        """
+        matrix = InteractionMatrix.from_interactions([('u1', 't1', 1.0), ('u2', 't1', 2.0), ('u2', 't2', 3.0)])
+        transposed = matrix.transpose()
+        self.assertEqual(transposed.row_ids, ['t1', 't2'])
+        self.assertEqual(transposed.indptr.tolist(), [0, 2, 3])
+        self.assertEqual(transposed.indices.tolist(), [0, 1, 1])
+        self.assertEqual(transposed.data.tolist(), [1.0, 2.0, 3.0])
+
+class TestFactorModel(unittest.TestCase):
+    """
+    Test suite for `train_als` and the `FactorModel` class.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.matrix = InteractionMatrix.from_interactions(two_groups())
+        cls.model = train_als(cls.matrix, factors=4, regularization=1.0, iterations=8)
+
+    def test_users_get_their_groups_tracks(self):
+        """
+        Test that ALS recommends tracks played by similar users.
+        """
+        for user_id, group in (('u0', 'a'), ('u1', 'b')):
+            results = self.model.recommend(user_id, k=3)
+            self.assertEqual(len(results), 3)
+            self.assertTrue(all(track_id.startswith(group) for track_id, _ in results), results)
+
+    def test_seen_and_excluded_tracks_are_left_out(self):
+        """
+        Test that played tracks and excluded tracks are never recommended.
+        """
+        row = self.matrix.row_ids.index('u0')
+        played = {self.matrix.column_ids[i] for i in self.matrix.indices[self.matrix.indptr[row]:self.matrix.indptr[row + 1]]}
+        first = self.model.recommend('u0', k=1)[0][0]
+        results = {track_id for track_id, _ in self.model.recommend('u0', k=20, exclude=[first])}
+        self.assertFalse(results & played)
+        self.assertNotIn(first, results)
+        self.assertEqual(len(results), len(self.matrix.column_ids) - len(played) - 1)
+
+    def test_unknown_user_gets_nothing(self):
+        """
+        Test that users outside the model get no recommendations.
+        """
+        self.assertNotIn('stranger', self.model)
+        self.assertEqual(self.model.recommend('stranger'), [])
+
+    def test_save_and_load_round_trip(self):
+        """
+        Test that a loaded model recommends like the saved one.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'als.npz')
+            self.model.save(path)
+            loaded = FactorModel.load(path)
+        self.assertEqual(loaded.recommend('u2', k=5), self.model.recommend('u2', k=5))
+
+if __name__ == '__main__':
+    unittest.main()
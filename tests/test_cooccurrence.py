@@ -0,0 +1,89 @@
+"""
+A Test suite for the playlist co-occurrence model.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cooccurrence import CooccurrenceBuilder, TrackNeighbors
+
+def build(playlists, **kwargs):
+    """
+    Returns the neighbor lists of the given playlists, reducing pairs in small chunks.
+    """
+    builder = CooccurrenceBuilder(chunk_pairs=4)
+    for track_ids in playlists:
+        builder.add(track_ids)
+    return builder.build(**kwargs)
+
+class TestCooccurrence(unittest.TestCase):
+    """
+    Test suite for `CooccurrenceBuilder` and `TrackNeighbors`.
+    """
+
+    def test_scores_are_cosine_normalized(self):
+        """
+        Test that shared playlists are divided by the geometric mean of each track's playlists.
+        """
+        neighbors = build([['a', 'b', 'c'], ['a', 'b'], ['a', 'd', 'a']])
+        result = dict(neighbors.neighbors('a'))
+        self.assertAlmostEqual(result['b'], 2 / np.sqrt(3 * 2), places=6)
+        self.assertAlmostEqual(result['c'], 1 / np.sqrt(3), places=6)
+        self.assertEqual([track_id for track_id, _ in neighbors.neighbors('b')], ['a', 'c'])
+        self.assertEqual(neighbors.neighbors('missing'), [])
+
+    def test_matches_dense_counts(self):
+        """
+        Test that chunked streaming gives the same top neighbors as a dense count matrix.
+        """
+        rng = np.random.default_rng(0)
+        playlists = [[f't{i}' for i in rng.choice(30, rng.integers(1, 8), replace=False)] for _ in range(60)]
+        neighbors = build(playlists, k=5)
+
+        occurrence = np.zeros((60, 30))
+        for row, track_ids in enumerate(playlists):
+            occurrence[row, [int(track_id[1:]) for track_id in track_ids]] = 1
+        counts = occurrence.T @ occurrence
+        np.fill_diagonal(counts, 0)
+        totals = occurrence.sum(axis=0)
+        for track in range(30):
+            if not totals[track]:
+                continue
+            scores = counts[track] / np.sqrt(totals[track] * np.maximum(totals, 1))
+            result = neighbors.neighbors(f't{track}')
+            expected = np.sort(scores[scores > 0])[::-1][:5]
+            np.testing.assert_allclose([score for _, score in result], expected, rtol=1e-5)
+
+    def test_k_min_count_and_playlist_length(self):
+        """
+        Test that rows are capped at k, rare pairs dropped and long playlists truncated.
+        """
+        neighbors = build([['a', 'b', 'c', 'd'], ['a', 'b']], k=2)
+        self.assertEqual(len(neighbors.neighbors('a')), 2)
+        self.assertEqual(len(neighbors.neighbors('a', limit=1)), 1)
+        self.assertEqual(build([['a', 'b', 'c'], ['a', 'b']], min_count=2).neighbors('a'), [('b', 1.0)])
+
+        builder = CooccurrenceBuilder(max_playlist_length=2)
+        builder.add(['a', 'b', 'c'])
+        self.assertEqual(builder.build().neighbors('c'), [])
+
+    def test_save_and_load_round_trip(self):
+        """
+        Test that loaded neighbor lists match the saved ones.
+        """
+        neighbors = build([['a', 'b', 'c'], ['b', 'c']])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'neighbors.npz')
+            neighbors.save(path)
+            loaded = TrackNeighbors.load(path)
+        for track_id in 'abc':
+            self.assertEqual(loaded.neighbors(track_id), neighbors.neighbors(track_id))
+
+if __name__ == '__main__':
+    unittest.main()
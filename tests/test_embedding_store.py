@@ -0,0 +1,143 @@
+"""
+A Test suite for the memory-mapped embedding file and feature store.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import embedding_store
+from ann_index import HNSWIndex
+from embedding_store import MappedFeatureStore, write_embedding_file
+from feature_store import DIMENSIONS, RecommendationEngine, TrackFeatureStore
+
+def random_store(count, seed=0):
+    """
+    Returns a store of random non-negative unit vectors with IDs in shuffled order.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = rng.random((count, DIMENSIONS))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store = TrackFeatureStore()
+    for i, vector in zip(rng.permutation(count), vectors):
+        store.add(f'track{i}', vector)
+    return store
+
+class TestMappedFeatureStore(unittest.TestCase):
+    """
+    Test suite for `write_embedding_file` and `MappedFeatureStore`.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'features.emb')
+        self.store = random_store(300)
+
+    def open(self, dtype):
+        write_embedding_file(self.path, self.store, dtype=dtype, created=123.0)
+        return MappedFeatureStore(self.path)
+
+    def test_round_trip_keeps_ids_and_vectors(self):
+        """
+        Test that both vector types read back close to the written vectors.
+        """
+        for dtype, tolerance in (('float16', 1e-3), ('int8', 1e-2)):
+            with self.subTest(dtype=dtype):
+                mapped = self.open(dtype)
+                self.assertEqual(mapped.dtype, dtype)
+                self.assertEqual(mapped.created, 123.0)
+                self.assertEqual(len(mapped), len(self.store))
+                for track_id in ('track0', 'track17', 'track299'):
+                    self.assertEqual(mapped.row(track_id), self.store.row(track_id))
+                    self.assertEqual(mapped.id_at(mapped.row(track_id)), track_id)
+                    np.testing.assert_allclose(mapped.get(track_id), self.store.get(track_id), atol=tolerance)
+                self.assertIsNone(mapped.row('track300'))
+                self.assertNotIn('missing', mapped)
+
+    def test_int8_file_is_a_quarter_of_float32(self):
+        """
+        Test that int8 vectors take one byte per dimension.
+        """
+        self.open('int8')
+        self.assertLess(os.path.getsize(self.path), 300 * DIMENSIONS + 300 * 30 + 1024)
+
+    def test_scores_match_dequantized_vectors(self):
+        """
+        Test that chunked scoring equals scoring the dequantized rows.
+        """
+        mapped = self.open('int8')
+        query = self.store.get('track5')
+        expected = mapped.vectors(np.arange(len(mapped))) @ query
+        original = embedding_store.SCORE_CHUNK
+        embedding_store.SCORE_CHUNK = 64
+        self.addCleanup(setattr, embedding_store, 'SCORE_CHUNK', original)
+        np.testing.assert_allclose(mapped.scores(query), expected, rtol=1e-5)
+
+    def test_new_tracks_go_after_the_file(self):
+        """
+        Test that added tracks get rows after the file's and file tracks are not replaced.
+        """
+        mapped = self.open('float16')
+        vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        vector[0] = 1.0
+        self.assertEqual(mapped.add('new', vector), 300)
+        self.assertEqual(mapped.add('track1', vector), self.store.row('track1'))
+        self.assertEqual(mapped.extend([('track2', vector), ('newer', vector)]), 1)
+        self.assertEqual(len(mapped), 302)
+        self.assertEqual(mapped.id_at(301), 'newer')
+        np.testing.assert_array_equal(mapped.vectors([300, 0])[0], vector)
+        self.assertEqual(mapped.scores(vector).shape, (302,))
+
+    def test_scores_tolerate_rows_added_while_scoring(self):
+        """
+        Test that a row added to the tail during scoring does not break the result.
+        """
+        mapped = self.open('float16')
+        vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        vector[0] = 1.0
+        mapped.add('new', vector)
+        tail_scores = mapped._tail.scores
+
+        def scores_then_add(query):
+            result = tail_scores(query)
+            mapped.add('newer', vector)
+            return result
+
+        mapped._tail.scores = scores_then_add
+        self.assertEqual(mapped.scores(vector).shape, (301,))
+
+    def test_engine_and_index_work_on_mapped_store(self):
+        """
+        Test that recommendations from the mapped store match the in-memory store.
+        """
+        mapped = self.open('float16')
+        taste = self.store.get('track9')
+        expected = [track_id for track_id, _ in RecommendationEngine(self.store).top_k(taste, k=5)]
+        self.assertEqual([track_id for track_id, _ in RecommendationEngine(mapped).top_k(taste, k=5)], expected)
+        index = HNSWIndex.build(mapped, seed=1)
+        self.assertEqual(index.search(taste, k=1)[0][0], 'track9')
+
+    def test_rejects_other_files(self):
+        """
+        Test that files of another format or feature layout are not opened.
+        """
+        with open(self.path, 'wb') as f:
+            f.write(b'not an embedding file' * 10)
+        with self.assertRaises(ValueError):
+            MappedFeatureStore(self.path)
+
+        self.open('float16')
+        original = embedding_store.FEATURE_NAMES
+        embedding_store.FEATURE_NAMES = original[:-1] + ('genre:other',)
+        self.addCleanup(setattr, embedding_store, 'FEATURE_NAMES', original)
+        with self.assertRaises(ValueError):
+            MappedFeatureStore(self.path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+A Test suite for the local Spotify stand-in.
+"""
+
+import os
+import sys
+import unittest
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fake_spotify import Latency, apply_fields, create_fake_spotify, parse_fields
+
+AUTH = {'Authorization': 'Bearer tok'}
+
+class TestFakeSpotify(unittest.TestCase):
+    """
+    Test suite for `create_fake_spotify`.
+    """
+
+    def test_throttling_sends_retry_after(self):
+        """
+        Test that injected 429s carry a Retry-After header.
+        """
+        client = create_fake_spotify(throttle_rate=1.0, retry_after=3).test_client()
+        response = client.get('/v1/me', headers=AUTH)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '3')
+
+    def test_errors_are_injected(self):
+        """
+        Test that the error rate produces 500s.
+        """
+        client = create_fake_spotify(error_rate=1.0).test_client()
+        self.assertEqual(client.get('/v1/me', headers=AUTH).status_code, 500)
+
+    def test_bearer_token_is_required(self):
+        """
+        Test that Web API endpoints reject requests without a token.
+        """
+        client = create_fake_spotify().test_client()
+        self.assertEqual(client.get('/v1/me').status_code, 401)
+
+    def test_playlists_are_paginated(self):
+        """
+        Test that /me/playlists reports the total and a next link.
+        """
+        client = create_fake_spotify(playlist_count=30).test_client()
+        page = client.get('/v1/me/playlists?limit=20', headers=AUTH).get_json()
+        self.assertEqual((len(page['items']), page['total']), (20, 30))
+        self.assertIn('offset=20', page['next'])
+
+    def test_playlist_tracks_follow_snapshot(self):
+        """
+        Test that playlist tracks are paginated and an edit changes the snapshot_id.
+        """
+        client = create_fake_spotify().test_client()
+        playlist = client.get('/v1/playlists/pl00004', headers=AUTH).get_json()
+        self.assertEqual((len(playlist['tracks']['items']), playlist['tracks']['total']), (100, 200))
+        page = client.get('/v1/playlists/pl00004/tracks?offset=100', headers=AUTH).get_json()
+        self.assertEqual(len(page['items']), 100)
+        self.assertEqual(client.post('/_edit/pl00004').status_code, 204)
+        edited = client.get('/v1/playlists/pl00004', headers=AUTH).get_json()
+        self.assertNotEqual(edited['snapshot_id'], playlist['snapshot_id'])
+        self.assertEqual(client.get('/v1/playlists/missing', headers=AUTH).status_code, 404)
+
+    def test_fields_and_market_trim_responses(self):
+        """
+        Test that `fields` filters the response and a market drops available_markets.
+        """
+        self.assertEqual(parse_fields('id,tracks(total,items(track(id,name)))'),
+                         {'id': None, 'tracks': {'total': None, 'items': {'track': {'id': None, 'name': None}}}})
+        self.assertEqual(apply_fields([{'id': 1, 'x': 2}], {'id': None}), [{'id': 1}])
+        client = create_fake_spotify().test_client()
+        track = client.get('/v1/tracks/t1?market=from_token', headers=AUTH).get_json()
+        self.assertNotIn('available_markets', track)
+        self.assertNotIn('available_markets', track['album'])
+        playlist = client.get('/v1/playlists/pl00001?fields=name,tracks(total)', headers=AUTH).get_json()
+        self.assertEqual(set(playlist), {'name', 'tracks'})
+        self.assertEqual(set(playlist['tracks']), {'total'})
+
+    def test_latency_specs(self):
+        """
+        Test that latency specs are parsed into seconds.
+        """
+        self.assertEqual(Latency('fixed:50').sample(), 0.05)
+        self.assertTrue(0.01 <= Latency('uniform:10:20').sample() <= 0.02)
+        self.assertEqual(Latency('none').sample(), 0)
+        with self.assertRaises(ValueError):
+            Latency('pareto:1')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+A Test suite for the local feature store and recommendation engine.
+"""
+
+import os
+import sys
+import unittest
+import numpy as np
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from feature_store import DIMENSIONS, FEATURE_NAMES, RecommendationEngine, TrackFeatureStore, track_vector
+
+def vector(*values):
+    """
+    Returns a unit vector with the given leading values.
+    """
+    v = np.zeros(DIMENSIONS, dtype=np.float32)
+    v[:len(values)] = values
+    return v / np.linalg.norm(v)
+
+class TestTrackVector(unittest.TestCase):
+    """
+    Test suite for `track_vector`.
+    """
+
+    def test_vector_is_scaled_and_normalized(self):
+        """
+        Test that features are scaled to their range and the vector has unit norm.
+        """
+        v = track_vector({'energy': 0.5, 'tempo': 500, 'loudness': -30}, popularity=50)
+        self.assertEqual(v.shape, (DIMENSIONS,))
+        self.assertAlmostEqual(float(np.linalg.norm(v)), 1.0, places=5)
+        raw = {name: v[i] for i, name in enumerate(FEATURE_NAMES)}
+        self.assertAlmostEqual(raw['tempo'] / raw['energy'], 2.0, places=5)
+        self.assertAlmostEqual(raw['loudness'], raw['energy'], places=5)
+
+    def test_genres_set_matching_flags(self):
+        """
+        Test that an artist genre sets the flags of its words.
+        """
+        v = track_vector({}, genres=['indie rock', 'hip hop'])
+        flagged = {name for i, name in enumerate(FEATURE_NAMES) if v[i]}
+        self.assertEqual(flagged, {'genre:indie', 'genre:rock', 'genre:hip hop'})
+
+    def test_empty_features_give_zero_vector(self):
+        """
+        Test that a track without features does not divide by zero.
+        """
+        self.assertFalse(track_vector({}).any())
+
+class TestTrackFeatureStore(unittest.TestCase):
+    """
+    Test suite for the `TrackFeatureStore` class.
+    """
+
+    def test_add_grows_and_replaces(self):
+        """
+        Test that the matrix grows past its capacity and re-adding replaces a row.
+        """
+        store = TrackFeatureStore(capacity=2)
+        for i in range(5):
+            store.add(f't{i}', vector(i + 1))
+        self.assertEqual(store.add('t1', vector(0, 1)), 1)
+        self.assertEqual(len(store), 5)
+        self.assertEqual(store.matrix.shape, (5, DIMENSIONS))
+        np.testing.assert_array_equal(store.get('t1'), vector(0, 1))
+        self.assertIsNone(store.get('missing'))
+
+    def test_from_items_skips_old_layouts(self):
+        """
+        Test that vectors of another length are skipped.
+        """
+        store = TrackFeatureStore.from_items([('t1', vector(1).tolist()), ('t2', [1.0, 0.0])])
+        self.assertEqual(store.ids, ['t1'])
+
+class TestRecommendationEngine(unittest.TestCase):
+    """
+    Test suite for the `RecommendationEngine` class.
+    """
+
+    def setUp(self):
+        self.store = TrackFeatureStore()
+        self.store.add('seed', vector(1, 0))
+        self.store.add('close', vector(0.9, 0.1))
+        self.store.add('closer', vector(0.95, 0.05))
+        self.store.add('far', vector(0, 1))
+        self.engine = RecommendationEngine(self.store)
+
+    def test_top_k_orders_by_similarity_and_excludes(self):
+        """
+        Test that the best matches come first and excluded tracks are left out.
+        """
+        taste = self.engine.taste_vector(['seed'])
+        results = self.engine.top_k(taste, k=2, exclude=['seed'])
+        self.assertEqual([track_id for track_id, _ in results], ['closer', 'close'])
+        self.assertGreater(results[0][1], results[1][1])
+
+    def test_top_k_is_capped_by_store_size(self):
+        """
+        Test that asking for more tracks than are stored returns them all.
+        """
+        taste = self.engine.taste_vector(['seed'])
+        results = self.engine.top_k(taste, k=10, exclude=['seed'])
+        self.assertEqual([track_id for track_id, _ in results], ['closer', 'close', 'far'])
+
+    def test_taste_vector_is_weighted(self):
+        """
+        Test that weights pull the taste toward heavier tracks.
+        """
+        taste = self.engine.taste_vector(['seed', 'far', 'unknown'], weights=[1, 3, 5])
+        self.assertEqual(self.engine.top_k(taste, k=1)[0][0], 'far')
+        self.assertIsNone(self.engine.taste_vector(['unknown']))
+
+if __name__ == '__main__':
+    unittest.main()
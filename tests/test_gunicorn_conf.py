@@ -0,0 +1,60 @@
+"""
+A Test suite for the gunicorn worker modes.
+"""
+
+import os
+import runpy
+import unittest
+from unittest.mock import patch
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CONF_PATH = os.path.join(ROOT, 'gunicorn.conf.py')
+
+def load_conf(**env):
+    """
+    Evaluates gunicorn.conf.py with the given environment.
+    """
+    with patch.dict(os.environ, env, clear=True):
+        settings = runpy.run_path(CONF_PATH)
+        settings['environ'] = dict(os.environ)
+    return settings
+
+class TestGunicornConf(unittest.TestCase):
+    """
+    Test suite for `gunicorn.conf.py`.
+    """
+
+    def test_sync_is_the_default(self):
+        """
+        Test that gunicorn's own defaults are kept without WORKER_MODE.
+        """
+        self.assertNotIn('worker_class', load_conf())
+
+    def test_gthread_mode(self):
+        """
+        Test that gthread mode sets the thread count.
+        """
+        settings = load_conf(WORKER_MODE='gthread', GUNICORN_THREADS='16')
+        self.assertEqual((settings['worker_class'], settings['threads']), ('gthread', 16))
+
+    def test_gevent_mode_raises_pool_size(self):
+        """
+        Test that gevent mode allows many connections and a larger Spotify pool.
+        """
+        settings = load_conf(WORKER_MODE='gevent')
+        self.assertEqual(settings['worker_class'], 'gevent')
+        self.assertEqual(settings['worker_connections'], 1000)
+        self.assertEqual(settings['environ']['SPOTIFY_POOL_SIZE'], '100')
+        settings = load_conf(WORKER_MODE='gevent', SPOTIFY_POOL_SIZE='20')
+        self.assertEqual(settings['environ']['SPOTIFY_POOL_SIZE'], '20')
+
+    def test_unknown_mode_is_rejected(self):
+        """
+        Test that a typo in WORKER_MODE fails loudly.
+        """
+        with self.assertRaises(ValueError):
+            load_conf(WORKER_MODE='async')
+
+if __name__ == '__main__':
+    unittest.main()
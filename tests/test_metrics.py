@@ -0,0 +1,130 @@
+"""
+A Test suite for the metrics registry and the /metrics endpoint.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metrics import MetricsRegistry
+from spotify_client import upstream_endpoint
+
+def make_registry(directory=None):
+    """
+    Builds a registry with one counter and one histogram.
+    """
+    registry = MetricsRegistry(directory)
+    registry.counter('requests_total', 'Requests.')
+    registry.histogram('duration_seconds', 'Duration.', buckets=(0.1, 1.0))
+    return registry
+
+class TestMetricsRegistry(unittest.TestCase):
+    """
+    Test suite for the `MetricsRegistry` class.
+    """
+
+    def test_render_counters_and_histograms(self):
+        """
+        Test that samples are rendered in the Prometheus text format.
+        """
+        registry = make_registry()
+        registry.inc('requests_total', endpoint='home', status='200')
+        registry.observe('duration_seconds', 0.05, endpoint='home')
+        registry.observe('duration_seconds', 0.5, endpoint='home')
+        text = registry.render()
+        self.assertIn('# TYPE duration_seconds histogram', text)
+        self.assertIn('requests_total{endpoint="home",status="200"} 1', text)
+        self.assertIn('duration_seconds_bucket{endpoint="home",le="0.1"} 1', text)
+        self.assertIn('duration_seconds_bucket{endpoint="home",le="+Inf"} 2', text)
+        self.assertIn('duration_seconds_count{endpoint="home"} 2', text)
+
+    def test_workers_are_merged(self):
+        """
+        Test that a scrape served by one worker includes the other workers' metrics.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            first = make_registry(directory)
+            second = make_registry(directory)
+            first.inc('requests_total', endpoint='home')
+            first.flush()
+            # Both registries live in this process, so give the first its own file.
+            os.rename(os.path.join(directory, f'metrics-{os.getpid()}.json'),
+                      os.path.join(directory, 'metrics-other.json'))
+            second.inc('requests_total', 2, endpoint='home')
+            self.assertIn('requests_total{endpoint="home"} 3', second.render())
+
+    def test_concurrent_flushes_do_not_raise(self):
+        """
+        Test that threads flushing at once neither fail nor leave a temporary file.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            registry = make_registry(directory)
+            errors = []
+
+            def flush():
+                try:
+                    for _ in range(50):
+                        registry.flush()
+                except OSError as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=flush) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual(os.listdir(directory), [f'metrics-{os.getpid()}.json'])
+
+        # The directory is gone now; the write fails without raising.
+        registry.flush()
+
+    def test_snapshots_of_exited_workers_are_removed(self):
+        """
+        Test that a scrape deletes the snapshot of a process that has exited.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                                    capture_output=True, text=True, check=True)
+            stale = make_registry(directory)
+            stale.inc('requests_total', 5, endpoint='home')
+            stale.flush()
+            os.rename(os.path.join(directory, f'metrics-{os.getpid()}.json'),
+                      os.path.join(directory, f'metrics-{exited.stdout.strip()}.json'))
+            registry = make_registry(directory)
+            registry.inc('requests_total', endpoint='home')
+            self.assertIn('requests_total{endpoint="home"} 1', registry.render())
+            self.assertEqual(os.listdir(directory), [f'metrics-{os.getpid()}.json'])
+
+    def test_collectors_are_included(self):
+        """
+        Test that collector samples are reported as counters.
+        """
+        registry = make_registry()
+        registry.add_collector(lambda: [('requests_total', {'source': 'cache'}, 7)])
+        self.assertIn('requests_total{source="cache"} 7', registry.render())
+
+class TestUpstreamEndpoint(unittest.TestCase):
+    """
+    Test suite for `upstream_endpoint`.
+    """
+
+    def test_ids_are_dropped(self):
+        """
+        Test that endpoint labels do not contain IDs.
+        """
+        self.assertEqual(upstream_endpoint('https://api.spotify.com/v1/me'), 'me')
+        self.assertEqual(upstream_endpoint('https://api.spotify.com/v1/me/top/tracks'), 'top/tracks')
+        self.assertEqual(upstream_endpoint('https://api.spotify.com/v1/tracks/abc'), 'tracks')
+        self.assertEqual(upstream_endpoint('https://api.spotify.com/v1/playlists/p1/tracks?offset=100'),
+                         'playlists/tracks')
+        self.assertEqual(upstream_endpoint('playlists/p1'), 'playlist')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+A Test suite for the compact view models.
+"""
+
+import json
+import os
+import sys
+import tracemalloc
+import unittest
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fake_spotify import fake_artist, fake_playlist, fake_playlist_track, fake_track
+from models import Artist, Playlist, Track
+
+class TestModels(unittest.TestCase):
+    """
+    Test suite for `Track`, `Artist` and `Playlist`.
+    """
+
+    def test_track_keeps_rendered_fields(self):
+        """
+        Test that a track keeps what the templates render.
+        """
+        raw = fake_track('t1')
+        track = Track.from_spotify(raw)
+        self.assertEqual(track.name, raw['name'])
+        self.assertEqual(track.artists[0].name, raw['artists'][0]['name'])
+        self.assertEqual(track.album.image_url, raw['album']['images'][0]['url'])
+        self.assertEqual(track.spotify_url, raw['external_urls']['spotify'])
+        self.assertFalse(hasattr(track, '__dict__'))
+        self.assertIsNone(Track.from_spotify(None))
+
+    def test_round_trip_through_dict(self):
+        """
+        Test that `from_dict(to_dict())` gives back an equal model.
+        """
+        track = Track.from_spotify(fake_track('t1'))
+        artist = Artist.from_spotify(fake_artist('a1'))
+        self.assertEqual(Track.from_dict(track.to_dict()), track)
+        self.assertEqual(Artist.from_dict(artist.to_dict()), artist)
+        self.assertIs(Track.from_spotify(track), track)
+
+    def test_names_are_interned(self):
+        """
+        Test that artist and genre names are shared between instances.
+        """
+        first = Artist.from_spotify(fake_artist('a1'))
+        second = Artist.from_dict(first.to_dict())
+        self.assertIs(first.name, second.name)
+        self.assertIs(first.genres[0], second.genres[0])
+
+    def test_playlist_skips_local_tracks(self):
+        """
+        Test that playlist tracks without an ID are left out.
+        """
+        raw = fake_playlist(1, 'user')
+        raw['tracks'] = {'total': 3, 'items': [fake_playlist_track(raw['id'], 0),
+                                               {'track': {'id': None, 'name': 'Local file'}}, {'track': None}]}
+        playlist = Playlist.from_spotify(raw)
+        self.assertEqual(playlist.total, 3)
+        self.assertEqual([track.id for track in playlist.tracks], ['pl00001v1t0000'])
+        self.assertEqual(Playlist.from_dict(playlist.to_dict()), playlist)
+
+    def test_models_are_an_order_of_magnitude_smaller(self):
+        """
+        Test that a cached track takes a tenth of the memory of its decoded JSON.
+        """
+        payloads = [json.dumps(fake_track(f't{i}')) for i in range(200)]
+
+        def allocated(build):
+            tracemalloc.start()
+            objects = [build(payload) for payload in payloads]
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del objects
+            return size
+
+        raw = allocated(json.loads)
+        models = allocated(lambda payload: Track.from_spotify(json.loads(payload)))
+        self.assertLess(models * 10, raw)
+
+if __name__ == '__main__':
+    unittest.main()
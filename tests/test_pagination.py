@@ -0,0 +1,87 @@
+"""
+A Test suite for offset-parallel pagination.
+"""
+
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pagination import Paginator
+
+class FakeClient:
+    """
+    Serves `total` numbered items in pages and records the offsets asked for.
+    """
+
+    def __init__(self, total, fail_offset=None):
+        self.total = total
+        self.fail_offset = fail_offset
+        self.offsets = []
+        self.lock = threading.Lock()
+
+    def page(self, limit, offset):
+        return {'items': list(range(offset, min(offset + limit, self.total))),
+                'limit': limit, 'offset': offset, 'total': self.total}
+
+    def get(self, path, token, params=None):
+        with self.lock:
+            self.offsets.append(params['offset'])
+        response = MagicMock()
+        if params['offset'] == self.fail_offset:
+            response.raise_for_status.side_effect = requests.HTTPError('500 Server Error')
+        response.json.return_value = self.page(params['limit'], params['offset'])
+        return response
+
+class TestPaginator(unittest.TestCase):
+    """
+    Test suite for the `Paginator` class.
+    """
+
+    def make_paginator(self, client):
+        paginator = Paginator(client, max_workers=4)
+        self.addCleanup(paginator.shutdown)
+        return paginator
+
+    def test_remaining_pages_are_fetched_in_order(self):
+        """
+        Test that every page after the first is requested and items keep their order.
+        """
+        client = FakeClient(total=235)
+        result = self.make_paginator(client).paginate('me/playlists', 'tok', client.page(50, 0),
+                                                      params={'limit': 50})
+        self.assertEqual(result.total, 235)
+        self.assertEqual(list(result), list(range(235)))
+        self.assertEqual(sorted(client.offsets), [50, 100, 150, 200])
+
+    def test_single_page_makes_no_calls(self):
+        """
+        Test that a library that fits on the first page needs no more calls.
+        """
+        client = FakeClient(total=12)
+        result = self.make_paginator(client).paginate('me/playlists', 'tok', client.page(50, 0),
+                                                      params={'limit': 50})
+        self.assertEqual(list(result), list(range(12)))
+        self.assertEqual(client.offsets, [])
+
+    def test_failed_page_raises_when_reached(self):
+        """
+        Test that a failed page raises after the pages before it were yielded.
+        """
+        client = FakeClient(total=150, fail_offset=100)
+        result = self.make_paginator(client).paginate('me/playlists', 'tok', client.page(50, 0),
+                                                      params={'limit': 50})
+        seen = []
+        with self.assertRaises(requests.HTTPError):
+            for item in result:
+                seen.append(item)
+        self.assertEqual(seen, list(range(100)))
+
+if __name__ == '__main__':
+    unittest.main()
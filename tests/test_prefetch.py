@@ -0,0 +1,95 @@
+"""
+A Test suite for the background `Prefetcher`.
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from catalog_cache import CatalogCache
+from feature_store import DIMENSIONS, FEATURE_NAMES, TrackFeatureStore
+from models import MODELS, Track
+from prefetch import Prefetcher
+
+class FakeClient:
+    """
+    Answers multi-ID requests with one entity per requested ID.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, path, token, params=None):
+        ids = params['ids'].split(',')
+        self.calls.append((path, ids))
+        response = MagicMock()
+        response.status_code = 200
+        if path == 'audio-features':
+            entities = {'audio_features': [{'id': entity_id, 'energy': 0.8} for entity_id in ids]}
+        else:
+            entities = {path: [{'id': entity_id} for entity_id in ids]}
+        response.json.return_value = entities
+        return response
+
+class TestPrefetcher(unittest.TestCase):
+    """
+    Test suite for the `Prefetcher` class.
+    """
+
+    def setUp(self):
+        self.client = FakeClient()
+        self.catalog = CatalogCache()
+        self.prefetcher = Prefetcher(self.client, self.catalog)
+        self.addCleanup(self.prefetcher.shutdown)
+
+    def test_uses_batch_endpoints_for_uncached_ids(self):
+        """
+        Test that only uncached IDs are fetched, in one call per entity type.
+        """
+        self.catalog.set('artist', 'a1', {'id': 'a1'})
+        future = self.prefetcher.submit('tok', track_ids=['t1', 't2', 't1'], artist_ids=['a1', 'a2'])
+        self.assertEqual(future.result(), 3)
+        self.assertEqual(self.client.calls, [('tracks', ['t1', 't2']), ('artists', ['a2'])])
+        self.assertEqual(self.catalog.get('artist', 'a2'), {'id': 'a2'})
+
+    def test_batches_are_capped_at_fifty_ids(self):
+        """
+        Test that large prefetches are split into calls of at most 50 IDs.
+        """
+        self.prefetcher.prefetch('tok', track_ids=[f't{i}' for i in range(120)])
+        self.assertEqual([len(ids) for _, ids in self.client.calls], [50, 50, 20])
+
+    def test_index_adds_vectors_for_new_tracks(self):
+        """
+        Test that indexing fetches uncached artists and the audio features
+        once, stores the vectors and skips tracks that are already indexed.
+        """
+        features = TrackFeatureStore()
+        catalog = CatalogCache(models=MODELS)
+        prefetcher = Prefetcher(self.client, catalog, features=features)
+        self.addCleanup(prefetcher.shutdown)
+        catalog.set('artist', 'a1', {'id': 'a1', 'name': 'A', 'genres': ['indie rock']})
+        tracks = [Track.from_spotify({'id': f't{i}', 'artists': [{'id': artist, 'name': 'A'}]})
+                  for i, artist in enumerate(['a1', 'a1', 'a2'])]
+
+        self.assertEqual(prefetcher.index('tok', tracks), 3)
+        self.assertEqual(prefetcher.index('tok', tracks), 0)
+        self.assertEqual(self.client.calls, [('artists', ['a2']), ('audio-features', ['t0', 't1', 't2'])])
+        self.assertEqual(features.ids, ['t0', 't1', 't2'])
+        self.assertTrue(features.get('t0')[list(FEATURE_NAMES).index('genre:rock')])
+        self.assertEqual(len(catalog.get('features', 't0')), DIMENSIONS)
+        self.assertEqual(catalog.get('track', 't1').id, 't1')
+
+    def test_index_without_feature_store_is_a_no_op(self):
+        """
+        Test that indexing does nothing when the local engine is off.
+        """
+        self.assertEqual(self.prefetcher.index('tok', [Track('t1', 'T')]), 0)
+        self.assertEqual(self.client.calls, [])
+
+if __name__ == '__main__':
+    unittest.main()
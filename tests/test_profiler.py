@@ -0,0 +1,80 @@
+"""
+A Test suite for on-demand request profiling.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from profiler import RequestProfiler
+
+def hello_app(environ, start_response):
+    """
+    A minimal WSGI application.
+    """
+    return Response('hello')(environ, start_response)
+
+class TestRequestProfiler(unittest.TestCase):
+    """
+    Test suite for the `RequestProfiler` middleware.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.profiler = RequestProfiler(hello_app, self.directory, token='s3cret')
+        self.client = Client(self.profiler, Response)
+
+    def profiles(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.prof'))
+
+    def test_requests_are_not_profiled_by_default(self):
+        """
+        Test that a plain request or a wrong token does not profile.
+        """
+        self.client.get('/')
+        response = self.client.get('/', headers={'X-Profile': 'wrong'})
+        self.assertEqual(response.get_data(as_text=True), 'hello')
+        self.assertNotIn('X-Profile-File', response.headers)
+        self.assertEqual(self.profiles(), [])
+
+    def test_header_with_token_profiles_the_request(self):
+        """
+        Test that the header writes a profile and a text summary.
+        """
+        response = self.client.get('/playlists', headers={'X-Profile': 's3cret'})
+        self.assertEqual(response.get_data(as_text=True), 'hello')
+        name = response.headers['X-Profile-File']
+        self.assertEqual(self.profiles(), [name])
+        self.assertIn('-GET-playlists-', name)
+        with open(os.path.join(self.directory, name[:-len('.prof')] + '.txt')) as summary:
+            self.assertIn('GET /playlists', summary.read())
+
+    def test_header_is_ignored_without_token(self):
+        """
+        Test that the header does nothing unless a token is configured.
+        """
+        client = Client(RequestProfiler(hello_app, self.directory), Response)
+        response = client.get('/', headers={'X-Profile': ''})
+        self.assertNotIn('X-Profile-File', response.headers)
+
+    def test_arm_profiles_the_next_requests(self):
+        """
+        Test that arming profiles exactly the requested number of requests.
+        """
+        self.profiler.arm(2)
+        responses = [self.client.get(f'/page/{i}') for i in range(3)]
+        self.assertEqual(['X-Profile-File' in r.headers for r in responses], [True, True, False])
+        self.assertEqual(len(self.profiles()), 2)
+        self.assertFalse(os.path.exists(self.profiler.flag_path))
+
+if __name__ == '__main__':
+    unittest.main()
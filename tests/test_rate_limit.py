@@ -0,0 +1,87 @@
+"""
+A Test suite for the upstream rate-limit scheduler.
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rate_limit import RateLimitExceeded, TokenBucket, UpstreamScheduler
+
+def make_response(status_code, retry_after=None):
+    """
+    Builds a fake upstream response.
+    """
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {'Retry-After': retry_after} if retry_after else {}
+    return response
+
+class TestTokenBucket(unittest.TestCase):
+    """
+    Test suite for the `TokenBucket` class.
+    """
+
+    def test_burst_then_paced(self):
+        """
+        Test that the burst is free and later calls are told to wait.
+        """
+        bucket = TokenBucket(rate=10, capacity=2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+
+    def test_block_delays_everyone(self):
+        """
+        Test that a block makes callers wait even with tokens left.
+        """
+        bucket = TokenBucket(rate=10, capacity=5)
+        bucket.block(2)
+        self.assertAlmostEqual(bucket.reserve(), 2, places=1)
+
+class TestUpstreamScheduler(unittest.TestCase):
+    """
+    Test suite for the `UpstreamScheduler` class.
+    """
+
+    def setUp(self):
+        self.sleeps = []
+        self.scheduler = UpstreamScheduler(rate=100, burst=10, max_wait=5,
+                                           max_retries=2, sleep=self.sleeps.append)
+
+    def test_429_is_retried_after_retry_after(self):
+        """
+        Test that a 429 blocks for Retry-After seconds and the call is retried.
+        """
+        send = MagicMock(side_effect=[make_response(429, '1'), make_response(200)])
+        self.assertEqual(self.scheduler.call(send).status_code, 200)
+        self.assertAlmostEqual(self.sleeps[0], 1, places=1)
+        stats = self.scheduler.stats()
+        self.assertEqual((stats['requests'], stats['throttled'], stats['retries']), (2, 1, 1))
+
+    def test_retry_after_past_deadline_is_rejected(self):
+        """
+        Test that a backoff longer than the deadline fails fast.
+        """
+        send = MagicMock(return_value=make_response(429, '30'))
+        with self.assertRaises(RateLimitExceeded) as raised:
+            self.scheduler.call(send)
+        self.assertEqual(send.call_count, 1)
+        self.assertGreater(raised.exception.retry_after, 5)
+        self.assertEqual(self.scheduler.stats()['rejected'], 1)
+
+    def test_retries_are_bounded(self):
+        """
+        Test that the scheduler gives up after max_retries.
+        """
+        send = MagicMock(return_value=make_response(429, '0'))
+        with self.assertRaises(RateLimitExceeded):
+            self.scheduler.call(send)
+        self.assertEqual(send.call_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
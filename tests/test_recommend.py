@@ -0,0 +1,106 @@
+"""
+A Test suite for the multi-seed recommendation fan-out.
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from recommend import RecommendationFanOut, merge_and_rerank
+
+class SlowClient:
+    """
+    Answers each seed with its own ranked list after a fixed delay.
+    """
+
+    def __init__(self, delay, lists):
+        self.delay = delay
+        self.lists = lists
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def get(self, path, token, params=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        seed = params.get('seed_tracks') or params.get('seed_artists')
+        response = MagicMock()
+        if seed == 'broken':
+            response.raise_for_status.side_effect = RuntimeError('500')
+        response.json.return_value = {'tracks': [{'id': track_id} for track_id in self.lists.get(seed, [])]}
+        return response
+
+class TestMergeAndRerank(unittest.TestCase):
+    """
+    Test suite for `merge_and_rerank`.
+    """
+
+    def test_tracks_from_several_seeds_rank_first(self):
+        """
+        Test that tracks suggested by more seeds win and duplicates are dropped.
+        """
+        lists = [
+            [{'id': 'a'}, {'id': 'shared'}],
+            [{'id': 'b'}, {'id': 'shared'}],
+        ]
+        merged = merge_and_rerank(lists, limit=10)
+        self.assertEqual(merged[0]['id'], 'shared')
+        self.assertEqual(sorted(track['id'] for track in merged), ['a', 'b', 'shared'])
+
+    def test_seed_tracks_are_excluded(self):
+        """
+        Test that seeds are not recommended back to the user.
+        """
+        merged = merge_and_rerank([[{'id': 'seed'}, {'id': 'x'}]], limit=10, exclude=['seed'])
+        self.assertEqual([track['id'] for track in merged], ['x'])
+
+class TestRecommendationFanOut(unittest.TestCase):
+    """
+    Test suite for the `RecommendationFanOut` class.
+    """
+
+    def test_seeds_are_requested_concurrently(self):
+        """
+        Test that wall-clock time stays close to one call, not the sum.
+        """
+        client = SlowClient(0.1, {'t1': ['a', 'b'], 't2': ['b', 'c'], 'ar1': ['d']})
+        fan_out = RecommendationFanOut(client, max_workers=8)
+        start = time.monotonic()
+        result = fan_out.recommend('tok', track_ids=['t1', 't2'], artist_ids=['ar1'], limit=3)
+        elapsed = time.monotonic() - start
+        self.assertEqual(client.calls, 3)
+        self.assertLess(elapsed, 0.25)
+        self.assertEqual(result['tracks'][0]['id'], 'b')
+        self.assertEqual(len(result['tracks']), 3)
+
+    def test_track_seeds_do_not_wait_for_artist_seeds(self):
+        """
+        Test that pending artist seeds are requested after the track seeds
+        started, so the page waits for the slowest call, not their sum.
+        """
+        client = SlowClient(0.1, {'t1': ['a'], 'ar1': ['b']})
+        fan_out = RecommendationFanOut(client, max_workers=8)
+        artists = fan_out.executor.submit(lambda: time.sleep(0.1) or ['ar1'])
+        start = time.monotonic()
+        result = fan_out.recommend('tok', track_ids=['t1'], artist_ids=artists, limit=2)
+        self.assertLess(time.monotonic() - start, 0.25)
+        self.assertEqual(result['seeds'], [{'id': 't1', 'type': 'TRACK'}, {'id': 'ar1', 'type': 'ARTIST'}])
+
+    def test_failed_seed_is_skipped(self):
+        """
+        Test that one failing seed does not fail the whole page.
+        """
+        client = SlowClient(0, {'t1': ['a']})
+        fan_out = RecommendationFanOut(client)
+        result = fan_out.recommend('tok', track_ids=['t1', 'broken'])
+        self.assertEqual([track['id'] for track in result['tracks']], ['a'])
+        self.assertEqual(result['seeds'], [{'id': 't1', 'type': 'TRACK'}])
+
+if __name__ == '__main__':
+    unittest.main()
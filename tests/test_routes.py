@@ -0,0 +1,365 @@
+"""
+A Test suite that drives the app's routes against the local Spotify stand-in.
+"""
+
+import os
+import sys
+import unittest
+from concurrent.futures import Future
+from unittest.mock import patch
+import numpy as np
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as song_app
+from catalog_cache import CatalogCache
+from collaborative import FactorModel
+from cooccurrence import CooccurrenceBuilder
+from feature_store import RecommendationEngine, TrackFeatureStore
+from fake_spotify import create_fake_spotify, serve_in_thread
+from models import MODELS, Artist, Track
+from pagination import PagedResult, Paginator
+from prefetch import Prefetcher
+from rate_limit import RateLimitExceeded
+from recommend import RecommendationFanOut
+from single_flight import SingleFlight
+from spotify_client import SpotifyClient
+
+class TestRoutes(unittest.TestCase):
+    """
+    Test suite for the Spotify-backed routes.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fake = create_fake_spotify(seed=1)
+        cls.server, cls.base_url = serve_in_thread(cls.fake)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        spotify = SpotifyClient('id', 'secret', api_base_url=f'{self.base_url}/v1',
+                                token_url=f'{self.base_url}/api/token')
+        catalog = CatalogCache(models=MODELS)
+        prefetcher = Prefetcher(spotify, catalog)
+        paginator = Paginator(spotify)
+        self.addCleanup(prefetcher.shutdown)
+        self.addCleanup(paginator.shutdown)
+        self.addCleanup(spotify.close)
+        for name, value in (('spotify', spotify), ('catalog', catalog), ('prefetcher', prefetcher),
+                            ('recommender', RecommendationFanOut(spotify)), ('paginator', paginator),
+                            ('token_refresher', SingleFlight())):
+            patcher = patch.object(song_app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = song_app.app.test_client()
+        self.assertEqual(self.client.get('/callback?code=fake-code').status_code, 302)
+        self.fake.calls.clear()
+        self.fake.playlist_versions.clear()
+
+    def test_profile_makes_a_single_upstream_call(self):
+        """
+        Test that /profile renders with one call to /v1/me and no token probe.
+        """
+        response = self.client.get('/profile')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'fake@example.com', response.data)
+        self.assertEqual(dict(self.fake.calls), {'me': 1})
+
+    def test_playlists(self):
+        """
+        Test that /playlists renders the user's playlists.
+        """
+        response = self.client.get('/playlists')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Playlist 0', response.data)
+
+    def test_playlists_loads_every_page(self):
+        """
+        Test that /playlists lists every playlist, not just the first page.
+        """
+        with patch.object(song_app, 'PLAYLIST_PAGE_SIZE', 10):
+            response = self.client.get('/playlists')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.count(b'class="playlist-item"'), 45)
+        self.assertIn(b'Playlist 44', response.data)
+        self.assertEqual(dict(self.fake.calls), {'playlists': 5})
+
+    def test_playlist_tracks_are_cached_by_snapshot(self):
+        """
+        Test that a playlist's tracks are fetched once per snapshot_id.
+        """
+        response = self.client.get('/playlists/pl00005')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.count(b'class="playlist-item"'), 232)
+        self.assertEqual(dict(self.fake.calls), {'playlist': 1, 'playlist_tracks': 2})
+
+        self.fake.calls.clear()
+        self.assertEqual(self.client.get('/playlists/pl00005').status_code, 200)
+        self.assertEqual(dict(self.fake.calls), {})
+
+    def test_old_snapshot_is_checked_before_serving_the_cache(self):
+        """
+        Test that a snapshot seen longer ago than the max age is checked with
+        one call, and the tracks are refetched only if it changed.
+        """
+        self.client.get('/playlists/pl00003')
+        patcher = patch.object(song_app, 'PLAYLIST_SNAPSHOT_MAX_AGE', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fake.calls.clear()
+        self.assertEqual(self.client.get('/playlists/pl00003').status_code, 200)
+        self.assertEqual(dict(self.fake.calls), {'playlist': 1})
+
+        self.fake.test_client().post('/_edit/pl00003')
+        self.fake.calls.clear()
+        response = self.client.get('/playlists/pl00003')
+        self.assertIn(b'pl00003v2t0000', response.data)
+        self.assertEqual(dict(self.fake.calls), {'playlist': 2, 'playlist_tracks': 1})
+
+    def test_rate_limited_page_cancels_the_remaining_pages(self):
+        """
+        Test that a page given up on for rate limiting cancels the pages queued
+        after it and answers 503.
+        """
+        limited = Future()
+        limited.set_exception(RateLimitExceeded(2.0))
+        queued = Future()
+        paginate = lambda path, token, first_page, params=None: PagedResult(first_page, [limited, queued])
+        with patch.object(song_app.paginator, 'paginate', paginate):
+            response = self.client.get('/playlists/pl00005')
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(queued.cancelled())
+
+    def test_edited_playlist_is_refetched_after_listing(self):
+        """
+        Test that a new snapshot_id seen on the playlists page triggers a refetch.
+        """
+        self.client.get('/playlists')
+        self.client.get('/playlists/pl00003')
+        self.fake.test_client().post('/_edit/pl00003')
+        self.fake.calls.clear()
+        # Within PLAYLIST_SNAPSHOT_MAX_AGE the snapshot seen is trusted.
+        self.client.get('/playlists/pl00003')
+        self.assertEqual(dict(self.fake.calls), {})
+
+        self.client.get('/playlists')
+        self.fake.calls.clear()
+        response = self.client.get('/playlists/pl00003')
+        self.assertIn(b'pl00003v2t0000', response.data)
+        self.assertEqual(dict(self.fake.calls), {'playlist': 1, 'playlist_tracks': 1})
+
+    def test_recommendations_warm_track_and_artist_pages(self):
+        """
+        Test that pages linked from the recommendations page are served from cache.
+        """
+        response = self.client.get('/recommendations')
+        self.assertEqual(response.status_code, 200)
+        song_app.prefetcher.shutdown()
+        recommended = song_app.catalog.memory._data
+        track_id = next(key[1] for key in recommended if key[0] == 'track')
+        artist_id = next(key[1] for key in recommended if key[0] == 'artist')
+        self.fake.calls.clear()
+        self.assertEqual(self.client.get(f'/tracks/{track_id}').status_code, 200)
+        self.assertEqual(self.client.get(f'/artists/{artist_id}').status_code, 200)
+        self.assertEqual(sum(self.fake.calls.values()), 0)
+
+    def test_repeat_recommendations_do_not_rewrite_cached_tracks(self):
+        """
+        Test that tracks cached by one recommendations view are not written again by the next.
+        """
+        self.assertEqual(self.client.get('/recommendations').status_code, 200)
+        writes = []
+        original = song_app.catalog.set
+        with patch.object(song_app.catalog, 'set',
+                          lambda kind, *args, **kwargs: writes.append(kind) or original(kind, *args, **kwargs)):
+            self.assertEqual(self.client.get('/recommendations').status_code, 200)
+        self.assertNotIn('track', writes)
+
+    def test_local_engine_takes_over_once_enough_tracks_are_indexed(self):
+        """
+        Test that the local engine falls back to Spotify until enough tracks
+        are indexed, then recommends without calling Spotify's recommendations.
+        """
+        features = TrackFeatureStore()
+        prefetcher = Prefetcher(song_app.spotify, song_app.catalog, max_workers=1, features=features)
+        self.addCleanup(prefetcher.shutdown)
+        for name, value in (('features', features), ('engine', RecommendationEngine(features)),
+                            ('prefetcher', prefetcher), ('LOCAL_ENGINE_MIN_TRACKS', 25)):
+            patcher = patch.object(song_app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.assertEqual(self.client.get('/recommendations').status_code, 200)
+        self.assertEqual(self.fake.calls['recommendations'], 1)
+        # The single worker runs tasks in order, so this waits for the indexing.
+        prefetcher.submit('unused').result()
+        # 20 top tracks, 10 recommended and 50 saved tracks.
+        self.assertEqual(len(features), 80)
+        self.assertEqual(self.fake.calls['saved_tracks'], 1)
+
+        self.fake.calls.clear()
+        with patch.object(song_app, 'RECOMMENDATION_SEEDS', 3):
+            response = self.client.get('/recommendations')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.fake.calls['recommendations'], 0)
+        # Top artists are only fetched for the Spotify fan-out.
+        self.assertEqual(self.fake.calls['top_artists'], 0)
+        # The seeds are excluded.
+        self.assertEqual(response.data.count(b'<h5>Track '), 10)
+        self.assertNotIn(b'<h5>Track top', response.data)
+
+    def test_cold_local_engine_indexes_seeds_in_the_background(self):
+        """
+        Test that while the local engine cannot answer yet, the page makes no
+        indexing calls of its own and the seeds are handed to the prefetcher.
+        """
+        features = TrackFeatureStore()
+        prefetcher = Prefetcher(song_app.spotify, song_app.catalog, max_workers=1, features=features)
+        self.addCleanup(prefetcher.shutdown)
+        submitted = []
+        for name, value in (('features', features), ('engine', RecommendationEngine(features)),
+                            ('prefetcher', prefetcher), ('collect_saved_tracks', lambda token, user_id: None)):
+            patcher = patch.object(song_app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        with patch.object(prefetcher, 'submit',
+                          lambda token, track_ids=(), artist_ids=(), index_tracks=(): submitted.append(list(index_tracks))):
+            self.assertEqual(self.client.get('/recommendations').status_code, 200)
+        self.assertEqual(self.fake.calls['several_audio_features'], 0)
+        self.assertEqual(self.fake.calls['artists'], 0)
+        self.assertEqual(self.fake.calls['recommendations'], 1)
+        self.assertEqual(len(submitted[0]), 20)
+
+    def test_failed_saved_tracks_collection_is_not_retried_each_view(self):
+        """
+        Test that saved tracks are collected once per attempt, even when the
+        collection records nothing, e.g. for a token without the library scope.
+        """
+        features = TrackFeatureStore()
+        attempts = []
+        for name, value in (('features', features), ('engine', RecommendationEngine(features)),
+                            ('collect_saved_tracks', lambda token, user_id: attempts.append(user_id))):
+            patcher = patch.object(song_app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        for _ in range(3):
+            self.assertEqual(self.client.get('/recommendations').status_code, 200)
+        song_app.prefetcher.shutdown()
+        self.assertEqual(attempts, ['fakeuser'])
+
+    def test_collaborative_model_recommends_for_known_users(self):
+        """
+        Test that a user in the ALS model gets its top-scored tracks, without
+        the seeds, even before enough tracks are indexed for content scoring.
+        """
+        features = TrackFeatureStore()
+        prefetcher = Prefetcher(song_app.spotify, song_app.catalog, max_workers=1, features=features)
+        self.addCleanup(prefetcher.shutdown)
+        model = FactorModel(['fakeuser'], ['top0000', 'saved0003', 'saved0004'],
+                            np.array([[1.0, 0.0]], dtype=np.float32),
+                            np.array([[2.0, 0.0], [1.0, 0.0], [0.5, 0.0]], dtype=np.float32),
+                            np.array([0, 0]), np.array([], dtype=np.int32))
+        for name, value in (('features', features), ('engine', RecommendationEngine(features)),
+                            ('prefetcher', prefetcher), ('als_model', model)):
+            patcher = patch.object(song_app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client.get('/recommendations')
+        prefetcher.submit('unused').result()
+        self.fake.calls.clear()
+        response = self.client.get('/recommendations')
+        self.assertEqual(self.fake.calls['recommendations'], 0)
+        data = response.get_data(as_text=True)
+        self.assertLess(data.index('<h5>Track saved0003'), data.index('<h5>Track saved0004'))
+        self.assertNotIn('<h5>Track top', data)
+
+    def test_track_page_shows_tracks_from_the_same_playlists(self):
+        """
+        Test that fetched playlists are recorded and that a track's
+        co-occurring tracks are prefetched, then listed on its page.
+        """
+        self.client.get('/playlists/pl00003')
+        track_ids = song_app.catalog.get('playlist_tracks', 'pl00003')
+        self.assertEqual(len(track_ids), len(set(track_ids)))
+        self.assertTrue(track_ids)
+        builder = CooccurrenceBuilder()
+        builder.add(track_ids[:3])
+        builder.add(track_ids[:2])
+        patcher = patch.object(song_app, 'track_neighbors', builder.build())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.fake.calls.clear()
+        self.assertEqual(self.client.get(f'/tracks/{track_ids[0]}').status_code, 200)
+        song_app.prefetcher.shutdown()
+        response = self.client.get(f'/tracks/{track_ids[0]}')
+        data = response.get_data(as_text=True)
+        self.assertIn('More like this', data)
+        self.assertLess(data.index(f'/tracks/{track_ids[1]}'), data.index(f'/tracks/{track_ids[2]}'))
+        self.assertEqual(self.fake.calls['track'], 1)
+
+    def test_metrics_endpoint(self):
+        """
+        Test that /metrics reports per-route latency histograms.
+        """
+        self.client.get('/home')
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('songrec_request_duration_seconds_count{endpoint="home"}', text)
+        self.assertIn('songrec_cache_hits_total', text)
+
+    def test_traced_request_records_upstream_and_render_spans(self):
+        """
+        Test that a request sent with X-Trace records a waterfall of its spans.
+        """
+        patcher = patch.object(song_app.tracer, 'token', 'secret')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        headers = {'X-Trace': 'secret'}
+        response = self.client.get('/profile', headers=headers)
+        trace_id = response.headers['X-Trace-Id']
+        trace = self.client.get(f'/traces/{trace_id}', headers=headers).get_json()
+        names = [item['name'] for item in trace['spans']]
+        self.assertEqual(names, ['view profile', 'spotify me', 'render'])
+        waterfall = self.client.get(f'/traces/{trace_id}/waterfall', headers=headers).get_data(as_text=True)
+        self.assertIn('spotify me', waterfall)
+
+    def test_traces_require_the_trace_token(self):
+        """
+        Test that the trace header and endpoints are ignored without the token.
+        """
+        patcher = patch.object(song_app.tracer, 'token', 'secret')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        response = self.client.get('/profile', headers={'X-Trace': '1'})
+        self.assertNotIn('X-Trace-Id', response.headers)
+        trace_id = self.client.get('/profile', headers={'X-Trace': 'secret'}).headers['X-Trace-Id']
+        self.assertEqual(self.client.get('/traces').status_code, 404)
+        self.assertEqual(self.client.get(f'/traces/{trace_id}').status_code, 404)
+        self.assertEqual(self.client.get(f'/traces/{trace_id}/waterfall').status_code, 404)
+
+    def test_uncached_track_and_artist(self):
+        """
+        Test that uncached tracks and artists are fetched once and then cached.
+        """
+        self.assertEqual(self.client.get('/tracks/t1').status_code, 200)
+        self.assertEqual(self.client.get('/tracks/t1').status_code, 200)
+        self.assertEqual(self.client.get('/artists/a1').status_code, 200)
+        self.assertEqual(dict(self.fake.calls), {'track': 1, 'artist': 1})
+
+    def test_cached_entities_are_models(self):
+        """
+        Test that tracks and artists are cached as compact models.
+        """
+        self.client.get('/tracks/t1')
+        self.client.get('/artists/a1')
+        self.assertIsInstance(song_app.catalog.get('track', 't1'), Track)
+        self.assertIsInstance(song_app.catalog.get('artist', 'a1'), Artist)
+
+if __name__ == '__main__':
+    unittest.main()
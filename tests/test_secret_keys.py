@@ -0,0 +1,99 @@
+"""
+A Test suite for loading and rotating secret keys.
+"""
+
+import os
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from secret_keys import load_secret_keys, read_key_file, rotate_key_file
+
+class TestSecretKeys(unittest.TestCase):
+    """
+    Test suite for `load_secret_keys` and `rotate_key_file`.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.key_file = os.path.join(directory.name, 'secret_key')
+
+    def test_environment_key_takes_precedence(self):
+        """
+        Test that SECRET_KEY and SECRET_KEY_FALLBACKS are used when set.
+        """
+        environ = {'SECRET_KEY': 'current', 'SECRET_KEY_FALLBACKS': 'old1, old2'}
+        self.assertEqual(load_secret_keys(environ, self.key_file), ('current', ['old1', 'old2']))
+        self.assertFalse(os.path.exists(self.key_file))
+
+    def test_default_key_file_is_created_once(self):
+        """
+        Test that the default key file is generated once and then reused.
+        """
+        first = load_secret_keys({}, self.key_file)
+        second = load_secret_keys({}, self.key_file)
+        self.assertEqual(first, second)
+        self.assertEqual(os.stat(self.key_file).st_mode & 0o777, 0o600)
+
+    def test_concurrent_first_start_shares_one_key(self):
+        """
+        Test that workers starting at once all read the same, complete key,
+        even when generating it is slow.
+        """
+        token_hex = secrets.token_hex
+        patcher = patch('secret_keys.secrets.token_hex', lambda n: time.sleep(0.05) or token_hex(n))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        results = []
+        errors = []
+
+        def start():
+            try:
+                results.append(load_secret_keys({}, self.key_file))
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=start) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len({key for key, _ in results}), 1)
+        self.assertEqual(os.listdir(os.path.dirname(self.key_file)), ['secret_key'])
+
+    def test_rotation_keeps_previous_keys(self):
+        """
+        Test that rotating puts a new key first and keeps the old ones.
+        """
+        current, _ = load_secret_keys({}, self.key_file)
+        rotate_key_file(self.key_file)
+        new_current, fallbacks = load_secret_keys({}, self.key_file)
+        self.assertNotEqual(new_current, current)
+        self.assertEqual(fallbacks, [current])
+
+    def test_rotation_drops_oldest_keys(self):
+        """
+        Test that only `keep` previous keys are kept.
+        """
+        for _ in range(5):
+            rotate_key_file(self.key_file, keep=2)
+        self.assertEqual(len(read_key_file(self.key_file)), 3)
+
+    def test_missing_configured_key_file_raises(self):
+        """
+        Test that an explicitly configured but missing key file is an error.
+        """
+        with self.assertRaises(ValueError):
+            load_secret_keys({'SECRET_KEY_FILE': self.key_file}, self.key_file)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+A Test suite for the server-side session store.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from flask import Flask, session
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from session_store import RedisSessionBackend, ServerSideSessionInterface, SQLiteSessionBackend
+
+class FakeRedis:
+    """
+    A local stand-in for the Redis client methods used by the backend.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+def make_app(backend):
+    """
+    Builds a small Flask app that uses the given session backend.
+    """
+    test_app = Flask(__name__)
+    test_app.secret_key = 'test-secret'
+    test_app.session_interface = ServerSideSessionInterface(backend)
+
+    @test_app.route('/set')
+    def set_value():
+        session['recommendations'] = {'tracks': [{'name': 'x' * 5000}]}
+        return 'ok'
+
+    @test_app.route('/get')
+    def get_value():
+        return session.get('recommendations', {}).get('tracks', [{}])[0].get('name', 'missing')
+
+    @test_app.route('/clear')
+    def clear():
+        session.clear()
+        return 'ok'
+
+    return test_app
+
+class SessionStoreTests:
+    """
+    Tests shared by every backend.
+    """
+
+    def test_cookie_only_carries_session_id(self):
+        """
+        Test that large session values stay on the server.
+        """
+        response = self.client.get('/set')
+        cookie = response.headers['Set-Cookie']
+        self.assertLess(len(cookie), 200)
+        self.assertNotIn('recommendations', cookie)
+        self.assertEqual(self.client.get('/get').data, b'x' * 5000)
+
+    def test_tampered_cookie_starts_new_session(self):
+        """
+        Test that a cookie with a bad signature is ignored.
+        """
+        self.client.get('/set')
+        self.client.set_cookie('localhost', 'session', 'forged.sid')
+        self.assertEqual(self.client.get('/get').data, b'missing')
+
+    def test_session_survives_key_rotation(self):
+        """
+        Test that IDs signed with a previous key are still accepted.
+        """
+        self.client.get('/set')
+        test_app = self.client.application
+        test_app.config['SECRET_KEY_FALLBACKS'] = [test_app.secret_key]
+        test_app.secret_key = 'rotated-secret'
+        self.assertEqual(self.client.get('/get').data, b'x' * 5000)
+
+    def test_clearing_session_deletes_it(self):
+        """
+        Test that an emptied session is removed from the backend.
+        """
+        self.client.get('/set')
+        self.client.get('/clear')
+        self.assertEqual(self.client.get('/get').data, b'missing')
+
+class TestSQLiteSessionStore(SessionStoreTests, unittest.TestCase):
+    """
+    Test suite for the SQLite session backend.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        backend = SQLiteSessionBackend(os.path.join(directory.name, 'sessions.sqlite3'))
+        self.client = make_app(backend).test_client()
+
+class TestRedisSessionStore(SessionStoreTests, unittest.TestCase):
+    """
+    Test suite for the Redis session backend, using a local stand-in.
+    """
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.client = make_app(RedisSessionBackend(self.redis)).test_client()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+A Test suite for the `SingleFlight` helper.
+"""
+
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from single_flight import FileLockBackend, SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+    """
+    Test suite for the `SingleFlight` class.
+    """
+
+    def run_concurrently(self, flight, fn, count=8):
+        """
+        Calls `flight.do` from several threads at once and returns the results.
+        """
+        results = []
+        start = threading.Barrier(count)
+
+        def worker():
+            start.wait()
+            results.append(flight.do('user', fn))
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_callers_share_one_call(self):
+        """
+        Test that concurrent callers for the same key trigger exactly one call.
+        """
+        calls = []
+
+        def refresh():
+            calls.append(1)
+            time.sleep(0.05)
+            return {'access_token': 'new'}
+
+        results = self.run_concurrently(SingleFlight(), refresh)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'access_token': 'new'}] * 8)
+
+    def test_failed_call_is_not_cached(self):
+        """
+        Test that a None result is retried by the next caller.
+        """
+        flight = SingleFlight()
+        self.assertIsNone(flight.do('user', lambda: None))
+        self.assertEqual(flight.do('user', lambda: 'ok'), 'ok')
+
+    def test_result_expires_after_ttl(self):
+        """
+        Test that results are only reused within the TTL.
+        """
+        flight = SingleFlight(result_ttl=0)
+        flight.do('user', lambda: 'first')
+        time.sleep(0.01)
+        self.assertEqual(flight.do('user', lambda: 'second'), 'second')
+
+    def test_file_backend_shares_result_between_instances(self):
+        """
+        Test that two instances (standing in for two workers) sharing a
+        lock directory reuse each other's result.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            first = SingleFlight(backend=FileLockBackend(directory))
+            second = SingleFlight(backend=FileLockBackend(directory))
+            first.do('user', lambda: {'access_token': 'new'})
+            self.assertEqual(second.do('user', lambda: self.fail('refreshed twice')),
+                             {'access_token': 'new'})
+
+    def test_file_backend_lock_polls_while_held(self):
+        """
+        Test that a lock held by another worker is polled with sleeps, which
+        gevent can switch on, and taken once released.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            first = FileLockBackend(directory)
+            second = FileLockBackend(directory, poll_interval=0.01)
+            acquired = threading.Event()
+
+            def wait():
+                with second.lock('user'):
+                    acquired.set()
+
+            with patch('single_flight.time.sleep', wraps=time.sleep) as sleep:
+                with first.lock('user'):
+                    thread = threading.Thread(target=wait)
+                    thread.start()
+                    self.assertFalse(acquired.wait(0.1))
+                thread.join(1)
+            self.assertTrue(acquired.is_set())
+            self.assertTrue(sleep.called)
+
+    def test_file_backend_prunes_expired_results_and_locks(self):
+        """
+        Test that results and locks older than the TTL are deleted, except held locks.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            backend = FileLockBackend(directory)
+            SingleFlight(backend=backend).do('old', lambda: {'access_token': 'old'})
+            with backend.lock('held'):
+                past = time.time() - 60
+                for name in os.listdir(directory):
+                    os.utime(os.path.join(directory, name), (past, past))
+                SingleFlight(backend=backend, result_ttl=30).do('new', lambda: {'access_token': 'new'})
+                self.assertEqual(sorted(os.listdir(directory)), ['held.lock', 'new.json', 'new.lock'])
+            with backend.lock('held'):
+                pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+A Test suite for the `SpotifyClient` class.
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metrics import MetricsRegistry
+from spotify_client import SpotifyClient
+
+class TestSpotifyClient(unittest.TestCase):
+    """
+    Test suite for the `SpotifyClient` class.
+    """
+
+    def setUp(self):
+        self.client = SpotifyClient('id', 'secret', api_base_url='http://fake/v1/',
+                                    token_url='http://fake/api/token', pool_size=4, timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_token_header_is_precomputed(self):
+        """
+        Test that the Basic auth header for the token endpoint is built once.
+        """
+        self.assertEqual(self.client.token_headers['Authorization'], 'Basic aWQ6c2VjcmV0')
+
+    def test_pool_size_is_applied_to_adapters(self):
+        """
+        Test that the configured pool size is used for both schemes.
+        """
+        for prefix in ('http://', 'https://'):
+            adapter = self.client.http.get_adapter(prefix + 'fake')
+            self.assertEqual(adapter._pool_maxsize, 4)
+
+    def test_get_uses_pooled_session(self):
+        """
+        Test that `get` goes through the shared session with bearer headers
+        and the default timeout.
+        """
+        with patch.object(self.client.http, 'get') as mock_get:
+            self.client.get('me/playlists', 'tok', params={'limit': 20})
+        mock_get.assert_called_once_with(
+            'http://fake/v1/me/playlists',
+            headers={'Authorization': 'Bearer tok', 'Content-Type': 'application/json'},
+            params={'limit': 20},
+            timeout=5
+        )
+
+    def test_absolute_urls_are_passed_through(self):
+        """
+        Test that absolute URLs such as pagination links are not rewritten.
+        """
+        self.assertEqual(self.client.api_url('https://api.spotify.com/v1/me?offset=20'),
+                         'https://api.spotify.com/v1/me?offset=20')
+
+    def test_post_token_uses_basic_auth(self):
+        """
+        Test that `post_token` posts form data to the token endpoint.
+        """
+        with patch.object(self.client.http, 'post') as mock_post:
+            self.client.post_token({'grant_type': 'refresh_token'})
+        mock_post.assert_called_once_with(
+            'http://fake/api/token',
+            headers=self.client.token_headers,
+            data={'grant_type': 'refresh_token'},
+            timeout=5
+        )
+
+    def test_upstream_calls_are_timed(self):
+        """
+        Test that calls are recorded per upstream endpoint when metrics are enabled.
+        """
+        registry = MetricsRegistry()
+        registry.histogram('songrec_upstream_duration_seconds', 'Duration.')
+        registry.counter('songrec_upstream_requests_total', 'Calls.')
+        self.client.metrics = registry
+        with patch.object(self.client.http, 'get', return_value=MagicMock(status_code=200)):
+            self.client.get('me/playlists', 'tok')
+        text = registry.render()
+        self.assertIn('songrec_upstream_requests_total{endpoint="playlists",status="200"} 1', text)
+        self.assertIn('songrec_upstream_duration_seconds_count{endpoint="playlists"} 1', text)
+
+if __name__ == '__main__':
+    unittest.main()
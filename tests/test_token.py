@@ -0,0 +1,77 @@
+"""
+A Test suite for access token expiry tracking and refresh.
+"""
+
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as song_app
+from app import app, api_get, get_valid_token, store_token
+from single_flight import SingleFlight
+
+def make_response(status_code, payload=None):
+    """
+    Builds a fake upstream response.
+    """
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = payload or {}
+    return response
+
+class TestTokenExpiry(unittest.TestCase):
+    """
+    Test suite for `get_valid_token` and `api_get`.
+    """
+
+    def setUp(self):
+        patcher = patch.object(song_app, 'spotify')
+        self.spotify = patcher.start()
+        self.addCleanup(patcher.stop)
+        refresher = patch.object(song_app, 'token_refresher', SingleFlight())
+        refresher.start()
+        self.addCleanup(refresher.stop)
+
+    def test_fresh_token_makes_no_upstream_call(self):
+        """
+        Test that a token that is not close to expiry is returned as is.
+        """
+        with app.test_request_context():
+            store_token({'access_token': 'tok', 'refresh_token': 'ref', 'expires_in': 3600})
+            self.assertEqual(get_valid_token(), 'tok')
+        self.spotify.get.assert_not_called()
+        self.spotify.post_token.assert_not_called()
+
+    def test_token_is_refreshed_before_deadline(self):
+        """
+        Test that a token inside the refresh margin is refreshed.
+        """
+        self.spotify.post_token.return_value = make_response(
+            200, {'access_token': 'new', 'expires_in': 3600})
+        with app.test_request_context():
+            store_token({'access_token': 'old', 'refresh_token': 'ref', 'expires_in': 10})
+            self.assertEqual(get_valid_token(), 'new')
+            self.assertEqual(song_app.session['refresh_token'], 'ref')
+            self.assertGreater(song_app.session['token_expires_at'], time.time() + 3000)
+
+    def test_api_get_refreshes_on_401(self):
+        """
+        Test that `api_get` refreshes the token and retries once on a 401.
+        """
+        self.spotify.get.side_effect = [make_response(401), make_response(200)]
+        self.spotify.post_token.return_value = make_response(
+            200, {'access_token': 'new', 'expires_in': 3600})
+        with app.test_request_context():
+            store_token({'access_token': 'old', 'refresh_token': 'ref'})
+            response = api_get('me', 'old')
+            self.assertEqual(song_app.session['token'], 'new')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.spotify.get.call_args_list[1].args, ('me', 'new'))
+
+if __name__ == '__main__':
+    unittest.main()
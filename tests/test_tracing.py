@@ -0,0 +1,97 @@
+"""
+A Test suite for per-request span tracing.
+"""
+
+import contextvars
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tracing import Tracer, render_waterfall, span
+
+class TestTracer(unittest.TestCase):
+    """
+    Test suite for the `Tracer` class and `span`.
+    """
+
+    def test_span_is_a_no_op_without_trace(self):
+        """
+        Test that spans outside a traced request record nothing.
+        """
+        tracer = Tracer()
+        with span('spotify me'):
+            pass
+        self.assertEqual(tracer.recent(), [])
+
+    def test_spans_are_nested_and_exported(self):
+        """
+        Test that nested spans keep their parent and worker threads are included.
+        """
+        tracer = Tracer()
+        trace, token = tracer.start('GET /profile')
+        with span('token refresh'):
+            with span('spotify token'):
+                pass
+
+        def fetch():
+            with span('spotify me'):
+                pass
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(fetch,))
+        thread.start()
+        thread.join()
+        with span('render', template='profile.html'):
+            pass
+        tracer.finish(trace, token)
+
+        data = tracer.get(trace.trace_id)
+        spans = {item['name']: item for item in data['spans']}
+        self.assertEqual(spans['token refresh']['parent_id'], 0)
+        self.assertEqual(spans['spotify token']['parent_id'], spans['token refresh']['span_id'])
+        self.assertEqual(spans['spotify me']['parent_id'], 0)
+        self.assertEqual(spans['render']['attrs'], {'template': 'profile.html'})
+        self.assertIn('spotify token', render_waterfall(data))
+
+    def test_header_forces_tracing(self):
+        """
+        Test that the trace header turns tracing on when sampling is off,
+        only when it carries the token.
+        """
+        tracer = Tracer(sample_rate=0, token='secret')
+        self.assertTrue(tracer.should_trace({'X-Trace': 'secret'}))
+        self.assertFalse(tracer.should_trace({'X-Trace': '1'}))
+        self.assertFalse(tracer.should_trace({}))
+        self.assertFalse(Tracer(sample_rate=0).should_trace({'X-Trace': '1'}))
+
+    def test_traces_are_shared_through_directory(self):
+        """
+        Test that a trace finished by one worker can be read by another.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            first = Tracer(directory=directory)
+            second = Tracer(directory=directory)
+            trace, token = first.start('GET /home')
+            first.finish(trace, token)
+            self.assertEqual(second.get(trace.trace_id)['name'], 'GET /home')
+            self.assertIsNone(second.get('../etc'))
+
+    def test_directory_keeps_the_newest_traces(self):
+        """
+        Test that trace files beyond `keep` are deleted, oldest first.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            tracer = Tracer(directory=directory, keep=3)
+            trace_ids = []
+            for i in range(5):
+                trace, token = tracer.start('GET /home')
+                tracer.finish(trace, token)
+                os.utime(os.path.join(directory, f'{trace.trace_id}.json'), (i, i))
+                trace_ids.append(trace.trace_id)
+            self.assertEqual(sorted(os.listdir(directory)), sorted(f'{trace_id}.json' for trace_id in trace_ids[-3:]))
+
+if __name__ == '__main__':
+    unittest.main()
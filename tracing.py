@@ -0,0 +1,229 @@
+"""
+This module contains lightweight per-request span tracing. A traced request
+records a span for the view, each Spotify call and each template render,
+which can be exported as JSON or shown as a text waterfall to spot serial
+upstream chains.
+
+Tracing is off unless a request carries the trace header with the
+configured token or is sampled, and `span` is a no-op outside a traced
+request.
+"""
+import contextvars
+import hmac
+import itertools
+import json
+import os
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Trace:
+    """
+    The spans recorded while handling one request.
+    """
+
+    def __init__(self, name):
+        self.trace_id = secrets.token_hex(8)
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_span_id(self):
+        with self._lock:
+            return next(self._ids)
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        """
+        Returns the trace as JSON-serialisable data with span times in
+        milliseconds relative to the start of the request.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span['start_ms'])
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': self.duration_ms,
+            'spans': spans,
+        }
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Records a span around the block if the current request is traced.
+    Worker threads see the trace when run with `contextvars.copy_context()`.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    span_id = trace.next_span_id()
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _current_span.reset(token)
+        trace.add({
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'name': name,
+            'start_ms': round((start - trace.start) * 1000, 3),
+            'duration_ms': round((end - start) * 1000, 3),
+            'thread': threading.current_thread().name,
+            'attrs': attrs,
+        })
+
+
+def render_waterfall(trace, width=50):
+    """
+    Renders a trace dict as a text waterfall, one line per span.
+    """
+    total = trace['duration_ms'] or max((s['start_ms'] + s['duration_ms'] for s in trace['spans']), default=0)
+    scale = width / total if total else 0
+    depths = {}
+    for item in trace['spans']:
+        depths[item['span_id']] = depths.get(item['parent_id'], -1) + 1
+
+    lines = [f"{trace['name']}  trace {trace['trace_id']}  total {total:.1f} ms"]
+    for item in trace['spans']:
+        offset = int(item['start_ms'] * scale)
+        length = max(1, int(item['duration_ms'] * scale))
+        label = '  ' * depths[item['span_id']] + item['name']
+        attrs = ' '.join(f'{key}={value}' for key, value in item['attrs'].items())
+        bar = ' ' * offset + '#' * length
+        lines.append(f"{label[:40]:<40} |{bar:<{width}}| {item['start_ms']:>8.1f} +{item['duration_ms']:>7.1f} ms {attrs}")
+    return '\n'.join(lines) + '\n'
+
+
+class Tracer:
+    """
+    Decides which requests to trace and keeps the most recent traces.
+    """
+
+    def __init__(self, sample_rate=0.0, header='X-Trace', keep=100, directory=None, token=None):
+        """
+        Args:
+        sample_rate (float): Fraction of requests traced without the header.
+        header (str): Request header carrying the token, which forces
+            tracing and gives access to the traces.
+        keep (int): Number of finished traces kept in memory, and in the
+            directory.
+        directory (str): Optional directory shared by the workers where
+            finished traces are written, so any worker can serve them.
+        token (str): Secret expected in the header. Without a token the
+            header is ignored.
+        """
+        self.sample_rate = sample_rate
+        self.header = header
+        self.token = token
+        self.keep = keep
+        self.directory = directory
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def authorized(self, headers):
+        """
+        Returns True if the request carries the trace token.
+        """
+        value = headers.get(self.header)
+        return value is not None and bool(self.token) and hmac.compare_digest(value, self.token)
+
+    def should_trace(self, headers):
+        """
+        Returns True if the request asked for tracing or is sampled.
+        """
+        if self.authorized(headers):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, name):
+        """
+        Starts a trace for the current request. Spans opened while it is
+        active become children of the root span (span ID 0), which the
+        caller records for the request as a whole.
+
+        Returns:
+        tuple: The trace and a token to pass to `finish`.
+        """
+        trace = Trace(name)
+        return trace, (_current_trace.set(trace), _current_span.set(0))
+
+    def finish(self, trace, token):
+        """
+        Ends the trace and stores it.
+        """
+        trace.duration_ms = round((time.perf_counter() - trace.start) * 1000, 3)
+        trace_token, span_token = token
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        data = trace.to_dict()
+        with self._lock:
+            self._traces[trace.trace_id] = data
+            while len(self._traces) > self.keep:
+                self._traces.popitem(last=False)
+        if self.directory:
+            with open(os.path.join(self.directory, f'{trace.trace_id}.json'), 'w') as trace_file:
+                json.dump(data, trace_file)
+            self._prune_directory()
+
+    def _prune_directory(self):
+        """
+        Deletes the oldest trace files beyond `keep`.
+        """
+        paths = []
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith('.json'):
+                    paths.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+        paths.sort()
+        for _, path in paths[:max(len(paths) - self.keep, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, trace_id):
+        """
+        Returns a finished trace as a dict, or None if unknown.
+        """
+        with self._lock:
+            data = self._traces.get(trace_id)
+        if data is None and self.directory and all(c in '0123456789abcdef' for c in trace_id):
+            try:
+                with open(os.path.join(self.directory, f'{trace_id}.json')) as trace_file:
+                    data = json.load(trace_file)
+            except (OSError, ValueError):
+                return None
+        return data
+
+    def recent(self):
+        """
+        Returns summaries of the traces kept by this worker, newest first.
+        """
+        with self._lock:
+            traces = list(self._traces.values())
+        return [{key: data[key] for key in ('trace_id', 'name', 'started_at', 'duration_ms')}
+                for data in reversed(traces)]